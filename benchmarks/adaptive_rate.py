@@ -0,0 +1,67 @@
+# A benchmark of the end-to-end latency of a sensor stream whose uplink is slower than its sample rate,
+# with and without adaptive downsampling.
+# usage:
+#   python -m benchmarks.adaptive_rate --duration_sec=10 --sample_rate=200 --frame_delay_sec=0.004 --target_latency_secs=0,0.5
+import argparse
+import logging
+import time
+
+from archetypeai._sensors import SensorsApi
+from tests.local_servers import LocalStreamerServer
+
+_TOPIC_PRIORITIES = {"alarm": 10, "imu": 0, "audio": -1}
+
+
+def run_stream(endpoint: str, target_latency_sec: float, duration_sec: float, sample_rate: float, payload_bytes: int) -> dict:
+    """Sends samples of every topic at sample_rate for duration_sec and returns the stream stats."""
+    sensors = SensorsApi("fake_api_key", endpoint, target_latency_sec=target_latency_sec)
+    sensors.requests_post = lambda api_endpoint, data_payload: {"stream_uid": "benchmark_stream", "sensor_endpoint": endpoint}
+    sensors.register("benchmark_sensor")
+    if target_latency_sec > 0:
+        for topic_id, priority in _TOPIC_PRIORITIES.items():
+            sensors.set_topic_priority(topic_id, priority)
+    data = {"samples": "x" * payload_bytes}
+    sample_interval_sec = 1.0 / sample_rate
+    start_time = time.perf_counter()
+    num_samples = 0
+    while time.perf_counter() - start_time < duration_sec:
+        for topic_id in _TOPIC_PRIORITIES:
+            sensors.send(topic_id, data)
+        num_samples += 1
+        time.sleep(max(start_time + num_samples * sample_interval_sec - time.perf_counter(), 0.0))
+    stats = {"queue_size": sensors.get_outgoing_message_queue_size()}
+    if target_latency_sec > 0:
+        stats["rates"] = sensors.get_rate_stats()
+    sensors.close(timeout=0.0)
+    return stats
+
+
+def main(args):
+    logging.info(
+        f"uplink: {1.0 / args.frame_delay_sec:,.0f} frames/sec, "
+        f"offered: {len(_TOPIC_PRIORITIES) * args.sample_rate:,.0f} samples/sec of {args.payload_bytes / 1024:.0f}KB")
+    for target_latency_sec in args.target_latency_secs.split(","):
+        server = LocalStreamerServer(record_messages=False, frame_delay_sec=args.frame_delay_sec)
+        stats = run_stream(server.endpoint, float(target_latency_sec), args.duration_sec, args.sample_rate, args.payload_bytes)
+        latency = server.data_latency.get_stats()
+        server.close()
+        logging.info(
+            f"target latency: {target_latency_sec}s end-to-end: p50: {latency['p50']:.3f}s p90: {latency['p90']:.3f}s "
+            f"p99: {latency['p99']:.3f}s max: {latency['max']:.3f}s "
+            f"received: {latency['count']} queued at the end: {stats['queue_size']}")
+        for topic_id, topic_stats in stats.get("rates", {}).get("sensors", {}).get("benchmark_sensor", {}).items():
+            logging.info(
+                f"  {topic_id}: priority: {topic_stats['priority']} keep: {topic_stats['keep_fraction']:.2f} "
+                f"sent: {topic_stats['sent_per_sec']:.0f}/{topic_stats['samples_per_sec']:.0f} samples/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration_sec", default=10.0, type=float)
+    parser.add_argument("--sample_rate", default=200.0, type=float, help="The samples/sec sent on each topic.")
+    parser.add_argument("--payload_bytes", default=64 * 1024, type=int)
+    parser.add_argument("--frame_delay_sec", default=0.004, type=float, help="The time the server takes per data frame.")
+    parser.add_argument("--target_latency_secs", default="0,0.5", type=str, help="A comma separated list of target latencies, 0 disables.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(args)
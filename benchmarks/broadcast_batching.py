@@ -0,0 +1,56 @@
+# A benchmark of MessagingApi.broadcast per message against broadcast_async batching, on a local HTTP endpoint.
+# usage:
+#   python -m benchmarks.broadcast_batching --num_messages=5000 --num_producers=4 --broadcast_linger_sec=0.005
+import argparse
+import logging
+import threading
+import time
+
+from archetypeai._messaging import MessagingApi
+from tests.local_servers import LocalBroadcastServer
+
+
+def run_producers(broadcast_fn, num_producers: int, num_messages: int) -> tuple[int, float]:
+    """Broadcasts num_messages in total from num_producers threads, returning the number sent and the start time."""
+    num_messages_per_producer = num_messages // num_producers
+    def produce(producer_index: int):
+        topic_id = f"status_{producer_index}"
+        for index in range(num_messages_per_producer):
+            broadcast_fn(topic_id, {"index": index, "state": "ok"})
+    producers = [threading.Thread(target=produce, args=(producer_index,)) for producer_index in range(num_producers)]
+    start_time = time.perf_counter()
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    return num_messages_per_producer * num_producers, start_time
+
+
+def main(args):
+    for name in ("broadcast", "broadcast_async"):
+        server = LocalBroadcastServer()
+        messaging = MessagingApi(
+            "fake_api_key",
+            server.endpoint,
+            max_broadcast_batch_size=args.max_broadcast_batch_size,
+            broadcast_linger_sec=args.broadcast_linger_sec)
+        broadcast_fn = messaging.broadcast if name == "broadcast" else messaging.broadcast_async
+        num_messages, start_time = run_producers(broadcast_fn, args.num_producers, args.num_messages)
+        # close() sends the messages still queued by broadcast_async().
+        messaging.close()
+        total_time = time.perf_counter() - start_time
+        server.close()
+        logging.info(
+            f"{name}: {num_messages / total_time:,.0f} messages/sec "
+            f"({server.stats['num_messages']} messages in {server.stats['num_requests']} requests)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_messages", default=5000, type=int)
+    parser.add_argument("--num_producers", default=4, type=int)
+    parser.add_argument("--max_broadcast_batch_size", default=256, type=int)
+    parser.add_argument("--broadcast_linger_sec", default=0.005, type=float)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(args)
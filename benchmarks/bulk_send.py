@@ -0,0 +1,68 @@
+# A benchmark of SocketManager.send_batch against a send() per row for bulk array uploads.
+# usage:
+#   python -m benchmarks.bulk_send --num_rows=200000 --num_columns=6 --wire_format=json
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from archetypeai._socket_manager import SocketManager
+from tests.local_servers import LocalStreamerProcess
+
+
+def send_rows(streamer: SocketManager, timestamps: np.ndarray, values: np.ndarray) -> None:
+    for timestamp, row in zip(timestamps.tolist(), values.tolist()):
+        streamer.send("imu", row, timestamp)
+
+
+def send_batch(streamer: SocketManager, timestamps: np.ndarray, values: np.ndarray, chunk_size: int) -> None:
+    streamer.send_batch("imu", timestamps, values, chunk_size=chunk_size)
+
+
+def run(args, send_fn, *send_args) -> tuple[float, float, int]:
+    """Returns the enqueue and end-to-end rates in rows/sec and the number of rows the server received."""
+    server = LocalStreamerProcess()
+    streamer = SocketManager(
+        "fake_api_key",
+        server.endpoint,
+        wire_format=args.wire_format,
+        max_batch_size=args.max_batch_size,
+        max_outgoing_queue_size=args.num_rows)
+    streamer._start_stream("benchmark_stream", server.endpoint, "sensors/streamer")
+    start_time = time.perf_counter()
+    send_fn(streamer, *send_args)
+    enqueue_time = time.perf_counter() - start_time
+    while streamer.get_stats()["num_data_packets_sent"] < args.num_rows:
+        time.sleep(0.001)
+    total_time = time.perf_counter() - start_time
+    streamer.close()
+    # Gives the server time to read the frames still in its socket buffer.
+    time.sleep(1.0)
+    server_stats = server.close()
+    return args.num_rows / enqueue_time, args.num_rows / total_time, server_stats["num_data_messages"]
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    values = rng.standard_normal((args.num_rows, args.num_columns))
+    timestamps = time.time() + np.arange(args.num_rows) * 0.001
+    for name, send_fn, send_args in (
+        ("send per row", send_rows, (timestamps, values)),
+        ("send_batch", send_batch, (timestamps, values, args.chunk_size)),
+    ):
+        enqueue_rate, end_to_end_rate, num_received = run(args, send_fn, *send_args)
+        logging.info(
+            f"{name}: enqueue: {enqueue_rate:,.0f} rows/sec end-to-end: {end_to_end_rate:,.0f} rows/sec "
+            f"(server received {num_received})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_rows", default=200_000, type=int)
+    parser.add_argument("--num_columns", default=6, type=int)
+    parser.add_argument("--chunk_size", default=256, type=int)
+    parser.add_argument("--max_batch_size", default=256, type=int)
+    parser.add_argument("--wire_format", default="json", type=str, choices=["json", "binary"])
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(parser.parse_args())
@@ -0,0 +1,74 @@
+# A benchmark of the bytes on the wire and CPU time of compressed sensor frames, to tune the compression settings.
+# usage:
+#   python -m benchmarks.frame_compression --num_messages=10000 --levels=1,6,9 --min_sizes=0,256
+import argparse
+import json
+import logging
+import time
+import zlib
+from pathlib import Path
+
+from archetypeai._frame_codec import FrameCodec
+
+_EXAMPLE_DATA_FILENAME = Path(__file__).parent.parent / "example_data" / "home_sensor_log.jsonl"
+
+
+def make_frames(num_messages: int, batch_size: int) -> list[bytes]:
+    """Returns data frames of home sensor log rows, batch_size messages per frame."""
+    rows = [json.loads(line) for line in _EXAMPLE_DATA_FILENAME.read_text().splitlines()]
+    messages = [
+        {"topic_id": "home_sensors", "data": rows[index % len(rows)], "timestamp": time.time(), "message_id": index}
+        for index in range(num_messages)
+    ]
+    return [
+        json.dumps({"h": "db", "stream_uid": "benchmark_stream", "messages": messages[index:index + batch_size]}).encode()
+        for index in range(0, num_messages, batch_size)
+    ]
+
+
+def benchmark_codec(frames: list[bytes], level: int, min_size_bytes: int) -> dict:
+    sender = FrameCodec(level, min_size_bytes)
+    receiver = FrameCodec()
+    for frame in frames:
+        receiver.decode(sender.encode(frame))
+    stats = sender.get_stats()
+    stats["decompression_time_sec"] = receiver.get_stats()["decompression_time_sec"]
+    return stats
+
+
+def benchmark_per_frame_zlib(frames: list[bytes], level: int) -> tuple[int, float]:
+    """Compresses each frame on its own, for comparison with the per-connection deflate stream."""
+    start_time = time.perf_counter()
+    num_bytes = sum(len(zlib.compress(frame, level)) for frame in frames)
+    return num_bytes, time.perf_counter() - start_time
+
+
+def main(args):
+    for batch_size in args.batch_sizes.split(","):
+        frames = make_frames(args.num_messages, int(batch_size))
+        num_raw_bytes = sum(len(frame) for frame in frames)
+        logging.info(f"batch size: {batch_size} frames: {len(frames)} raw: {num_raw_bytes / 1024:.1f}KB")
+        for level in args.levels.split(","):
+            for min_size_bytes in args.min_sizes.split(","):
+                stats = benchmark_codec(frames, int(level), int(min_size_bytes))
+                logging.info(
+                    f"  level: {level} min size: {min_size_bytes:>4}B "
+                    f"wire: {stats['num_wire_bytes_sent'] / 1024:.1f}KB ({stats['compression_ratio_sent']:.1f}x) "
+                    f"compressed frames: {stats['num_compressed_frames_sent']} "
+                    f"compress: {1e6 * stats['compression_time_sec'] / len(frames):.1f}us/frame "
+                    f"decompress: {1e6 * stats['decompression_time_sec'] / len(frames):.1f}us/frame")
+            num_bytes, compression_time = benchmark_per_frame_zlib(frames, int(level))
+            logging.info(
+                f"  level: {level} per frame zlib: {num_bytes / 1024:.1f}KB ({num_raw_bytes / num_bytes:.1f}x) "
+                f"compress: {1e6 * compression_time / len(frames):.1f}us/frame")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_messages", default=10_000, type=int)
+    parser.add_argument("--batch_sizes", default="1,32", type=str, help="A comma separated list of messages per frame.")
+    parser.add_argument("--levels", default="1,6,9", type=str, help="A comma separated list of zlib levels.")
+    parser.add_argument("--min_sizes", default="0,256", type=str, help="A comma separated list of min frame sizes to compress.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(args)
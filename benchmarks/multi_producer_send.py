@@ -0,0 +1,64 @@
+# A benchmark of SocketManager.send throughput with many producer threads sharing one stream.
+# usage:
+#   python -m benchmarks.multi_producer_send --producer_counts=1,4,16 --num_messages=100000 --num_worker_threads=4
+import argparse
+import logging
+import threading
+import time
+
+from archetypeai._socket_manager import SocketManager
+from tests.local_servers import LocalStreamerProcess
+
+
+def run_producers(streamer: SocketManager, num_producers: int, num_messages: int) -> tuple[float, float]:
+    """Returns the enqueue and end-to-end rates in messages/sec of num_producers threads sending num_messages in total."""
+    data = {"accel": [0.1, 0.2, 0.3], "gyro": [1.0, 2.0, 3.0]}
+    num_messages_per_producer = num_messages // num_producers
+    start_barrier = threading.Barrier(num_producers + 1)
+    def produce(producer_index: int):
+        topic_id = f"imu_{producer_index}"
+        start_barrier.wait()
+        for _ in range(num_messages_per_producer):
+            streamer.send(topic_id, data)
+    producers = [threading.Thread(target=produce, args=(producer_index,)) for producer_index in range(num_producers)]
+    for producer in producers:
+        producer.start()
+    start_barrier.wait()
+    start_time = time.perf_counter()
+    for producer in producers:
+        producer.join()
+    enqueue_time = time.perf_counter() - start_time
+    while streamer.get_outgoing_message_queue_size() > 0:
+        time.sleep(0.001)
+    total_time = time.perf_counter() - start_time
+    num_messages = num_messages_per_producer * num_producers
+    return num_messages / enqueue_time, num_messages / total_time
+
+
+def main(args):
+    for num_producers in args.producer_counts.split(","):
+        server = LocalStreamerProcess()
+        streamer = SocketManager(
+            "fake_api_key",
+            server.endpoint,
+            num_worker_threads=args.num_worker_threads,
+            max_batch_size=args.max_batch_size,
+            max_outgoing_queue_size=args.num_messages)
+        streamer._start_stream("benchmark_stream", server.endpoint, "sensors/streamer")
+        enqueue_rate, end_to_end_rate = run_producers(streamer, int(num_producers), args.num_messages)
+        streamer.close()
+        server_stats = server.close()
+        logging.info(
+            f"producers: {num_producers} enqueue: {enqueue_rate:,.0f} messages/sec "
+            f"end-to-end: {end_to_end_rate:,.0f} messages/sec (server received {server_stats['num_data_messages']})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_messages", default=100_000, type=int)
+    parser.add_argument("--producer_counts", default="1,4,16", type=str, help="A comma separated list of producer thread counts to test.")
+    parser.add_argument("--num_worker_threads", default=4, type=int)
+    parser.add_argument("--max_batch_size", default=64, type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(args)
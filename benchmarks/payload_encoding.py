@@ -0,0 +1,65 @@
+# A benchmark of the encoded size and encode/decode time of numeric sensor payloads in the JSON and binary wire formats.
+# usage:
+#   python -m benchmarks.payload_encoding --num_samples=1024 --num_messages=1000
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+
+from archetypeai._binary_codec import decode_message, encode_message
+
+
+def make_message(num_samples: int) -> dict:
+    return {
+        "h": "dm",
+        "topic_id": "imu",
+        "data": {"accel": np.random.randn(num_samples, 3).astype(np.float32), "audio": np.random.randint(-32768, 32767, num_samples, dtype=np.int16)},
+        "timestamp": time.time(),
+        "message_id": 0,
+    }
+
+
+def benchmark_json(message: dict, num_messages: int) -> tuple[int, float, float]:
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        # The JSON wire format requires the arrays to be converted to lists first.
+        json_message = {**message, "data": {key: value.tolist() for key, value in message["data"].items()}}
+        message_bytes = json.dumps(json_message).encode()
+    encode_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        json.loads(message_bytes)
+    decode_time = time.perf_counter() - start_time
+    return len(message_bytes), encode_time, decode_time
+
+
+def benchmark_binary(message: dict, num_messages: int) -> tuple[int, float, float]:
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        message_bytes = encode_message(message)
+    encode_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for _ in range(num_messages):
+        decode_message(message_bytes)
+    decode_time = time.perf_counter() - start_time
+    return len(message_bytes), encode_time, decode_time
+
+
+def main(args):
+    message = make_message(args.num_samples)
+    for wire_format, benchmark_fn in (("json", benchmark_json), ("binary", benchmark_binary)):
+        num_bytes, encode_time, decode_time = benchmark_fn(message, args.num_messages)
+        logging.info(f"{wire_format}: {num_bytes:,} bytes/message "
+                     f"encode: {1e6 * encode_time / args.num_messages:.1f} us/message "
+                     f"decode: {1e6 * decode_time / args.num_messages:.1f} us/message")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_samples", default=1024, type=int)
+    parser.add_argument("--num_messages", default=1000, type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(args)
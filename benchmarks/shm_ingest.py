@@ -0,0 +1,64 @@
+# A benchmark of the samples/sec that producer processes can stream through a shared memory ingest ring.
+# usage:
+#   python -m benchmarks.shm_ingest --producer_counts=1,2,4,8 --num_samples=100000
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+
+from archetypeai._event_buffer import OVERFLOW_BLOCK
+from archetypeai._shm_ring import SharedMemoryRing
+
+
+def produce(ring_name: str, producer_index: int, num_samples: int, start_event) -> None:
+    ring = SharedMemoryRing.attach(ring_name, producer_index, OVERFLOW_BLOCK)
+    data = {"accel": [0.1, 0.2, 0.3], "gyro": [1.0, 2.0, 3.0]}
+    start_event.wait()
+    for _ in range(num_samples):
+        ring.put("imu", data, sensor_name=f"device_{producer_index}")
+    ring.close()
+
+
+def run_producers(num_producers: int, num_samples: int, num_slots: int, max_batch_size: int) -> tuple[float, dict]:
+    """Returns the rate in samples/sec at which num_producers processes put num_samples in total, and the ring stats."""
+    ring = SharedMemoryRing(num_producers=num_producers, num_slots=num_slots, slot_size_bytes=256)
+    num_samples_per_producer = num_samples // num_producers
+    start_event = multiprocessing.Event()
+    producers = [
+        multiprocessing.Process(target=produce, args=(ring.name, producer_index, num_samples_per_producer, start_event))
+        for producer_index in range(num_producers)
+    ]
+    for producer in producers:
+        producer.start()
+    start_time = time.perf_counter()
+    start_event.set()
+    num_samples_read = 0
+    while num_samples_read < num_samples_per_producer * num_producers:
+        num_samples_read += len(ring.get_batch(max_batch_size))
+    total_time = time.perf_counter() - start_time
+    for producer in producers:
+        producer.join()
+    stats = ring.get_stats()
+    ring.close()
+    return num_samples_read / total_time, stats
+
+
+def main(args):
+    logging.info(f"cpus: {os.cpu_count()}")
+    for num_producers in args.producer_counts.split(","):
+        rate, stats = run_producers(int(num_producers), args.num_samples, args.num_slots, args.max_batch_size)
+        logging.info(
+            f"producers: {num_producers} drained: {rate:,.0f} samples/sec "
+            f"(put: {stats['num_samples_put']} dropped: {stats['num_dropped_samples']})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_samples", default=100_000, type=int)
+    parser.add_argument("--producer_counts", default="1,2,4,8", type=str, help="A comma separated list of producer process counts to test.")
+    parser.add_argument("--num_slots", default=4096, type=int)
+    parser.add_argument("--max_batch_size", default=256, type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(args)
@@ -0,0 +1,72 @@
+# A benchmark of the idle CPU usage and send throughput of a SocketManager sensor stream.
+# usage:
+#   python -m benchmarks.socket_manager_throughput --num_messages=50000 --idle_time_sec=3
+#   python -m benchmarks.socket_manager_throughput --batch_sizes=1,8,64,256 --batch_linger_sec=0.005
+import argparse
+import logging
+import time
+
+from archetypeai._socket_manager import SocketManager
+from tests.local_servers import LocalStreamerProcess
+
+
+def measure_idle_cpu(streamer: SocketManager, idle_time_sec: float) -> float:
+    """Returns the CPU usage of the client process while the stream is idle, as a percentage of a core."""
+    start_cpu_time = time.process_time()
+    time.sleep(idle_time_sec)
+    return 100.0 * (time.process_time() - start_cpu_time) / idle_time_sec
+
+
+def measure_send_throughput(streamer: SocketManager, num_messages: int) -> float:
+    """Returns the number of messages per second sent over the socket, including draining the queue."""
+    data = {"accel": [0.1, 0.2, 0.3], "gyro": [1.0, 2.0, 3.0]}
+    start_time = time.time()
+    for _ in range(num_messages):
+        streamer.send("imu", data)
+    while streamer.get_outgoing_message_queue_size() > 0:
+        time.sleep(0.001)
+    return num_messages / (time.time() - start_time)
+
+
+def run_benchmark(args, max_batch_size: int) -> None:
+    server = LocalStreamerProcess()
+    streamer = SocketManager(
+        "fake_api_key",
+        server.endpoint,
+        num_worker_threads=args.num_worker_threads,
+        max_batch_size=max_batch_size,
+        batch_linger_sec=args.batch_linger_sec)
+    streamer._start_stream("benchmark_stream", server.endpoint, "sensors/streamer")
+    logging.info(f"max_batch_size: {max_batch_size}")
+
+    if args.idle_time_sec > 0:
+        idle_cpu = measure_idle_cpu(streamer, args.idle_time_sec)
+        logging.info(f"  idle cpu: {idle_cpu:.1f}% over {args.idle_time_sec:.1f} sec")
+    messages_per_sec = measure_send_throughput(streamer, args.num_messages)
+    stats = streamer.get_stats()
+    logging.info(f"  send throughput: {messages_per_sec:,.0f} messages/sec ({args.num_messages} messages)")
+    logging.info(f"  avg batch size: {stats['avg_batch_size']:.1f} frames sent: {stats['num_frames_sent']}")
+    for histogram_name in ("queue_wait_sec", "send_time_sec", "end_to_end_latency_sec"):
+        histogram = stats[histogram_name]
+        logging.info(f"  {histogram_name}: p50: {1e3 * histogram['p50']:.3f}ms p99: {1e3 * histogram['p99']:.3f}ms max: {1e3 * histogram['max']:.3f}ms")
+
+    streamer.close()
+    server_stats = server.close()
+    logging.info(f"  server received {server_stats['num_data_messages']} data messages in {server_stats['num_frames']} frames")
+
+
+def main(args):
+    for max_batch_size in args.batch_sizes.split(","):
+        run_benchmark(args, int(max_batch_size))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_messages", default=50_000, type=int)
+    parser.add_argument("--idle_time_sec", default=3.0, type=float)
+    parser.add_argument("--num_worker_threads", default=1, type=int)
+    parser.add_argument("--batch_sizes", default="1", type=str, help="A comma separated list of max batch sizes to test.")
+    parser.add_argument("--batch_linger_sec", default=0.0, type=float)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(args)
@@ -0,0 +1,72 @@
+# A benchmark of the CPU cost of decoding and filtering SSE lens events in the reader.
+# usage:
+#   python -m benchmarks.sse_decoding --num_events=100000
+import argparse
+import json
+import logging
+import time
+
+from archetypeai._sse import SseEventFilter
+
+
+def generate_events(num_events: int, heartbeat_ratio: float, payload_size: int) -> list[str]:
+    """Generates raw SSE payloads with a mix of heartbeats, logs and inference results."""
+    events = []
+    heartbeat_every = max(int(1 / heartbeat_ratio), 1) if heartbeat_ratio > 0 else 0
+    for index in range(num_events):
+        if heartbeat_every and index % heartbeat_every == 0:
+            event = {"type": "sse.stream.heartbeat", "timestamp": time.time()}
+        elif index % 2 == 0:
+            event = {"type": "session.log", "event_data": {"message": "x" * payload_size}}
+        else:
+            event = {"type": "inference.result", "event_data": {"index": index, "response": ["y" * payload_size]}}
+        events.append(json.dumps(event))
+    return events
+
+
+def run_baseline(events: list[str]) -> int:
+    """Mirrors the previous reader: decode and log every event, then let the consumer filter."""
+    num_kept = 0
+    for data in events:
+        logging.debug(data)
+        event_data = json.loads(data)
+        if event_data["type"] == "inference.result":
+            num_kept += 1
+    return num_kept
+
+
+def run_filter(events: list[str], event_filter: SseEventFilter) -> int:
+    num_kept = 0
+    for data in events:
+        _, event_data = event_filter.decode(data)
+        if event_data is not None:
+            num_kept += 1
+    return num_kept
+
+
+def measure(name: str, num_events: int, benchmark_fn, *args) -> None:
+    start_time = time.process_time()
+    num_kept = benchmark_fn(*args)
+    cpu_time = time.process_time() - start_time
+    cpu_time_per_100k = cpu_time * 100_000 / num_events
+    logging.info(f"{name:<24} kept: {num_kept:>8} cpu: {cpu_time:.3f} sec ({cpu_time_per_100k:.3f} sec / 100k events)")
+
+
+def main(args):
+    events = generate_events(args.num_events, args.heartbeat_ratio, args.payload_size)
+    measure("decode all (baseline)", args.num_events, run_baseline, events)
+    measure("filter by type", args.num_events, run_filter, events, SseEventFilter(event_types=["inference.result"]))
+    measure("filter by type + fields", args.num_events, run_filter, events,
+            SseEventFilter(event_types=["inference.result"], fields=["event_data"]))
+    measure("filter by type + lazy", args.num_events, run_filter, events,
+            SseEventFilter(event_types=["inference.result"], lazy_decode=True))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_events", default=100_000, type=int)
+    parser.add_argument("--heartbeat_ratio", default=0.3, type=float)
+    parser.add_argument("--payload_size", default=512, type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(args)
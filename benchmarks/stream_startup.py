@@ -0,0 +1,42 @@
+# A benchmark of the time it takes a SocketManager stream to connect, handshake and start its workers.
+# usage:
+#   python -m benchmarks.stream_startup --num_runs=20 --worker_counts=1,4,8
+import argparse
+import logging
+import statistics
+import time
+
+from archetypeai._socket_manager import SocketManager
+from tests.local_servers import LocalStreamerProcess
+
+
+def measure_startup_times(endpoint: str, num_worker_threads: int, num_runs: int) -> list[float]:
+    """Returns the time each of num_runs stream starts took in seconds."""
+    startup_times = []
+    for run_index in range(num_runs):
+        streamer = SocketManager("fake_api_key", endpoint, num_worker_threads=num_worker_threads)
+        start_time = time.perf_counter()
+        streamer._start_stream(f"benchmark_stream_{run_index}", endpoint, "sensors/streamer")
+        startup_times.append(time.perf_counter() - start_time)
+        streamer.close()
+    return startup_times
+
+
+def main(args):
+    server = LocalStreamerProcess()
+    for num_worker_threads in args.worker_counts.split(","):
+        startup_times = measure_startup_times(server.endpoint, int(num_worker_threads), args.num_runs)
+        startup_times_ms = [1e3 * startup_time for startup_time in startup_times]
+        logging.info(
+            f"workers: {num_worker_threads} stream start: "
+            f"median: {statistics.median(startup_times_ms):.1f}ms max: {max(startup_times_ms):.1f}ms ({args.num_runs} runs)")
+    server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_runs", default=20, type=int)
+    parser.add_argument("--worker_counts", default="1,4,8", type=str, help="A comma separated list of worker thread counts to test.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(args)
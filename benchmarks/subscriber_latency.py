@@ -0,0 +1,53 @@
+# A benchmark of the delivery latency and idle control traffic of fixed, adaptive and push mode subscribers.
+# usage:
+#   python -m benchmarks.subscriber_latency --num_events=100 --event_interval_sec=0.05 --idle_time_sec=3
+import argparse
+import logging
+import statistics
+import time
+
+from archetypeai._socket_manager import SocketManager
+from tests.local_servers import LocalStreamerServer
+
+_SUBSCRIBER_CONFIGS = {
+    "fixed": {"fetch_time_sec": 0.1},
+    "adaptive": {"fetch_time_sec": 0.02, "max_fetch_time_sec": 1.0},
+    "push": {"push_mode": True},
+}
+
+
+def measure_delivery_latency(server: LocalStreamerServer, subscriber: SocketManager, args) -> list[float]:
+    """Returns the time from queuing each event on the server until it is read from the subscriber."""
+    latencies = []
+    for index in range(args.num_events):
+        server.queue_sensor_data("sensor", "imu", {"index": index, "queue_time": time.time()})
+        _, _, data = subscriber.incoming_data_queue.get(timeout=10)
+        latencies.append(time.time() - data["queue_time"])
+        time.sleep(args.event_interval_sec)
+    return latencies
+
+
+def main(args):
+    server = LocalStreamerServer()
+    for name, config in _SUBSCRIBER_CONFIGS.items():
+        subscriber = SocketManager("fake_api_key", server.endpoint, **config)
+        subscriber._start_stream("benchmark_stream", server.endpoint, "sensors/subscriber")
+        latencies = measure_delivery_latency(server, subscriber, args)
+        num_control_messages = server.stats["num_control_messages"]
+        time.sleep(args.idle_time_sec)
+        idle_control_messages_per_sec = (server.stats["num_control_messages"] - num_control_messages) / args.idle_time_sec
+        subscriber.close()
+        logging.info(f"{name}: median latency: {1e3 * statistics.median(latencies):.1f}ms "
+                     f"max latency: {1e3 * max(latencies):.1f}ms "
+                     f"idle control messages: {idle_control_messages_per_sec:.1f}/sec")
+    server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_events", default=100, type=int)
+    parser.add_argument("--event_interval_sec", default=0.05, type=float)
+    parser.add_argument("--idle_time_sec", default=3.0, type=float)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(args)
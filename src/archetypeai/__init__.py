@@ -1,6 +1,8 @@
 from .api_client import ArchetypeAI
 from .utils import ArgParser, pformat
 from ._errors import ApiError
+from ._result_cache import ResultCache
+from ._sse import CaptureReplayReader
 
-__all__ = ["ArchetypeAI", "ApiError", "ArgParser", "pformat"]
+__all__ = ["ArchetypeAI", "ApiError", "ResultCache", "CaptureReplayReader", "ArgParser", "pformat"]
 __version__ = ArchetypeAI.get_version()
@@ -1,5 +1,6 @@
 from typing import Dict, List, Tuple, Optional
 
+import json
 import logging
 from pathlib import Path
 import secrets
@@ -8,6 +9,7 @@ import requests
 
 from archetypeai._common import DEFAULT_ENDPOINT, safely_extract_response_data
 from archetypeai._errors import ApiError
+from archetypeai._result_cache import ResultCache, hash_payload
 
 
 class ApiBase:
@@ -19,6 +21,7 @@ class ApiBase:
                  num_retries: int = 3,
                  client_id: str = "",
                  request_timeout_sec: Optional[int] = None,
+                 result_cache: Optional[ResultCache] = None,
                  ) -> None:
         self.api_key = api_key
         self.api_endpoint = api_endpoint
@@ -28,6 +31,7 @@ class ApiBase:
         self.invalid_response_codes = [error_code for error_code in range(400, 417)]
         self.client_id = client_id if client_id else secrets.token_hex(8)  # Generate a uid for this client.
         self.request_timeout_sec = request_timeout_sec
+        self.result_cache = result_cache
     
     def requests_get(self, api_endpoint: str, params: dict = {}, additional_headers: dict = {}) -> dict:
         request_args = {"api_endpoint": api_endpoint, "params": params, "additional_headers": additional_headers}
@@ -49,6 +53,25 @@ class ApiBase:
             timeout=self.request_timeout_sec)
         return response.status_code, safely_extract_response_data(response)
 
+    def cached_requests_post(self, api_endpoint: str, data: dict, cache_payload: dict, bypass_cache: bool = False) -> dict:
+        """Posts the JSON data, serving the response from the result cache when enabled.
+
+        The cache key is derived from the endpoint and cache_payload, which lets callers exclude
+        fields such as the session_id that don't affect the result. When bypass_cache is set the
+        lookup is skipped but the fresh response still refreshes the cache.
+        """
+        if self.result_cache is None:
+            return self.requests_post(api_endpoint, data_payload=json.dumps(data))
+        cache_key = hash_payload(cache_payload, namespace=api_endpoint)
+        if not bypass_cache:
+            response = self.result_cache.get(cache_key)
+            if response is not None:
+                return response
+        response = self.requests_post(api_endpoint, data_payload=json.dumps(data))
+        if isinstance(response, dict) and "errors" not in response:
+            self.result_cache.put(cache_key, response)
+        return response
+
     def requests_delete(self, api_endpoint: str, params: dict = {}, additional_headers: dict = {}) -> dict:
         request_args = {"api_endpoint": api_endpoint, "params": params, "additional_headers": additional_headers}
         return self._execute_request(request_func=self._requests_delete, request_args=request_args)
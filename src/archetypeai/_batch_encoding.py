@@ -0,0 +1,64 @@
+from typing import Any, Optional
+import json
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+def is_dataframe(values: Any) -> bool:
+    return pd is not None and isinstance(values, pd.DataFrame)
+
+
+def get_timestamps(timestamps: Optional[Any], values: Any) -> list[float]:
+    """Returns one timestamp in seconds per row.
+
+    Without timestamps, the DatetimeIndex of a DataFrame is used, or else the current time for every row.
+    """
+    num_rows = len(values)
+    if timestamps is None:
+        if is_dataframe(values) and isinstance(values.index, pd.DatetimeIndex):
+            # asi8 is in nanoseconds since the epoch (UTC for timezone aware indexes).
+            return (values.index.asi8 / 1e9).tolist()
+        return [time.time()] * num_rows
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    assert timestamps.shape == (num_rows,), f"Expected {num_rows} timestamps, got an array of shape {timestamps.shape}"
+    assert np.isfinite(timestamps).all(), "Timestamps must be finite"
+    return timestamps.tolist()
+
+
+def encode_rows(values: Any) -> list[str]:
+    """Encodes each row of an array or DataFrame as JSON, serializing the whole batch at once where possible.
+
+    DataFrame rows are encoded as {column: value} objects by pandas. Numeric 1-D and 2-D arrays are
+    encoded in one json.dumps call that is split into rows, as their rows can't contain the separators.
+    """
+    if is_dataframe(values):
+        return [row for row in values.to_json(orient="records", lines=True).split("\n") if row]
+    if np is not None and isinstance(values, np.ndarray) and _is_numeric(values) and len(values) > 0:
+        if values.ndim == 1:
+            return json.dumps(values.tolist())[1:-1].split(", ")
+        if values.ndim == 2:
+            return [f"[{row}]" for row in json.dumps(values.tolist())[2:-2].split("], [")]
+    rows = values.tolist() if np is not None and isinstance(values, np.ndarray) else values
+    return [json.dumps(row) for row in rows]
+
+
+def get_row_values(values: Any) -> list:
+    """Returns the rows of an array (as views) or a DataFrame (as dicts), for the binary wire format."""
+    if is_dataframe(values):
+        return values.to_dict(orient="records")
+    if np is not None and isinstance(values, np.ndarray) and values.ndim == 1:
+        return values.tolist()  # Python numbers rather than NumPy scalars.
+    return list(values)
+
+
+def _is_numeric(values: Any) -> bool:
+    return any(np.issubdtype(values.dtype, dtype) for dtype in (np.integer, np.floating, np.bool_))
@@ -0,0 +1,118 @@
+from typing import Any
+import json
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Binary frames start with a magic prefix that can never start a JSON frame.
+_BINARY_MAGIC = b"\x00ATB"
+_BINARY_VERSION = 1
+_PREFIX_FORMAT = "<4sBI"  # magic, version, header length.
+_PREFIX_SIZE = struct.calcsize(_PREFIX_FORMAT)
+_BUFFER_LENGTH_FORMAT = "<Q"
+_BUFFER_LENGTH_SIZE = struct.calcsize(_BUFFER_LENGTH_FORMAT)
+_BUFFER_KEY = "__buf__"
+_BYTES_DTYPE = "bytes"
+
+
+def is_binary_frame(frame: bytes) -> bool:
+    return isinstance(frame, (bytes, bytearray, memoryview)) and bytes(frame[:len(_BINARY_MAGIC)]) == _BINARY_MAGIC
+
+
+def is_buffer(value: Any) -> bool:
+    """Returns true for values sent as raw buffers in binary mode (NumPy arrays and bytes-like objects)."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return True
+    return np is not None and isinstance(value, np.ndarray) and value.dtype != object
+
+
+def estimate_size(value: Any) -> int:
+    """Returns a cheap estimate of the encoded size of a value without encoding it."""
+    if np is not None and isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, memoryview):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(len(str(key)) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value)
+    return len(str(value))
+
+
+def encode_message(message: dict) -> bytes:
+    """Encodes a message with NumPy arrays and bytes-like values into a binary frame.
+
+    The frame is a prefix (magic, version, header length), a compact JSON header holding the message
+    with each buffer replaced by a {"__buf__": index} placeholder plus the dtype and shape of each
+    buffer, followed by each buffer's raw bytes prefixed by its uint64 length. Arrays are written from
+    their own memory, so numeric data is never converted to Python lists or decimal text.
+    """
+    buffers = []
+    buffer_specs = []
+    header = {"message": _extract_buffers(message, buffers, buffer_specs), "buffers": buffer_specs}
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    frame_parts = [struct.pack(_PREFIX_FORMAT, _BINARY_MAGIC, _BINARY_VERSION, len(header_bytes)), header_bytes]
+    for buffer in buffers:
+        frame_parts.append(struct.pack(_BUFFER_LENGTH_FORMAT, buffer.nbytes))
+        frame_parts.append(buffer)
+    return b"".join(frame_parts)
+
+
+def decode_message(frame: bytes) -> dict:
+    """Decodes a binary frame. Arrays are returned as read-only NumPy views onto the frame."""
+    frame = memoryview(frame)
+    magic, version, header_length = struct.unpack_from(_PREFIX_FORMAT, frame)
+    assert magic == _BINARY_MAGIC, "Invalid binary frame"
+    assert version == _BINARY_VERSION, f"Unsupported binary frame version: {version}"
+    offset = _PREFIX_SIZE
+    header = json.loads(bytes(frame[offset:offset + header_length]))
+    offset += header_length
+    buffers = []
+    for buffer_spec in header["buffers"]:
+        buffer_length, = struct.unpack_from(_BUFFER_LENGTH_FORMAT, frame, offset)
+        offset += _BUFFER_LENGTH_SIZE
+        buffer = frame[offset:offset + buffer_length]
+        offset += buffer_length
+        if buffer_spec["dtype"] == _BYTES_DTYPE:
+            buffers.append(bytes(buffer))
+        else:
+            assert np is not None, "numpy is required to decode array payloads"
+            array = np.frombuffer(buffer, dtype=np.dtype(buffer_spec["dtype"]))
+            buffers.append(array.reshape(buffer_spec["shape"]))
+    return _insert_buffers(header["message"], buffers)
+
+
+def _extract_buffers(value: Any, buffers: list, buffer_specs: list) -> Any:
+    if isinstance(value, dict):
+        return {key: _extract_buffers(item, buffers, buffer_specs) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_extract_buffers(item, buffers, buffer_specs) for item in value]
+    if is_buffer(value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            buffer = memoryview(value).cast("B")
+            buffer_specs.append({"dtype": _BYTES_DTYPE})
+        else:
+            # Only non-contiguous arrays are copied, contiguous arrays are sent from their own buffer.
+            array = np.require(value, requirements="C")
+            buffer = memoryview(array.reshape(-1).view(np.uint8))
+            buffer_specs.append({"dtype": array.dtype.str, "shape": list(array.shape)})
+        buffers.append(buffer)
+        return {_BUFFER_KEY: len(buffers) - 1}
+    if np is not None and isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _insert_buffers(value: Any, buffers: list) -> Any:
+    if isinstance(value, dict):
+        if len(value) == 1 and _BUFFER_KEY in value:
+            return buffers[value[_BUFFER_KEY]]
+        return {key: _insert_buffers(item, buffers) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_insert_buffers(item, buffers) for item in value]
+    return value
@@ -0,0 +1,116 @@
+from typing import Any, Callable, Optional
+from collections import deque
+from concurrent.futures import Future
+import json
+import logging
+import threading
+import time
+
+
+class BroadcastBatcher:
+    """Accumulates broadcast messages across topics and sends them in batches on a background thread.
+
+    Each message is JSON encoded when it is queued and sent with the messages queued after it, up to
+    max_batch_size messages or max_batch_bytes of encoded messages, once the limit is reached or
+    linger_sec after the first message of the batch was queued. send_fn posts a list of encoded
+    messages in one request and returns the response, which becomes the result of the future of each
+    message in the batch, or the exception it raised becomes their exception. close() sends the
+    queued messages before it stops the thread.
+    """
+
+    def __init__(
+        self,
+        send_fn: Callable[[list[str]], Any],
+        max_batch_size: int = 256,
+        max_batch_bytes: int = 256 * 1024,
+        linger_sec: float = 0.005,
+        ) -> None:
+        assert max_batch_size > 0, "The max batch size must be positive"
+        self.send_fn = send_fn
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.linger_sec = linger_sec
+        # (encoded message, future, enqueue time) in the order they were queued.
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.stats = {"num_messages": 0, "num_batches": 0, "num_failed_batches": 0, "num_failed_messages": 0}
+        self.thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self.thread.start()
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def put(self, topic_id: str, message: Any) -> Future:
+        """Queues a message, returning a future of the response to the request that sends it."""
+        assert topic_id, "Failed to broadcast message, topic id is empty!"
+        encoded = json.dumps({"topic_id": topic_id, "message": message})
+        future = Future()
+        with self.condition:
+            assert not self.stopped, "Broadcast batcher is closed"
+            self.pending.append((encoded, future, time.monotonic()))
+            self.pending_bytes += len(encoded)
+            # The worker only needs waking for the first message of a batch and once a batch is full.
+            if len(self.pending) == 1 or len(self.pending) >= self.max_batch_size or self.pending_bytes >= self.max_batch_bytes:
+                self.condition.notify()
+        return future
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Sends the queued messages for up to timeout seconds. Returns true if all of them were sent."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            logging.warning(f"Timed out sending {len(self.pending)} queued broadcast messages")
+            return False
+        return True
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                linger_deadline = self.pending[0][2] + self.linger_sec
+                while not self.stopped and len(self.pending) < self.max_batch_size and self.pending_bytes < self.max_batch_bytes:
+                    remaining_sec = linger_deadline - time.monotonic()
+                    if remaining_sec <= 0.0:
+                        break
+                    self.condition.wait(remaining_sec)
+                batch = self._take_batch()
+            self._send_batch(batch)
+
+    def _take_batch(self) -> list[tuple[str, Future, float]]:
+        """Takes up to max_batch_size queued messages and max_batch_bytes, but at least one message."""
+        batch = [self.pending.popleft()]
+        num_bytes = len(batch[0][0])
+        while self.pending and len(batch) < self.max_batch_size and num_bytes + len(self.pending[0][0]) <= self.max_batch_bytes:
+            batch.append(self.pending.popleft())
+            num_bytes += len(batch[-1][0])
+        self.pending_bytes -= num_bytes
+        return batch
+
+    def _send_batch(self, batch: list[tuple[str, Future, float]]) -> None:
+        try:
+            response = self.send_fn([encoded for encoded, _, _ in batch])
+        except Exception as exception:
+            logging.warning(f"Failed to broadcast a batch of {len(batch)} messages: {exception}")
+            self.stats["num_failed_batches"] += 1
+            self.stats["num_failed_messages"] += len(batch)
+            for _, future, _ in batch:
+                future.set_exception(exception)
+            return
+        self.stats["num_batches"] += 1
+        self.stats["num_messages"] += len(batch)
+        for _, future, _ in batch:
+            future.set_result(response)
+
+    def get_stats(self) -> dict:
+        """Returns the number of messages and batches sent and failed, the average batch size and queue size."""
+        stats = dict(self.stats)
+        stats["avg_batch_size"] = stats["num_messages"] / stats["num_batches"] if stats["num_batches"] > 0 else 0.0
+        stats["queue_size"] = len(self.pending)
+        return stats
@@ -0,0 +1,99 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+CAPTURE_INDEX_FILE_EXT = ".idx"
+
+
+class EventCaptureWriter:
+    """Tees received events into an append-only, gzip compressed JSONL capture file.
+
+    Each record holds the receive time and the raw event payload. Records are compressed in chunks of
+    up to events_per_chunk events (or every flush_interval_sec), each chunk being an independent gzip
+    member, and a JSONL index of the byte offset, first event index and first receive time of each
+    chunk is written alongside so a replay can seek without decompressing the whole capture.
+    """
+
+    def __init__(self, filename: str, events_per_chunk: int = 256, flush_interval_sec: float = 1.0) -> None:
+        self.filename = str(filename)
+        self.index_filename = self.filename + CAPTURE_INDEX_FILE_EXT
+        self.events_per_chunk = events_per_chunk
+        self.flush_interval_sec = flush_interval_sec
+        self.lock = threading.Lock()
+        self.pending_records = []
+        self.pending_start_time = 0.0
+        self.num_events = 0
+        self.num_bytes_written = 0
+        # Continue the event numbering of an existing capture.
+        for chunk in load_capture_index(self.index_filename):
+            self.num_events = chunk["first_event_index"] + chunk["num_events"]
+        self.file_handle = open(self.filename, "ab")
+        self.index_handle = open(self.index_filename, "a")
+
+    def __del__(self):
+        self.close()
+
+    def write(self, data: str, receive_time: float = -1.0) -> None:
+        """Appends a raw event payload received at receive_time (defaults to now)."""
+        receive_time = receive_time if receive_time >= 0 else time.time()
+        with self.lock:
+            if self.file_handle is None:
+                return
+            if not self.pending_records:
+                self.pending_start_time = receive_time
+            self.pending_records.append(json.dumps({"t": receive_time, "data": data}))
+            if len(self.pending_records) >= self.events_per_chunk or \
+                    receive_time - self.pending_start_time >= self.flush_interval_sec:
+                self._flush_chunk()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush_chunk()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file_handle is None:
+                return
+            self._flush_chunk()
+            self.file_handle.close()
+            self.index_handle.close()
+            self.file_handle = None
+            self.index_handle = None
+
+    def _flush_chunk(self) -> None:
+        # Must be called with the lock held.
+        if not self.pending_records or self.file_handle is None:
+            return
+        chunk_bytes = gzip.compress(("\n".join(self.pending_records) + "\n").encode())
+        offset = self.file_handle.seek(0, os.SEEK_END)
+        self.file_handle.write(chunk_bytes)
+        self.file_handle.flush()
+        chunk = {
+            "offset": offset,
+            "size": len(chunk_bytes),
+            "first_event_index": self.num_events,
+            "num_events": len(self.pending_records),
+            "start_time": self.pending_start_time,
+        }
+        self.index_handle.write(json.dumps(chunk) + "\n")
+        self.index_handle.flush()
+        self.num_events += len(self.pending_records)
+        self.num_bytes_written += len(chunk_bytes)
+        self.pending_records = []
+
+
+def load_capture_index(index_filename: str) -> list[dict]:
+    """Loads the chunk index of a capture file, skipping any partially written trailing line."""
+    chunks = []
+    if not os.path.isfile(index_filename):
+        return chunks
+    with open(index_filename, "r") as file_handle:
+        for line in file_handle:
+            try:
+                chunks.append(json.loads(line))
+            except ValueError:
+                logging.warning(f"Skipping invalid capture index entry in {index_filename}")
+    return chunks
@@ -0,0 +1,186 @@
+from typing import Any, Callable, Optional
+from fnmatch import fnmatchcase
+from queue import Queue
+import logging
+import threading
+import time
+
+from archetypeai._event_buffer import EventBuffer, OVERFLOW_DROP_OLDEST
+from archetypeai._stream_stats import LatencyHistogram
+
+
+class _Handler:
+    """A registered callback with its own bounded event queue and latency stats."""
+
+    def __init__(
+        self,
+        handler_id: int,
+        callback: Callable,
+        sensor_pattern: str,
+        topic_pattern: str,
+        max_queue_size: int,
+        overflow_policy: str,
+        ) -> None:
+        self.handler_id = handler_id
+        self.callback = callback
+        self.sensor_pattern = sensor_pattern
+        self.topic_pattern = topic_pattern
+        # Events are (sensor_name, topic_id, data, arrival_time) tuples, keyed by topic for the drop stats.
+        self.events = EventBuffer(max_queue_size, overflow_policy, get_key=lambda event: event[1])
+        self.lock = threading.Lock()
+        self.scheduled = False
+        self.removed = False
+        self.dispatch_latency = LatencyHistogram()
+        self.handler_time = LatencyHistogram()
+        self.num_errors = 0
+
+    def matches(self, sensor_name: str, topic_id: str) -> bool:
+        return fnmatchcase(sensor_name, self.sensor_pattern) and fnmatchcase(topic_id, self.topic_pattern)
+
+    def get_stats(self) -> dict:
+        queue_stats = self.events.get_stats()
+        return {
+            "sensor_pattern": self.sensor_pattern,
+            "topic_pattern": self.topic_pattern,
+            "num_events": self.handler_time.count,
+            "num_errors": self.num_errors,
+            "queue_size": queue_stats["queue_size"],
+            "num_dropped_events": queue_stats["num_dropped_events"],
+            "num_dropped_events_per_topic": queue_stats["num_dropped_events_per_key"],
+            "dispatch_latency_sec": self.dispatch_latency.get_stats(),
+            "handler_time_sec": self.handler_time.get_stats(),
+        }
+
+
+class CallbackDispatcher:
+    """Invokes registered callbacks for incoming sensor data and messages on a pool of threads.
+
+    Handlers are registered with fnmatch style patterns (e.g. "imu_*") for the sensor name and
+    topic_id. Each matching handler gets the event in its own queue of up to max_handler_queue_size
+    events, where the overflow_policy applies if the handler falls behind (see EventBuffer). A
+    handler is only ever run by one pool thread at a time, so its events are delivered in arrival
+    order (and so in order per topic) and the callback doesn't need to be thread-safe, while
+    different handlers run in parallel. The pool threads are started with the first handler.
+    """
+
+    def __init__(
+        self,
+        num_threads: int = 2,
+        max_handler_queue_size: int = 1024,
+        overflow_policy: str = OVERFLOW_DROP_OLDEST,
+        max_events_per_run: int = 64,
+        ) -> None:
+        self.num_threads = num_threads
+        self.max_handler_queue_size = max_handler_queue_size
+        self.overflow_policy = overflow_policy
+        self.max_events_per_run = max_events_per_run
+        self.handlers = {}
+        self.next_handler_id = 0
+        self.lock = threading.Lock()
+        # Cache of the handlers matching each (sensor_name, topic_id), reset when the handlers change.
+        self.match_cache = {}
+        self.ready_handlers = Queue()
+        self.threads = []
+
+    def add_handler(self, callback: Callable[[str, str, Any], None], sensor_pattern: str = "*", topic_pattern: str = "*") -> int:
+        """Registers callback(sensor_name, topic_id, data) for matching events. Returns the handler id."""
+        with self.lock:
+            handler_id = self.next_handler_id
+            self.next_handler_id += 1
+            self.handlers[handler_id] = _Handler(
+                handler_id, callback, sensor_pattern, topic_pattern, self.max_handler_queue_size, self.overflow_policy)
+            self.match_cache = {}
+            if not self.threads:
+                self._start_threads()
+        return handler_id
+
+    def remove_handler(self, handler_id: int) -> bool:
+        """Unregisters a handler, discarding any events still queued for it."""
+        with self.lock:
+            handler = self.handlers.pop(handler_id, None)
+            self.match_cache = {}
+        if handler is None:
+            return False
+        handler.removed = True
+        handler.events.get_batch()
+        return True
+
+    def dispatch(self, sensor_name: str, topic_id: str, data: Any) -> bool:
+        """Queues an event for every matching handler. Returns false if no handler matched."""
+        match_key = (sensor_name, topic_id)
+        handlers = self.match_cache.get(match_key)
+        if handlers is None:
+            with self.lock:
+                handlers = [handler for handler in self.handlers.values() if handler.matches(sensor_name, topic_id)]
+                self.match_cache[match_key] = handlers
+        event = (sensor_name, topic_id, data, time.time())
+        for handler in handlers:
+            handler.events.put(event)
+            with handler.lock:
+                if not handler.scheduled:
+                    handler.scheduled = True
+                    self.ready_handlers.put(handler)
+        return len(handlers) > 0
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits up to timeout seconds (forever if None) for all queued events to be handled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for handler in list(self.handlers.values()):
+            while True:
+                with handler.lock:
+                    if not handler.scheduled:
+                        break
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.001)
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Handles the queued events for up to timeout seconds, then stops the pool threads."""
+        self.join(timeout)
+        for _ in self.threads:
+            self.ready_handlers.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def get_stats(self) -> dict:
+        """Returns the queue, drop, error and latency stats of each handler by handler id."""
+        return {handler_id: handler.get_stats() for handler_id, handler in list(self.handlers.items())}
+
+    def _start_threads(self) -> None:
+        for thread_index in range(self.num_threads):
+            thread = threading.Thread(target=self._worker, args=(thread_index,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _worker(self, thread_index: int) -> None:
+        logging.debug(f"Starting dispatch thread {thread_index}")
+        while True:
+            handler = self.ready_handlers.get()
+            if handler is None:
+                return
+            for event in handler.events.get_batch(self.max_events_per_run):
+                if handler.removed:
+                    break
+                self._run_handler(handler, event)
+            # Reschedule the handler behind the others if it has more events, so no handler starves the pool.
+            with handler.lock:
+                if handler.removed:
+                    handler.events.get_batch()
+                    handler.scheduled = False
+                elif len(handler.events) > 0:
+                    self.ready_handlers.put(handler)
+                else:
+                    handler.scheduled = False
+
+    def _run_handler(self, handler: _Handler, event: tuple) -> None:
+        sensor_name, topic_id, data, arrival_time = event
+        start_time = time.time()
+        handler.dispatch_latency.record(start_time - arrival_time)
+        try:
+            handler.callback(sensor_name, topic_id, data)
+        except Exception:
+            handler.num_errors += 1
+            logging.exception(f"Handler {handler.handler_id} failed on topic_id: {topic_id}")
+        handler.handler_time.record(time.time() - start_time)
@@ -0,0 +1,312 @@
+from typing import Any, Callable, Optional
+from bisect import bisect
+from collections import deque
+import math
+import threading
+import time
+import zlib
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_DROP_HEARTBEATS = "drop_heartbeats"
+OVERFLOW_KEEP_LATEST = "keep_latest"
+_OVERFLOW_POLICIES = (
+    OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_HEARTBEATS, OVERFLOW_KEEP_LATEST)
+
+
+class EventBuffer:
+    """A bounded, thread-safe FIFO buffer with a selectable overflow policy.
+
+    Supported overflow policies:
+        block: the producer waits until the consumer frees up space (backpressure).
+        drop_oldest: the oldest buffered event is discarded to make room.
+        drop_newest: the incoming event is discarded.
+        drop_heartbeats: buffered heartbeat events are discarded first, then the oldest event.
+        keep_latest: the oldest buffered event with the same key as the incoming one is discarded
+            (so only the latest events of a key are kept), falling back to the oldest event.
+    A max_size <= 0 creates an unbounded buffer. If get_key is set, dropped events are also counted
+    per key (e.g. per topic).
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        is_heartbeat: Optional[Callable[[Any], bool]] = None,
+        get_key: Optional[Callable[[Any], Any]] = None,
+        ) -> None:
+        assert overflow_policy in _OVERFLOW_POLICIES, f"Unknown overflow policy: {overflow_policy}"
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.is_heartbeat = is_heartbeat if is_heartbeat is not None else lambda event: False
+        self.get_key = get_key
+        self.events = deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.closed = False
+        self.num_events_put = 0
+        self.num_dropped_events = 0
+        self.num_dropped_events_per_key = {}
+        self.high_water_mark = 0
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.events)
+
+    def put(self, event: Any, timeout: Optional[float] = None) -> bool:
+        """Adds an event, applying the overflow policy. Returns false if the event was dropped."""
+        with self.lock:
+            if self.max_size > 0 and len(self.events) >= self.max_size:
+                if not self._make_room(event, timeout):
+                    self._count_dropped_event(event)
+                    return False
+            self.events.append(event)
+            self.num_events_put += 1
+            self.high_water_mark = max(self.high_water_mark, len(self.events))
+            self.not_empty.notify()
+        return True
+
+    def requeue(self, events: list) -> None:
+        """Appends events moved from another buffer, beyond max_size if need be, so moving never blocks or drops them."""
+        with self.lock:
+            self.events.extend(events)
+            self.high_water_mark = max(self.high_water_mark, len(self.events))
+            self.not_empty.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Returns the next event, waiting up to timeout seconds. Raises TimeoutError if none arrive."""
+        events = self.get_batch(1, timeout)
+        if not events:
+            raise TimeoutError("No events available")
+        return events[0]
+
+    def get_batch(self, max_events: int = -1, timeout: Optional[float] = 0.0) -> list:
+        """Drains up to max_events under a single lock acquisition.
+
+        Waits up to timeout seconds (forever if None) for at least one event. Returns an empty list
+        if the timeout expires or the buffer is closed and empty.
+        """
+        with self.lock:
+            if not self.events and timeout != 0.0:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not self.events and not self.closed:
+                    remaining_time = None if deadline is None else deadline - time.monotonic()
+                    if remaining_time is not None and remaining_time <= 0:
+                        break
+                    self.not_empty.wait(remaining_time)
+            num_events = len(self.events) if max_events <= 0 else min(max_events, len(self.events))
+            events = [self.events.popleft() for _ in range(num_events)]
+            if events:
+                self.not_full.notify_all()
+            return events
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits up to timeout seconds (forever if None) for the buffer to be drained or closed.
+
+        Returns true if the buffer is empty.
+        """
+        with self.lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.events and not self.closed:
+                remaining_time = None if deadline is None else deadline - time.monotonic()
+                if remaining_time is not None and remaining_time <= 0:
+                    break
+                self.not_full.wait(remaining_time)
+            return not self.events
+
+    def close(self) -> None:
+        """Wakes up any blocked producers or consumers; buffered events can still be drained."""
+        with self.lock:
+            self.closed = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+    def reopen(self) -> None:
+        """Reopens a closed buffer so it can be reused."""
+        with self.lock:
+            self.closed = False
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = {
+                "queue_size": len(self.events),
+                "max_queue_size": self.max_size,
+                "queue_high_water_mark": self.high_water_mark,
+                "num_events_put": self.num_events_put,
+                "num_dropped_events": self.num_dropped_events,
+            }
+            if self.get_key is not None:
+                stats["num_dropped_events_per_key"] = dict(self.num_dropped_events_per_key)
+            return stats
+
+    def _make_room(self, event: Any, timeout: Optional[float]) -> bool:
+        # Must be called with the lock held.
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while len(self.events) >= self.max_size and not self.closed:
+                remaining_time = None if deadline is None else deadline - time.monotonic()
+                if remaining_time is not None and remaining_time <= 0:
+                    return False
+                self.not_full.wait(remaining_time)
+            return not self.closed
+        if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+            return False
+        if self.overflow_policy == OVERFLOW_DROP_HEARTBEATS:
+            if self.is_heartbeat(event):
+                return False
+            for index, buffered_event in enumerate(self.events):
+                if self.is_heartbeat(buffered_event):
+                    del self.events[index]
+                    self._count_dropped_event(buffered_event)
+                    return True
+        if self.overflow_policy == OVERFLOW_KEEP_LATEST and self.get_key is not None:
+            key = self.get_key(event)
+            for index, buffered_event in enumerate(self.events):
+                if self.get_key(buffered_event) == key:
+                    del self.events[index]
+                    self._count_dropped_event(buffered_event)
+                    return True
+        self._count_dropped_event(self.events.popleft())
+        return True
+
+    def _count_dropped_event(self, event: Any) -> None:
+        # Must be called with the lock held.
+        self.num_dropped_events += 1
+        if self.get_key is not None:
+            key = self.get_key(event)
+            self.num_dropped_events_per_key[key] = self.num_dropped_events_per_key.get(key, 0) + 1
+
+
+class ShardedEventBuffer:
+    """Splits events across per-shard EventBuffers by consistent hashing of their key.
+
+    All events with the same key go to the same shard, so a consumer per shard sees them in order
+    while the shards are consumed in parallel without contending on one lock. Keys are mapped to
+    shards on a hash ring with num_virtual_nodes points per shard. remove_shard() takes a shard off
+    the ring and moves its buffered events to the shards that now own their keys, which only remaps
+    the keys of the removed shard. Events are moved under the lock that routes keys missing from the
+    shard cache, which is reset with the ring, so new events of a moved key queue behind its older
+    ones. The max_size is split evenly between the shards.
+    """
+
+    def __init__(
+        self,
+        num_shards: int,
+        max_size: int = 1024,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        get_key: Optional[Callable[[Any], Any]] = None,
+        num_virtual_nodes: int = 64,
+        ) -> None:
+        assert num_shards > 0, "At least one shard is required"
+        self.get_key = get_key if get_key is not None else lambda event: event
+        self.num_virtual_nodes = num_virtual_nodes
+        max_shard_size = math.ceil(max_size / num_shards) if max_size > 0 else max_size
+        self.shards = [EventBuffer(max_shard_size, overflow_policy, get_key=get_key) for _ in range(num_shards)]
+        self.lock = threading.Lock()
+        self.num_rebalanced_events = 0
+        self._build_ring(range(num_shards))
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def get_shard(self, shard_index: int) -> EventBuffer:
+        return self.shards[shard_index]
+
+    def get_shard_index(self, key: Any) -> int:
+        """Returns the index of the shard that owns a key."""
+        shard_index = self.shard_cache.get(key)
+        if shard_index is None:
+            with self.lock:
+                shard_index = self._get_ring_shard_index(key)
+                self.shard_cache[key] = shard_index
+        return shard_index
+
+    def _get_ring_shard_index(self, key: Any) -> int:
+        # Must be called with the lock held.
+        return self.ring_shards[bisect(self.ring_hashes, _hash_key(key)) % len(self.ring_hashes)]
+
+    def put(self, event: Any, timeout: Optional[float] = None) -> bool:
+        """Adds an event to the shard that owns its key. Returns false if the event was dropped."""
+        shard_index = self.get_shard_index(self.get_key(event))
+        success = self.shards[shard_index].put(event, timeout)
+        if shard_index not in self.active_shards:
+            # The shard was removed while this event was being added, so move it to its new owner.
+            with self.lock:
+                self._move_events(shard_index)
+        return success
+
+    def remove_shard(self, shard_index: int) -> int:
+        """Takes a shard off the ring and moves its events to the remaining shards. Returns the number moved."""
+        with self.lock:
+            if shard_index not in self.active_shards or len(self.active_shards) == 1:
+                return 0
+            self._build_ring(self.active_shards - {shard_index})
+            return self._move_events(shard_index)
+
+    def get_batch(self, max_events: int = -1) -> list:
+        """Drains up to max_events from all shards without waiting."""
+        events = []
+        for shard in self.shards:
+            events.extend(shard.get_batch(max_events - len(events) if max_events > 0 else -1))
+            if max_events > 0 and len(events) >= max_events:
+                break
+        return events
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits up to timeout seconds (forever if None) for every shard to be drained or closed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for shard in self.shards:
+            remaining_time = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            if not shard.join(remaining_time):
+                return False
+        return True
+
+    def close(self) -> None:
+        for shard in self.shards:
+            shard.close()
+
+    def reopen(self) -> None:
+        """Reopens all shards and puts every shard back on the ring."""
+        with self.lock:
+            self._build_ring(range(len(self.shards)))
+        for shard in self.shards:
+            shard.reopen()
+
+    def get_stats(self) -> dict:
+        shard_stats = [shard.get_stats() for shard in self.shards]
+        stats = {"num_shards": len(self.active_shards), "num_rebalanced_events": self.num_rebalanced_events}
+        for stats_name in ("queue_size", "max_queue_size", "queue_high_water_mark", "num_events_put", "num_dropped_events"):
+            stats[stats_name] = sum(shard_stats_item[stats_name] for shard_stats_item in shard_stats)
+        stats["num_dropped_events_per_key"] = {}
+        for shard_stats_item in shard_stats:
+            for key, num_dropped_events in shard_stats_item.get("num_dropped_events_per_key", {}).items():
+                stats["num_dropped_events_per_key"][key] = stats["num_dropped_events_per_key"].get(key, 0) + num_dropped_events
+        return stats
+
+    def _build_ring(self, shard_indices) -> None:
+        # Must be called with the lock held (or from the constructor).
+        ring = sorted(
+            (_hash_key(f"{shard_index}:{node_index}"), shard_index)
+            for shard_index in shard_indices for node_index in range(self.num_virtual_nodes))
+        self.ring_hashes = [ring_hash for ring_hash, _ in ring]
+        self.ring_shards = [shard_index for _, shard_index in ring]
+        self.active_shards = set(shard_indices)
+        self.shard_cache = {}
+
+    def _move_events(self, shard_index: int) -> int:
+        # Must be called with the lock held.
+        events = self.shards[shard_index].get_batch()
+        events_per_shard = {}
+        for event in events:
+            events_per_shard.setdefault(self._get_ring_shard_index(self.get_key(event)), []).append(event)
+        for new_shard_index, shard_events in events_per_shard.items():
+            self.shards[new_shard_index].requeue(shard_events)
+        self.num_rebalanced_events += len(events)
+        return len(events)
+
+
+def _hash_key(key: Any) -> int:
+    # A stable hash, unlike hash() which is salted per process for strings.
+    return zlib.crc32(str(key).encode())
@@ -0,0 +1,92 @@
+import threading
+import time
+import zlib
+
+FRAME_COMPRESSION_NONE = "none"
+FRAME_COMPRESSION_ZLIB = "zlib"
+_FRAME_COMPRESSIONS = (FRAME_COMPRESSION_NONE, FRAME_COMPRESSION_ZLIB)
+
+# Compressed frames start with a magic prefix that can never start a JSON or binary (\x00ATB) frame.
+_COMPRESSED_MAGIC = b"\x00ATZ"
+# The tail every sync flushed deflate block ends with, which is implied rather than sent.
+_DEFLATE_TAIL = b"\x00\x00\xff\xff"
+
+
+def check_frame_compression(frame_compression: str) -> None:
+    assert frame_compression in _FRAME_COMPRESSIONS, f"Unknown frame compression: {frame_compression}"
+
+
+def is_compressed_frame(frame) -> bool:
+    return isinstance(frame, (bytes, bytearray)) and frame[:len(_COMPRESSED_MAGIC)] == _COMPRESSED_MAGIC
+
+
+class FrameCodec:
+    """Compresses and decompresses the websocket frames of a single connection with zlib.
+
+    Like websocket permessage-deflate with context takeover, each direction keeps one deflate stream
+    for the lifetime of the connection and every frame is a sync flushed block of it. Repetitive
+    payloads such as sensor JSON are compressed against everything sent before, not just the frame
+    itself, so frames must be decoded in the order they were encoded. Frames smaller than
+    min_size_bytes are sent raw. Both ends of a connection need a codec, so it is only used once the
+    server has accepted it in the handshake.
+    """
+
+    def __init__(self, level: int = 6, min_size_bytes: int = 256) -> None:
+        self.level = level
+        self.min_size_bytes = min_size_bytes
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.lock = threading.Lock()
+        self.stats = {
+            "num_frames_sent": 0,
+            "num_compressed_frames_sent": 0,
+            "num_raw_bytes_sent": 0,
+            "num_wire_bytes_sent": 0,
+            "compression_time_sec": 0.0,
+            "num_frames_received": 0,
+            "num_raw_bytes_received": 0,
+            "num_wire_bytes_received": 0,
+            "decompression_time_sec": 0.0,
+        }
+
+    def encode(self, frame: bytes) -> bytes:
+        """Returns the frame to send, compressed if it is at least min_size_bytes long."""
+        with self.lock:
+            self.stats["num_frames_sent"] += 1
+            self.stats["num_raw_bytes_sent"] += len(frame)
+            if len(frame) >= self.min_size_bytes:
+                start_time = time.perf_counter()
+                compressed_frame = self.compressor.compress(frame) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+                frame = _COMPRESSED_MAGIC + compressed_frame[:-len(_DEFLATE_TAIL)]
+                self.stats["compression_time_sec"] += time.perf_counter() - start_time
+                self.stats["num_compressed_frames_sent"] += 1
+            self.stats["num_wire_bytes_sent"] += len(frame)
+            return frame
+
+    def decode(self, frame):
+        """Returns the original frame of a received frame, decompressing it if it is compressed."""
+        with self.lock:
+            self.stats["num_frames_received"] += 1
+            self.stats["num_wire_bytes_received"] += len(frame)
+            if is_compressed_frame(frame):
+                start_time = time.perf_counter()
+                frame = self.decompressor.decompress(frame[len(_COMPRESSED_MAGIC):] + _DEFLATE_TAIL)
+                self.stats["decompression_time_sec"] += time.perf_counter() - start_time
+            self.stats["num_raw_bytes_received"] += len(frame)
+            return frame
+
+    def get_stats(self) -> dict:
+        return get_compression_stats([self])
+
+
+def get_compression_stats(codecs: list[FrameCodec]) -> dict:
+    """Sums the stats of several codecs and adds the compression ratios (raw bytes / wire bytes)."""
+    stats = {}
+    for codec in codecs:
+        for stats_name, value in list(codec.stats.items()):
+            stats[stats_name] = stats.get(stats_name, 0) + value
+    for direction in ("sent", "received"):
+        num_wire_bytes = stats.get(f"num_wire_bytes_{direction}", 0)
+        num_raw_bytes = stats.get(f"num_raw_bytes_{direction}", 0)
+        stats[f"compression_ratio_{direction}"] = num_raw_bytes / num_wire_bytes if num_wire_bytes > 0 else 1.0
+    return stats
@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, Optional
 import json
 import logging
 import time
@@ -6,8 +6,12 @@ import time
 import yaml
 
 from archetypeai._base import ApiBase
+from archetypeai._event_buffer import OVERFLOW_BLOCK
+from archetypeai._frame_codec import FRAME_COMPRESSION_NONE
 from archetypeai._lens_session_socket import LensSessionSocket
+from archetypeai._result_cache import ResultCache
 from archetypeai._sse import ServerSideEventsReader
+from archetypeai._sse_hub import SseConsumerHub
 
 
 class SessionsApi(ApiBase):
@@ -15,8 +19,10 @@ class SessionsApi(ApiBase):
 
     session_socket_cache: dict = {}
 
-    def __init__(self, api_key: str, api_endpoint: str) -> None:
-        super().__init__(api_key, api_endpoint)
+    def __init__(self, api_key: str, api_endpoint: str, result_cache: Optional[ResultCache] = None) -> None:
+        super().__init__(api_key, api_endpoint, result_cache=result_cache)
+        # The lens or session that process_event results are cached under, per session_id.
+        self.session_cache_identities = {}
 
     def __del__(self):
         self.close()
@@ -41,6 +47,8 @@ class SessionsApi(ApiBase):
         api_endpoint = self._get_endpoint(self.api_endpoint, "lens/sessions/create")
         data = {"lens_id": lens_id}
         response = self.requests_post(api_endpoint, data_payload=json.dumps(data))
+        if isinstance(response, dict) and "session_id" in response:
+            self.session_cache_identities[response["session_id"]] = {"lens_id": lens_id}
         return response
 
     def destroy(self, session_id: str) -> dict:
@@ -50,9 +58,22 @@ class SessionsApi(ApiBase):
         response = self.requests_post(api_endpoint, data_payload=json.dumps(data))
         return response
 
-    def connect(self, session_id: str, session_endpoint: str) -> bool:
+    def connect(
+        self,
+        session_id: str,
+        session_endpoint: str,
+        capture_filename: Optional[str] = None,
+        frame_compression: str = FRAME_COMPRESSION_NONE,
+        compression_level: int = 6,
+        ) -> bool:
+        """Opens a websocket to a session, optionally negotiating zlib frame compression (see LensSessionSocket)."""
         try:
-            socket = LensSessionSocket(session_endpoint, {"Authorization":f"Bearer {self.api_key}"})
+            socket = LensSessionSocket(
+                session_endpoint,
+                {"Authorization":f"Bearer {self.api_key}"},
+                capture_filename=capture_filename,
+                frame_compression=frame_compression,
+                compression_level=compression_level)
             self.session_socket_cache[session_id] = socket
         except Exception as exception:
             logging.exception(f"Failed to connect to session at {session_endpoint}")
@@ -73,19 +94,70 @@ class SessionsApi(ApiBase):
         response = self.session_socket_cache[session_id].send_and_recv(event_data)
         return response
 
-    def process_event(self, session_id: str, event: dict) -> dict:
+    def process_event(self, session_id: str, event: dict, bypass_cache: bool = False) -> dict:
+        """Sends an event to a session and returns the response.
+
+        If a result cache is configured, deterministic events (e.g. model.query) are keyed on the
+        event and the lens the session was created from, so identical queries are served from the
+        cache across sessions of the same lens. Sessions created elsewhere or changed by a
+        session.modify event are keyed on their own session_id instead.
+        """
         api_endpoint = self._get_endpoint(self.api_endpoint, "lens/sessions/events/process")
         data = {"session_id": session_id, "event": event}
+        if isinstance(event, dict) and event.get("type") == "session.modify":
+            # Results cached before the modification no longer apply to this session.
+            identity = self.session_cache_identities.get(session_id, {})
+            num_modifications = identity.get("num_modifications", 0) + 1
+            self.session_cache_identities[session_id] = {"session_id": session_id, "num_modifications": num_modifications}
+        if self.result_cache is not None and self.result_cache.is_cacheable_event(event):
+            identity = self.session_cache_identities.get(session_id, {"session_id": session_id})
+            return self.cached_requests_post(api_endpoint, data, {"session": identity, "event": event}, bypass_cache)
         response = self.requests_post(api_endpoint, data_payload=json.dumps(data))
         return response
 
-    def create_sse_consumer(self, session_id: str, max_read_time_sec: float = -1.0) -> ServerSideEventsReader:
-        """Creates a new server-side-event consumer and starts it in a background thread."""
+    def create_sse_consumer(
+        self,
+        session_id: str,
+        max_read_time_sec: float = -1.0,
+        max_queue_size: int = 1024,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        **reader_kwargs
+        ) -> ServerSideEventsReader:
+        """Creates a new server-side-event consumer and starts it in a background thread.
+
+        Any reader_kwargs (e.g. event_types, fields, lazy_decode) are passed to the ServerSideEventsReader.
+        """
         api_endpoint = self._get_endpoint(self.api_endpoint, f"lens/sessions/consumer/{session_id}")
         headers = {"Authorization":f"Bearer {self.api_key}"}
-        sse_consumer = ServerSideEventsReader(api_endpoint, headers, max_read_time_sec)
+        sse_consumer = ServerSideEventsReader(
+            api_endpoint,
+            headers,
+            max_read_time_sec,
+            max_queue_size=max_queue_size,
+            overflow_policy=overflow_policy,
+            **reader_kwargs)
         return sse_consumer
     
+    def create_sse_hub(
+        self,
+        session_ids: list[str] = [],
+        max_queue_size_per_session: int = 1024,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        **hub_kwargs
+        ) -> SseConsumerHub:
+        """Creates a hub that reads the SSE streams of many sessions on a single background thread."""
+        api_endpoint = self._get_endpoint(self.api_endpoint, "lens/sessions/consumer")
+        headers = {"Authorization":f"Bearer {self.api_key}"}
+        sse_hub = SseConsumerHub(
+            api_endpoint,
+            headers,
+            max_queue_size_per_session=max_queue_size_per_session,
+            overflow_policy=overflow_policy,
+            **hub_kwargs)
+        for session_id in session_ids:
+            sse_hub.add_session(session_id)
+        return sse_hub
+
     def close(self) -> bool:
         """Closes and removes any open session socket. Returns true if any sessions were closed, false otherwise."""
         sessions_closed = False
@@ -102,9 +174,9 @@ class LensApi(ApiBase):
 
     sessions: SessionsApi
 
-    def __init__(self, api_key: str, api_endpoint: str) -> None:
-        super().__init__(api_key, api_endpoint)
-        self.sessions = SessionsApi(api_key, api_endpoint)
+    def __init__(self, api_key: str, api_endpoint: str, result_cache: Optional[ResultCache] = None) -> None:
+        super().__init__(api_key, api_endpoint, result_cache=result_cache)
+        self.sessions = SessionsApi(api_key, api_endpoint, result_cache=result_cache)
 
     def get_info(self) -> dict:
         """Gets the high-level info for all lenses across your org."""
@@ -1,3 +1,4 @@
+from typing import Optional
 import json
 import logging
 from queue import Queue
@@ -6,12 +7,38 @@ import time
 
 import websocket
 
+from archetypeai._capture import EventCaptureWriter
+from archetypeai._frame_codec import FRAME_COMPRESSION_NONE, FrameCodec, check_frame_compression, get_compression_stats
+
 
 class LensSessionSocket:
-    """Manages websocket connections for each lens session."""
+    """Manages websocket connections for each lens session.
+
+    Set capture_filename to tee every response received from the session into a capture file.
+
+    With frame_compression="zlib", a session.frame_compression event asks the session to compress
+    frames in both directions (see FrameCodec), and frames stay uncompressed unless it agrees within
+    negotiation_timeout_sec.
+    """
 
-    def __init__(self, session_endpoint: str, header: dict):
+    def __init__(
+        self,
+        session_endpoint: str,
+        header: dict,
+        capture_filename: Optional[str] = None,
+        frame_compression: str = FRAME_COMPRESSION_NONE,
+        compression_level: int = 6,
+        compression_min_size_bytes: int = 256,
+        negotiation_timeout_sec: float = 5.0,
+        ):
+        check_frame_compression(frame_compression)
+        self.frame_compression = frame_compression
+        self.compression_level = compression_level
+        self.compression_min_size_bytes = compression_min_size_bytes
+        self.negotiation_timeout_sec = negotiation_timeout_sec
+        self.frame_codecs = []
         self.heartbeat_sec = 30
+        self.capture_writer = EventCaptureWriter(capture_filename) if capture_filename else None
         self.max_worker_restarts = 10
         self.run_worker = False
         self.read_event_queue = Queue()
@@ -31,6 +58,8 @@ class LensSessionSocket:
             self.worker.join()
             self.worker = None
             worker_stopped = True
+        if self.capture_writer is not None:
+            self.capture_writer.close()
         return worker_stopped
 
     def send_and_recv(self, event_data: dict) -> dict:
@@ -39,6 +68,10 @@ class LensSessionSocket:
         response = self.read_event_queue.get()
         response = json.loads(response)
         return response
+
+    def get_compression_stats(self) -> dict:
+        """Returns the bytes on the wire, compression ratios and CPU time of the compressed connections."""
+        return get_compression_stats(self.frame_codecs)
     
     def _worker(self, session_endpoint: str, header: dict):
         self.run_worker = True
@@ -59,6 +92,7 @@ class LensSessionSocket:
 
     def _run_worker_loop(self, session_endpoint: str, header: dict) -> bool:
         socket = websocket.create_connection(session_endpoint, header=header)
+        frame_codec = self._negotiate_frame_compression(socket)
         start_time = time.time()
         last_event = time.time()
         while self.run_worker:
@@ -69,10 +103,15 @@ class LensSessionSocket:
                 # Send the event to the server.
                 event_data = self.write_event_queue.get()
                 logging.debug(f"[{run_time:.2f}] Sending event w/ type: {event_data['type']}...")
-                socket.send_binary(json.dumps(event_data).encode())
+                event_bytes = json.dumps(event_data).encode()
+                socket.send_binary(frame_codec.encode(event_bytes) if frame_codec is not None else event_bytes)
                 # Read back the response.
                 event_data = socket.recv()
+                if event_data and frame_codec is not None:
+                    event_data = frame_codec.decode(event_data)
                 if event_data:
+                    if self.capture_writer is not None:
+                        self.capture_writer.write(event_data if isinstance(event_data, str) else event_data.decode())
                     self.read_event_queue.put(event_data)
                 else:
                     logging.warning(f"Received empty event: {event_data}")
@@ -81,4 +120,26 @@ class LensSessionSocket:
             # Send a periodic heartbeat to keep the connection alive.
             if current_time - last_event >= self.heartbeat_sec:
                 self.write_event_queue.put({"type": "session.heartbeat"})
-        return self.run_worker
\ No newline at end of file
+        return self.run_worker
+
+    def _negotiate_frame_compression(self, socket) -> Optional[FrameCodec]:
+        """Returns a frame codec if frame compression is enabled and the session accepts it."""
+        if self.frame_compression == FRAME_COMPRESSION_NONE:
+            return None
+        event_data = {"type": "session.frame_compression", "event_data": {"codec": self.frame_compression}}
+        socket.send_binary(json.dumps(event_data).encode())
+        # A session that ignores the event never answers, so don't wait on it forever.
+        socket.settimeout(self.negotiation_timeout_sec)
+        try:
+            response = json.loads(socket.recv())
+        except (ValueError, websocket.WebSocketTimeoutException):
+            response = None
+        finally:
+            socket.settimeout(None)
+        event_data = response.get("event_data") if isinstance(response, dict) else None
+        if not isinstance(event_data, dict) or event_data.get("codec") != self.frame_compression:
+            logging.info(f"The session doesn't support {self.frame_compression} frame compression, sending uncompressed frames")
+            return None
+        frame_codec = FrameCodec(self.compression_level, self.compression_min_size_bytes)
+        self.frame_codecs.append(frame_codec)
+        return frame_codec
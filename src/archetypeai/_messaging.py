@@ -1,9 +1,15 @@
-from typing import Any
+from typing import Any, Callable, Optional
+from concurrent.futures import Future
 import logging
 import json
+import threading
 import time
 
 from archetypeai._base import ApiBase
+from archetypeai._broadcast_batcher import BroadcastBatcher
+from archetypeai._dispatcher import CallbackDispatcher
+from archetypeai._event_buffer import OVERFLOW_DROP_OLDEST
+from archetypeai._frame_codec import FRAME_COMPRESSION_NONE
 from archetypeai._socket_manager import SocketManager
 
 
@@ -16,14 +22,35 @@ class MessagingApi(ApiBase):
         api_endpoint: str,
         client_name: str = "python_client",
         rate_limiter_timeout_sec: float = 0.5,
-        fetch_time_sec=1.0) -> None:
+        fetch_time_sec=0.1,
+        max_fetch_time_sec: float = 1.0,
+        push_mode: bool = False,
+        num_dispatch_threads: int = 2,
+        max_handler_queue_size: int = 1024,
+        handler_overflow_policy: str = OVERFLOW_DROP_OLDEST,
+        frame_compression: str = FRAME_COMPRESSION_NONE,
+        compression_level: int = 6,
+        max_broadcast_batch_size: int = 256,
+        max_broadcast_batch_bytes: int = 256 * 1024,
+        broadcast_linger_sec: float = 0.005) -> None:
         super().__init__(api_key, api_endpoint)
         self.client_name = client_name
         self.rate_limiter_timeout_sec = rate_limiter_timeout_sec
         self.fetch_time_sec = fetch_time_sec
+        self.max_fetch_time_sec = max_fetch_time_sec
+        self.push_mode = push_mode
         self.last_get_time = 0.0
         self.subscriber_info = []
         self.subscribers = []
+        self.frame_compression = frame_compression
+        self.compression_level = compression_level
+        self.dispatcher = CallbackDispatcher(num_dispatch_threads, max_handler_queue_size, handler_overflow_policy)
+        self.max_broadcast_batch_size = max_broadcast_batch_size
+        self.max_broadcast_batch_bytes = max_broadcast_batch_bytes
+        self.broadcast_linger_sec = broadcast_linger_sec
+        # Started by the first broadcast_async().
+        self.broadcast_batcher = None
+        self.broadcast_batcher_lock = threading.Lock()
     
     def subscribe(self, topic_ids: list[str]) -> dict:
         assert topic_ids, "Failed to subscribe, topic ids is empty!"
@@ -33,16 +60,47 @@ class MessagingApi(ApiBase):
         self.subscriber_info.append(response)
 
         new_subscriber = SocketManager(
-            self.api_key, self.api_endpoint, num_worker_threads=1, fetch_time_sec=self.fetch_time_sec)
+            self.api_key,
+            self.api_endpoint,
+            num_worker_threads=1,
+            fetch_time_sec=self.fetch_time_sec,
+            max_fetch_time_sec=self.max_fetch_time_sec,
+            push_mode=self.push_mode,
+            dispatcher=self.dispatcher,
+            frame_compression=self.frame_compression,
+            compression_level=self.compression_level)
         new_subscriber._start_stream(response["subscriber_uid"], response["subscriber_endpoint"], "messaging")
         self.subscribers.append(new_subscriber)
         return response
     
-    def close(self):
-        """Closes and destroys any active subscribers."""
+    def close(self, timeout: Optional[float] = None):
+        """Closes and destroys any active subscribers, handling queued messages for up to timeout seconds.
+
+        Messages queued by broadcast_async() are sent first.
+        """
+        with self.broadcast_batcher_lock:
+            if self.broadcast_batcher is not None:
+                self.broadcast_batcher.close(timeout)
         for subscriber in self.subscribers:
             subscriber.close()
         self.subscribers = []
+        self.dispatcher.close(timeout)
+
+    def add_handler(self, handler: Callable[[str, Any], None], topic_id: str = "*") -> int:
+        """Calls handler(topic_id, message) for messages matching the topic_id pattern as they arrive.
+
+        The pattern supports fnmatch style wildcards, and handlers run on a pool of
+        num_dispatch_threads threads with messages delivered in order per handler. Matching messages
+        are no longer returned by get_next_messages(). Returns a handler id for remove_handler().
+        """
+        return self.dispatcher.add_handler(lambda sensor_name, topic_id, message: handler(topic_id, message), "", topic_id)
+
+    def remove_handler(self, handler_id: int) -> bool:
+        return self.dispatcher.remove_handler(handler_id)
+
+    def get_handler_stats(self) -> dict:
+        """Returns the queue size, drops, errors, dispatch latency and run time of each handler."""
+        return self.dispatcher.get_stats()
 
     def broadcast(self, topic_id: str, message: Any) -> dict:
         assert topic_id, "Failed to broadcast message, topic id is empty!"
@@ -50,6 +108,39 @@ class MessagingApi(ApiBase):
         data_payload = {"client_name": self.client_name, "messages": [{"topic_id": topic_id, "message": message}]}
         response = self.requests_post(api_endpoint, data_payload=json.dumps(data_payload))
         return response
+
+    def broadcast_many(self, messages: list[dict]) -> dict:
+        """Broadcasts a list of {"topic_id": ..., "message": ...} messages, for any topics, in one request."""
+        assert messages, "Failed to broadcast messages, messages is empty!"
+        assert all(message["topic_id"] for message in messages), "Failed to broadcast message, topic id is empty!"
+        return self._post_broadcast([json.dumps({"topic_id": message["topic_id"], "message": message["message"]}) for message in messages])
+
+    def broadcast_async(self, topic_id: str, message: Any) -> Future:
+        """Queues a message to be broadcast in a batch with other queued messages, for any topics.
+
+        A batch is sent once it holds max_broadcast_batch_size messages or max_broadcast_batch_bytes,
+        or broadcast_linger_sec after its first message was queued. Returns a future of the response
+        to the request that sends the message. close() sends any queued messages.
+        """
+        if self.broadcast_batcher is None:
+            with self.broadcast_batcher_lock:
+                if self.broadcast_batcher is None:
+                    self.broadcast_batcher = BroadcastBatcher(
+                        self._post_broadcast, self.max_broadcast_batch_size, self.max_broadcast_batch_bytes, self.broadcast_linger_sec)
+        return self.broadcast_batcher.put(topic_id, message)
+
+    def _post_broadcast(self, encoded_messages: list[str]) -> dict:
+        """Posts already JSON encoded messages in one request, so they aren't encoded twice."""
+        api_endpoint = self._get_endpoint(self.api_endpoint, "messaging/broadcast")
+        data_payload = f'{{"client_name": {json.dumps(self.client_name)}, "messages": [{", ".join(encoded_messages)}]}}'
+        return self.requests_post(api_endpoint, data_payload=data_payload)
+
+    def get_broadcast_stats(self) -> dict:
+        """Returns the number of messages and batches sent by broadcast_async() and its queue size."""
+        broadcast_batcher = self.broadcast_batcher
+        if broadcast_batcher is None:
+            return {"num_messages": 0, "num_batches": 0, "num_failed_batches": 0, "num_failed_messages": 0, "avg_batch_size": 0.0, "queue_size": 0}
+        return broadcast_batcher.get_stats()
     
     def get_next_messages(self) -> list[dict]:
         messages = []
@@ -0,0 +1,238 @@
+from typing import Any, Callable, Optional
+from fnmatch import fnmatchcase
+import math
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RATE_MODE_DECIMATE = "decimate"
+RATE_MODE_AGGREGATE = "aggregate"
+_RATE_MODES = (RATE_MODE_DECIMATE, RATE_MODE_AGGREGATE)
+
+
+def _add_sample(total: Any, value: Any) -> Any:
+    """Adds the numbers of value to the running total, keeping the latest of any other values."""
+    if isinstance(value, dict) and isinstance(total, dict):
+        return {key: _add_sample(total[key], item) if key in total else item for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and isinstance(total, list) and len(value) == len(total):
+        return [_add_sample(total_item, item) for total_item, item in zip(total, value)]
+    if np is not None and isinstance(value, np.ndarray) and isinstance(total, np.ndarray) and value.shape == total.shape:
+        return total + value if np.issubdtype(value.dtype, np.number) else value
+    if _is_number(value) and _is_number(total):
+        return total + value
+    return value
+
+
+def _divide_sample(total: Any, count: int) -> Any:
+    if isinstance(total, dict):
+        return {key: _divide_sample(item, count) for key, item in total.items()}
+    if isinstance(total, list):
+        return [_divide_sample(item, count) for item in total]
+    if np is not None and isinstance(total, np.ndarray):
+        return total / count if np.issubdtype(total.dtype, np.number) else total
+    if _is_number(total):
+        return total / count
+    return total
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class _TopicRate:
+    """The decimation state and sample counters of one sensor topic."""
+
+    def __init__(self, priority: int, mode: str) -> None:
+        self.priority = priority
+        self.mode = mode
+        self.credit = 1.0
+        self.total = None
+        self.num_aggregated = 0
+        self.num_samples = 0
+        self.num_sent = 0
+        self.samples_per_sec = 0.0
+        self.sent_per_sec = 0.0
+
+
+class AdaptiveRateController:
+    """Downsamples outgoing sensor topics to keep the outgoing queue latency under a target.
+
+    Every update_interval_sec, update() estimates the queue latency as the larger of the queue wait
+    of the latest sent message and the queue depth divided by the measured drain rate, since the
+    former goes stale while the uplink is stalled and nothing is sent. Above target_latency_sec, the
+    sample budget is the drain rate less the rate needed to work off the backlog beyond the target
+    within target_latency_sec, and it is handed out to the topics from the highest priority down,
+    so each priority keeps the fraction of its measured sample rate that still fits (at least
+    min_keep_fraction). Below restore_ratio * target_latency_sec, the uplink is probed for more
+    capacity by growing the fraction of the highest priority still downsampled by increase_step, so
+    lower priority topics are the first to be shed and the last to be restored.
+
+    Topics are downsampled evenly: with mode decimate the kept samples are sent as they are, and with
+    mode aggregate each sent sample is the mean of the numbers of the samples since the last one
+    sent (other values are taken from the latest sample). Topics default to priority 0 and mode
+    decimate, see set_topic_priority().
+    """
+
+    def __init__(
+        self,
+        target_latency_sec: float = 1.0,
+        min_keep_fraction: float = 0.05,
+        increase_step: float = 0.1,
+        restore_ratio: float = 0.5,
+        update_interval_sec: float = 0.5,
+        ) -> None:
+        assert target_latency_sec > 0.0, "The target latency must be positive"
+        assert 0.0 < min_keep_fraction <= 1.0, "The min keep fraction must be in (0, 1]"
+        self.target_latency_sec = target_latency_sec
+        self.min_keep_fraction = min_keep_fraction
+        self.increase_step = increase_step
+        self.restore_ratio = restore_ratio
+        self.update_interval_sec = update_interval_sec
+        # (topic_pattern, priority, mode) in the order they were set, the last match wins.
+        self.topic_priorities = []
+        # The fraction of samples kept for each priority.
+        self.keep_fractions = {0: 1.0}
+        self.topics = {}
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock()
+        self.last_update_time = time.monotonic()
+        self.last_num_sent_messages = None
+        self.latency_sec = 0.0
+        self.queue_size = 0
+        self.num_decreases = 0
+        self.num_increases = 0
+
+    def set_topic_priority(self, topic_pattern: str, priority: int, mode: str = RATE_MODE_DECIMATE) -> None:
+        """Sets the priority and downsampling mode of the topics matching an fnmatch style pattern."""
+        assert mode in _RATE_MODES, f"Unknown rate mode: {mode}"
+        with self.lock:
+            self.topic_priorities.append((topic_pattern, priority, mode))
+            self.keep_fractions.setdefault(priority, 1.0)
+            for (_, topic_id), topic_rate in self.topics.items():
+                if fnmatchcase(topic_id, topic_pattern):
+                    topic_rate.priority, topic_rate.mode = priority, mode
+
+    def is_due(self) -> bool:
+        return time.monotonic() - self.last_update_time >= self.update_interval_sec
+
+    def process(self, sensor_name: str, topic_id: str, data: Any) -> tuple[bool, Any]:
+        """Returns whether to send a sample of a topic at its current rate, and the data to send."""
+        key = (sensor_name, topic_id)
+        with self.lock:
+            topic_rate = self.topics.get(key)
+            if topic_rate is None:
+                topic_rate = self.topics[key] = _TopicRate(*self._get_topic_priority(topic_id))
+            topic_rate.num_samples += 1
+            keep_fraction = self.keep_fractions[topic_rate.priority]
+            if topic_rate.mode == RATE_MODE_AGGREGATE and keep_fraction < 1.0 or topic_rate.total is not None:
+                topic_rate.total = data if topic_rate.total is None else _add_sample(topic_rate.total, data)
+                topic_rate.num_aggregated += 1
+            # The tolerance keeps rounding errors from skipping an extra sample.
+            if topic_rate.credit < 1.0 - 1e-9:
+                topic_rate.credit += keep_fraction
+                return False, None
+            topic_rate.credit = min(topic_rate.credit - 1.0 + keep_fraction, 1.0)
+            topic_rate.num_sent += 1
+            if topic_rate.total is not None:
+                data = _divide_sample(topic_rate.total, topic_rate.num_aggregated) if topic_rate.num_aggregated > 1 else data
+                topic_rate.total = None
+                topic_rate.num_aggregated = 0
+            return True, data
+
+    def _get_topic_priority(self, topic_id: str) -> tuple[int, str]:
+        for topic_pattern, priority, mode in reversed(self.topic_priorities):
+            if fnmatchcase(topic_id, topic_pattern):
+                return priority, mode
+        return 0, RATE_MODE_DECIMATE
+
+    def update(self, get_queue_stats: Callable[[], tuple[float, int, int]]) -> bool:
+        """Adapts the keep fractions to the queue latency if an update is due. Returns true if it was.
+
+        get_queue_stats returns the queue wait of the latest sent message, the queue depth and the
+        total number of messages sent so far. Only one caller updates at a time, the others return.
+        """
+        if not self.is_due() or not self.update_lock.acquire(blocking=False):
+            return False
+        try:
+            if not self.is_due():
+                return False
+            last_queue_wait_sec, queue_size, num_sent_messages = get_queue_stats()
+            update_time = time.monotonic()
+            elapsed_sec = max(update_time - self.last_update_time, 1e-6)
+            num_sent = num_sent_messages - self.last_num_sent_messages if self.last_num_sent_messages is not None else 0
+            drain_latency_sec = 0.0
+            if self.last_num_sent_messages is not None and queue_size > 0:
+                drain_latency_sec = queue_size * elapsed_sec / num_sent if num_sent > 0 else math.inf
+            with self.lock:
+                # The queue wait of the latest sent message is stale if nothing was sent since the last update.
+                self.latency_sec = max(last_queue_wait_sec if num_sent > 0 else 0.0, drain_latency_sec)
+                self.queue_size = queue_size
+                if self.latency_sec > self.target_latency_sec:
+                    drain_rate = num_sent / elapsed_sec
+                    backlog_size = max(queue_size - drain_rate * self.target_latency_sec, 0.0)
+                    self._decrease(drain_rate - backlog_size / self.target_latency_sec, elapsed_sec)
+                elif self.latency_sec < self.restore_ratio * self.target_latency_sec:
+                    self._increase()
+                for topic_rate in self.topics.values():
+                    topic_rate.samples_per_sec = topic_rate.num_samples / elapsed_sec
+                    topic_rate.sent_per_sec = topic_rate.num_sent / elapsed_sec
+                    topic_rate.num_samples = topic_rate.num_sent = 0
+            self.last_update_time = update_time
+            self.last_num_sent_messages = num_sent_messages
+            return True
+        finally:
+            self.update_lock.release()
+
+    def _decrease(self, sample_budget: float, elapsed_sec: float) -> None:
+        """Hands out a budget of samples/sec to the priorities from the highest down."""
+        samples_per_sec = {}
+        for topic_rate in self.topics.values():
+            samples_per_sec[topic_rate.priority] = samples_per_sec.get(topic_rate.priority, 0.0) + topic_rate.num_samples / elapsed_sec
+        for priority in sorted(self.keep_fractions, reverse=True):
+            if samples_per_sec.get(priority, 0.0) <= 0.0:
+                continue
+            keep_fraction = min(max(sample_budget / samples_per_sec[priority], self.min_keep_fraction), 1.0)
+            self.keep_fractions[priority] = keep_fraction
+            sample_budget -= keep_fraction * samples_per_sec[priority]
+        self.num_decreases += 1
+
+    def _increase(self) -> None:
+        for priority in sorted(self.keep_fractions, reverse=True):
+            if self.keep_fractions[priority] < 1.0:
+                keep_fraction = self.keep_fractions[priority] + self.increase_step
+                # Snaps rounding errors to the full rate.
+                self.keep_fractions[priority] = 1.0 if keep_fraction > 1.0 - 1e-9 else keep_fraction
+                self.num_increases += 1
+                return
+
+    def get_keep_fraction(self, topic_id: str) -> float:
+        with self.lock:
+            return self.keep_fractions[self._get_topic_priority(topic_id)[0]]
+
+    def get_stats(self, sensor_name: Optional[str] = None) -> dict:
+        """Returns the estimated latency and the keep fraction and input and sent rates of each topic."""
+        with self.lock:
+            topics = {}
+            for (topic_sensor_name, topic_id), topic_rate in self.topics.items():
+                if sensor_name is not None and topic_sensor_name != sensor_name:
+                    continue
+                topics.setdefault(topic_sensor_name, {})[topic_id] = {
+                    "priority": topic_rate.priority,
+                    "mode": topic_rate.mode,
+                    "keep_fraction": self.keep_fractions[topic_rate.priority],
+                    "samples_per_sec": topic_rate.samples_per_sec,
+                    "sent_per_sec": topic_rate.sent_per_sec,
+                }
+            return {
+                "latency_sec": self.latency_sec,
+                "target_latency_sec": self.target_latency_sec,
+                "queue_size": self.queue_size,
+                "num_decreases": self.num_decreases,
+                "num_increases": self.num_increases,
+                "keep_fractions": dict(self.keep_fractions),
+                "sensors": topics,
+            }
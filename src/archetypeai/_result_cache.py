@@ -0,0 +1,171 @@
+from typing import Any, Optional
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+
+_CACHE_FILE_EXT = ".json"
+
+
+def hash_payload(payload: Any, namespace: str = "") -> str:
+    """Returns a canonical sha256 hex digest of a (nested) request payload.
+
+    Dict keys are visited in sorted order so logically equal payloads hash the same regardless of
+    insertion order. Strings and binary buffers (e.g. base64 images, raw image bytes) are fed to the
+    hasher as-is, so large image data is never re-encoded or copied into an intermediate JSON string.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(namespace.encode())
+    _update_hash(hasher, payload)
+    return hasher.hexdigest()
+
+
+def _update_hash(hasher, value: Any) -> None:
+    # Each value is prefixed with a type tag and length so different structures can't collide.
+    if isinstance(value, dict):
+        hasher.update(b"d%d:" % len(value))
+        for key in sorted(value.keys(), key=str):
+            _update_hash(hasher, str(key))
+            _update_hash(hasher, value[key])
+    elif isinstance(value, (list, tuple)):
+        hasher.update(b"l%d:" % len(value))
+        for item in value:
+            _update_hash(hasher, item)
+    elif isinstance(value, str):
+        data = value.encode()
+        hasher.update(b"s%d:" % len(data))
+        hasher.update(data)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        data = memoryview(value).cast("B")
+        hasher.update(b"b%d:" % data.nbytes)
+        hasher.update(data)
+    else:
+        # Numbers, bools and None have a stable, compact JSON form.
+        data = json.dumps(value).encode()
+        hasher.update(b"v%d:" % len(data))
+        hasher.update(data)
+
+
+class ResultCache:
+    """A persistent, size-bounded LRU cache for deterministic API results.
+
+    Results are stored as one JSON file per key under cache_dir. The least recently used entries are
+    evicted once the total size on disk exceeds max_size_bytes and entries older than ttl_sec are
+    treated as misses. Only events whose type is in cacheable_event_types are cached.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_size_bytes: int = 256 * 1024**2,
+        ttl_sec: float = -1.0,
+        cacheable_event_types: tuple = ("model.query",),
+        ) -> None:
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.ttl_sec = ttl_sec
+        self.cacheable_event_types = set(cacheable_event_types)
+        self.lock = threading.Lock()
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+        self.size_bytes = 0
+        # Maps each key to its size on disk, ordered from least to most recently used.
+        self.entries = OrderedDict()
+        self._load_index()
+
+    def is_cacheable_event(self, event: dict) -> bool:
+        """Returns true if the lens event type is safe to cache."""
+        return isinstance(event, dict) and event.get("type", None) in self.cacheable_event_types
+
+    def get(self, key: str) -> Optional[dict]:
+        """Returns the cached result for the key or None on a miss."""
+        with self.lock:
+            if key not in self.entries:
+                self.num_misses += 1
+                return None
+            filename = self._get_filename(key)
+            try:
+                with open(filename, "r") as file_handle:
+                    entry = json.load(file_handle)
+            except (OSError, ValueError):
+                logging.warning(f"Failed to read cache entry {filename}, removing it")
+                self._remove(key)
+                self.num_misses += 1
+                return None
+            if self.ttl_sec >= 0 and time.time() - entry["created_time"] > self.ttl_sec:
+                self._remove(key)
+                self.num_misses += 1
+                return None
+            # Touch the file so the LRU order survives restarts.
+            os.utime(filename)
+            self.entries.move_to_end(key)
+            self.num_hits += 1
+            return entry["result"]
+
+    def put(self, key: str, result: dict) -> bool:
+        """Stores a result under the key, evicting old entries if needed."""
+        entry_bytes = json.dumps({"created_time": time.time(), "result": result}).encode()
+        if len(entry_bytes) > self.max_size_bytes:
+            return False
+        with self.lock:
+            filename = self._get_filename(key)
+            tmp_filename = filename.with_suffix(".tmp")
+            with open(tmp_filename, "wb") as file_handle:
+                file_handle.write(entry_bytes)
+            os.replace(tmp_filename, filename)
+            if key in self.entries:
+                self.size_bytes -= self.entries[key]
+            self.entries[key] = len(entry_bytes)
+            self.entries.move_to_end(key)
+            self.size_bytes += len(entry_bytes)
+            self._evict()
+        return True
+
+    def clear(self) -> None:
+        """Removes all cached entries."""
+        with self.lock:
+            for key in list(self.entries.keys()):
+                self._remove(key)
+
+    def get_stats(self) -> dict:
+        """Returns the hit/miss counters and current size of the cache."""
+        with self.lock:
+            return {
+                "num_hits": self.num_hits,
+                "num_misses": self.num_misses,
+                "num_evictions": self.num_evictions,
+                "num_entries": len(self.entries),
+                "size_bytes": self.size_bytes,
+            }
+
+    def _get_filename(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{_CACHE_FILE_EXT}"
+
+    def _load_index(self) -> None:
+        cached_files = []
+        for filename in self.cache_dir.glob(f"*{_CACHE_FILE_EXT}"):
+            file_stat = filename.stat()
+            cached_files.append((file_stat.st_mtime, filename.stem, file_stat.st_size))
+        for _, key, size_bytes in sorted(cached_files):
+            self.entries[key] = size_bytes
+            self.size_bytes += size_bytes
+        self._evict()
+
+    def _remove(self, key: str) -> None:
+        self.size_bytes -= self.entries.pop(key)
+        try:
+            os.remove(self._get_filename(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        while self.size_bytes > self.max_size_bytes and self.entries:
+            key = next(iter(self.entries))
+            self._remove(key)
+            self.num_evictions += 1
@@ -0,0 +1,158 @@
+from typing import Any
+from fnmatch import fnmatchcase
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def is_unchanged(value: Any, last_value: Any, deadband: float = 0.0, ignore_keys: tuple = ()) -> bool:
+    """Returns true if no number in value differs from the one in last_value by more than deadband.
+
+    Dicts, lists and NumPy arrays are compared element wise, everything else must be equal. The
+    ignore_keys of a top level dict are not compared.
+    """
+    if deadband <= 0.0 and not ignore_keys and not _is_array(value):
+        try:
+            return type(value) == type(last_value) and bool(value == last_value)
+        except ValueError:
+            pass  # Nested NumPy arrays can't be compared with ==.
+    if isinstance(value, dict):
+        if not isinstance(last_value, dict):
+            return False
+        num_keys = 0
+        for key, item in value.items():
+            if key in ignore_keys:
+                continue
+            if key not in last_value or not is_unchanged(item, last_value[key], deadband):
+                return False
+            num_keys += 1
+        return num_keys == sum(1 for key in last_value if key not in ignore_keys)
+    if isinstance(value, (list, tuple)):
+        if not isinstance(last_value, (list, tuple)) or len(value) != len(last_value):
+            return False
+        return all(is_unchanged(item, last_item, deadband) for item, last_item in zip(value, last_value))
+    if _is_array(value):
+        if not _is_array(last_value) or value.shape != last_value.shape or value.dtype != last_value.dtype:
+            return False
+        if deadband > 0.0 and np.issubdtype(value.dtype, np.number):
+            return bool(np.all(np.abs(value - last_value) <= deadband))
+        return bool(np.array_equal(value, last_value))
+    if _is_number(value) and _is_number(last_value):
+        return abs(value - last_value) <= deadband
+    return type(value) == type(last_value) and value == last_value
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_array(value: Any) -> bool:
+    return np is not None and isinstance(value, np.ndarray)
+
+
+class SendFilter:
+    """Decides whether a sample of a sensor topic carries enough new information to be sent.
+
+    With on_change, a sample is suppressed if it is unchanged from the last sample sent for its
+    sensor and topic, where numbers within deadband of the sent value count as unchanged (see
+    is_unchanged) and the ignore_keys of dict samples, such as a row timestamp, are not compared.
+    Samples are compared against the last sent sample rather than the last sample, so slow drifts
+    are still sent once they exceed the deadband. Samples less than min_interval_sec after the last
+    sent sample are always suppressed, and samples at least max_interval_sec after it are always sent
+    as a keepalive, so subscribers can tell a quiet sensor from a dead one. Intervals are measured on
+    the sample timestamps, and 0 disables them. Sent samples are kept by reference, so they must not
+    be modified after they are sent.
+    """
+
+    def __init__(
+        self,
+        sensor_pattern: str = "*",
+        topic_pattern: str = "*",
+        on_change: bool = True,
+        deadband: float = 0.0,
+        min_interval_sec: float = 0.0,
+        max_interval_sec: float = 0.0,
+        ignore_keys: tuple = (),
+        ) -> None:
+        assert deadband >= 0.0, "The deadband must not be negative"
+        assert max_interval_sec <= 0.0 or max_interval_sec >= min_interval_sec, "The max interval must be at least the min interval"
+        self.sensor_pattern = sensor_pattern
+        self.topic_pattern = topic_pattern
+        self.on_change = on_change
+        self.deadband = deadband
+        self.min_interval_sec = min_interval_sec
+        self.max_interval_sec = max_interval_sec
+        self.ignore_keys = tuple(ignore_keys)
+        # The (data, timestamp) of the last sample sent for each (sensor_name, topic_id).
+        self.last_sent = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def matches(self, sensor_name: str, topic_id: str) -> bool:
+        return fnmatchcase(sensor_name, self.sensor_pattern) and fnmatchcase(topic_id, self.topic_pattern)
+
+    def should_send(self, sensor_name: str, topic_id: str, data: Any, timestamp: float) -> bool:
+        key = (sensor_name, topic_id)
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = {"num_samples": 0, "num_suppressed_samples": 0, "num_keepalives": 0}
+            stats["num_samples"] += 1
+            last_sent = self.last_sent.get(key)
+            if last_sent is not None:
+                last_data, last_timestamp = last_sent
+                elapsed_sec = timestamp - last_timestamp
+                if self.max_interval_sec > 0.0 and elapsed_sec >= self.max_interval_sec:
+                    if self.on_change and is_unchanged(data, last_data, self.deadband, self.ignore_keys):
+                        stats["num_keepalives"] += 1
+                elif elapsed_sec < self.min_interval_sec or (
+                        self.on_change and is_unchanged(data, last_data, self.deadband, self.ignore_keys)):
+                    stats["num_suppressed_samples"] += 1
+                    return False
+            self.last_sent[key] = (data, timestamp)
+            return True
+
+
+class SendFilterSet:
+    """The send filters of a client, applied to each sample before it is queued.
+
+    The first filter matching the sensor name and topic_id of a sample decides whether it is sent,
+    and samples without a matching filter are always sent.
+    """
+
+    def __init__(self) -> None:
+        self.filters = []
+        self.lock = threading.Lock()
+        # Cache of the filter matching each (sensor_name, topic_id), reset when the filters change.
+        self.matching_filters = {}
+
+    def __len__(self) -> int:
+        return len(self.filters)
+
+    def add_filter(self, send_filter: SendFilter) -> None:
+        with self.lock:
+            self.filters.append(send_filter)
+            self.matching_filters = {}
+
+    def should_send(self, sensor_name: str, topic_id: str, data: Any, timestamp: float) -> bool:
+        key = (sensor_name, topic_id)
+        send_filter = self.matching_filters.get(key, False)
+        if send_filter is False:
+            with self.lock:
+                send_filter = next((send_filter for send_filter in self.filters if send_filter.matches(sensor_name, topic_id)), None)
+                self.matching_filters[key] = send_filter
+        return send_filter is None or send_filter.should_send(sensor_name, topic_id, data, timestamp)
+
+    def get_stats(self) -> dict:
+        """Returns the number of samples, suppressed samples and keepalives of each sensor and topic."""
+        stats = {}
+        with self.lock:
+            filters = list(self.filters)
+        for send_filter in filters:
+            with send_filter.lock:
+                for (sensor_name, topic_id), topic_stats in send_filter.stats.items():
+                    stats.setdefault(sensor_name, {})[topic_id] = dict(topic_stats)
+        return stats
@@ -0,0 +1,187 @@
+from typing import Any, Optional
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class SensorRingBuffer:
+    """A preallocated NumPy ring buffer of timestamped samples with num_channels values each.
+
+    Every sample is written twice, capacity rows apart, so the latest n <= capacity samples are
+    always one contiguous slice and windows are returned as zero-copy views. Views alias the ring
+    and are overwritten as new samples arrive, so copy them to keep them. Timestamps are assumed
+    to be non-decreasing.
+    """
+
+    def __init__(self, capacity: int, num_channels: int, dtype: Any = None) -> None:
+        assert np is not None, "NumPy is required for sensor windows"
+        assert capacity > 0, "The capacity must be positive"
+        self.capacity = capacity
+        self.num_channels = num_channels
+        self.timestamps = np.zeros(2 * capacity, dtype=np.float64)
+        self.values = np.zeros((2 * capacity, num_channels), dtype=dtype if dtype is not None else np.float64)
+        self.write_index = 0
+        self.num_samples = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self.num_samples, self.capacity)
+
+    def append(self, timestamp: float, value: Any) -> None:
+        """Appends one sample, a scalar or a sequence of num_channels values."""
+        with self.lock:
+            index = self.write_index
+            self.timestamps[index] = self.timestamps[index + self.capacity] = timestamp
+            self.values[index] = self.values[index + self.capacity] = value
+            self.write_index = (index + 1) % self.capacity
+            self.num_samples += 1
+
+    def extend(self, timestamps: Any, values: Any) -> None:
+        """Appends a block of samples, with values shaped (num_samples, num_channels), with vectorized copies."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values).reshape(len(timestamps), self.num_channels)
+        # Only the last capacity samples of a large block survive.
+        timestamps, values = timestamps[-self.capacity:], values[-self.capacity:]
+        with self.lock:
+            num_new_samples = len(timestamps)
+            first_length = min(num_new_samples, self.capacity - self.write_index)
+            self._write(self.write_index, timestamps[:first_length], values[:first_length])
+            # The rest wraps around to the start of the ring.
+            self._write(0, timestamps[first_length:], values[first_length:])
+            self.write_index = (self.write_index + num_new_samples) % self.capacity
+            self.num_samples += num_new_samples
+
+    def get_last(self, num_samples: int = -1) -> tuple:
+        """Returns zero-copy (timestamps, values) views of the latest num_samples (all if -1) samples."""
+        with self.lock:
+            return self._get_last(num_samples)
+
+    def get_since(self, window_sec: float, time_now: float = -1.0) -> tuple:
+        """Returns zero-copy (timestamps, values) views of the samples from the last window_sec seconds.
+
+        The window ends at time_now, or at the latest sample if time_now is not set.
+        """
+        with self.lock:
+            return self._get_since(window_sec, time_now)
+
+    def mean(self, num_samples: int = -1, window_sec: float = -1.0) -> Any:
+        return self._aggregate(np.mean, num_samples, window_sec)
+
+    def min(self, num_samples: int = -1, window_sec: float = -1.0) -> Any:
+        return self._aggregate(np.min, num_samples, window_sec)
+
+    def max(self, num_samples: int = -1, window_sec: float = -1.0) -> Any:
+        return self._aggregate(np.max, num_samples, window_sec)
+
+    def rms(self, num_samples: int = -1, window_sec: float = -1.0) -> Any:
+        return self._aggregate(_rms, num_samples, window_sec)
+
+    def resample(self, rate_hz: float, num_samples: int = -1, window_sec: float = -1.0) -> tuple:
+        """Linearly interpolates a window onto a fixed rate grid. Returns new (timestamps, values) arrays."""
+        with self.lock:
+            timestamps, values = self._get_window(num_samples, window_sec)
+            # Copy so samples written during the interpolation don't change the window.
+            timestamps, values = timestamps.copy(), values.copy()
+        if len(timestamps) == 0:
+            return timestamps, values
+        grid_timestamps = np.arange(timestamps[0], timestamps[-1] + 0.5 / rate_hz, 1.0 / rate_hz)
+        grid_values = np.empty((len(grid_timestamps), self.num_channels), dtype=np.float64)
+        for channel_index in range(self.num_channels):
+            grid_values[:, channel_index] = np.interp(grid_timestamps, timestamps, values[:, channel_index])
+        return grid_timestamps, grid_values
+
+    def _write(self, index: int, timestamps: Any, values: Any) -> None:
+        # Must be called with the lock held. Writes to the ring and its mirror capacity rows later.
+        for start_index in (index, index + self.capacity):
+            self.timestamps[start_index:start_index + len(timestamps)] = timestamps
+            self.values[start_index:start_index + len(values)] = values
+
+    def _get_last(self, num_samples: int) -> tuple:
+        # Must be called with the lock held.
+        num_available = min(self.num_samples, self.capacity)
+        num_samples = num_available if num_samples < 0 else min(num_samples, num_available)
+        end_index = self.write_index + self.capacity
+        return self.timestamps[end_index - num_samples:end_index], self.values[end_index - num_samples:end_index]
+
+    def _get_since(self, window_sec: float, time_now: float = -1.0) -> tuple:
+        # Must be called with the lock held.
+        timestamps, values = self._get_last(-1)
+        if len(timestamps) == 0:
+            return timestamps, values
+        end_time = time_now if time_now >= 0 else timestamps[-1]
+        start_index = np.searchsorted(timestamps, end_time - window_sec, side="left")
+        return timestamps[start_index:], values[start_index:]
+
+    def _get_window(self, num_samples: int, window_sec: float) -> tuple:
+        # Must be called with the lock held. Selects by time if window_sec is set, otherwise by count.
+        if window_sec >= 0:
+            return self._get_since(window_sec)
+        return self._get_last(num_samples)
+
+    def _aggregate(self, aggregate_fn, num_samples: int, window_sec: float) -> Any:
+        # Computed under the lock so samples written meanwhile don't change the window.
+        with self.lock:
+            _, values = self._get_window(num_samples, window_sec)
+            if len(values) == 0:
+                return np.full(self.num_channels, np.nan)
+            return aggregate_fn(values, axis=0)
+
+
+def _rms(values: Any, axis: int) -> Any:
+    return np.sqrt(np.mean(np.square(values, dtype=np.float64), axis=axis))
+
+
+class SensorWindowStore:
+    """Keeps a SensorRingBuffer of the latest samples for each (sensor_name, topic_id).
+
+    Buffers are created on the first sample of a topic, with the number of channels taken from
+    that sample. Numeric scalars and sequences are appended as one sample and 2D arrays as a block
+    of samples. Other data (e.g. dicts or strings) is not stored and add() returns false.
+    """
+
+    def __init__(self, capacity: int = 1024, dtype: Any = None) -> None:
+        assert np is not None, "NumPy is required for sensor windows"
+        self.capacity = capacity
+        self.dtype = dtype if dtype is not None else np.float64
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def add(self, sensor_name: str, topic_id: str, data: Any, timestamp: float = -1.0) -> bool:
+        """Appends numeric data received at timestamp (now if not set). Returns false if the data isn't numeric."""
+        if isinstance(data, (dict, str, bytes)):
+            return False
+        try:
+            values = np.asarray(data, dtype=self.dtype)
+        except (TypeError, ValueError):
+            return False
+        if values.ndim > 2:
+            return False
+        timestamp = timestamp if timestamp >= 0 else time.time()
+        num_channels = values.shape[-1] if values.ndim > 0 else 1
+        buffer = self._get_or_create_buffer((sensor_name, topic_id), num_channels)
+        if buffer is None:
+            return False
+        if values.ndim == 2:
+            # A block of samples all received at the same time.
+            buffer.extend(np.full(len(values), timestamp), values)
+        else:
+            buffer.append(timestamp, values)
+        return True
+
+    def get_window(self, sensor_name: str, topic_id: str) -> Optional[SensorRingBuffer]:
+        return self.buffers.get((sensor_name, topic_id))
+
+    def get_keys(self) -> list[tuple[str, str]]:
+        return list(self.buffers)
+
+    def _get_or_create_buffer(self, key: tuple[str, str], num_channels: int) -> Optional[SensorRingBuffer]:
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            with self.lock:
+                buffer = self.buffers.setdefault(key, SensorRingBuffer(self.capacity, num_channels, self.dtype))
+        # Samples with a different number of channels than the first one can't be stored.
+        return buffer if buffer.num_channels == num_channels else None
@@ -1,19 +1,99 @@
-from typing import Any
+from typing import Any, Callable, Optional
 import logging
 import json
+import threading
+import time
 
 from archetypeai._base import ApiBase
-from archetypeai._socket_manager import SocketManager
+from archetypeai._dispatcher import CallbackDispatcher
+from archetypeai._event_buffer import OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST
+from archetypeai._frame_codec import FRAME_COMPRESSION_NONE
+from archetypeai._rate_controller import AdaptiveRateController, RATE_MODE_DECIMATE
+from archetypeai._send_filter import SendFilter, SendFilterSet
+from archetypeai._sensor_windows import SensorRingBuffer, SensorWindowStore
+from archetypeai._shm_ring import SharedMemoryRing
+from archetypeai._socket_manager import SocketManager, WIRE_FORMAT_JSON
 
 
 class SensorsApi(ApiBase):
-    """Main sensor client for streaming data to the Archetype AI platform."""
+    """Main sensor client for streaming data to the Archetype AI platform.
 
-    def __init__(self, api_key: str, api_endpoint: str, num_sensor_threads: int = 1) -> None:
+    Any number of sensors can be registered, each streaming on its own SocketManager
+    (num_sensor_threads connections and worker threads) opened for its stream_uid. send() routes
+    data by sensor_name, defaulting to the most recently registered sensor. With share_connections,
+    sensors that share a sensor endpoint also share one SocketManager and each message is tagged
+    with the stream_uid of its sensor, so the connections and threads grow with the number of
+    endpoints rather than the number of sensors. This requires a server that accepts messages for
+    other stream_uids than the one a connection was opened for.
+
+    Subscribed sensor data can either be polled with get_sensor_data() or handled as it arrives by
+    callbacks registered with add_handler(), which run on a pool of num_dispatch_threads threads
+    (see CallbackDispatcher). With window_capacity > 0, numeric sensor data is instead written
+    straight into preallocated NumPy ring buffers of that many samples per sensor and topic, read
+    with get_window() (requires NumPy, see SensorWindowStore). The frame_compression settings apply
+    to every stream and subscriber (see SocketManager).
+
+    Send filters added with add_send_filter() drop samples that carry no new information before
+    they are queued, so bandwidth scales with how often the data changes rather than the sample rate.
+    With target_latency_sec > 0, topics are downsampled by priority whenever the outgoing queue
+    latency exceeds the target, and restored to full rate once it recovers (see
+    AdaptiveRateController and set_topic_priority()).
+
+    Producers in other processes can stream through this client by writing samples into a
+    SharedMemoryRing added with add_ingest_ring(), which a background thread drains into send().
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        api_endpoint: str,
+        num_sensor_threads: int = 1,
+        max_batch_size: int = 1,
+        max_batch_bytes: int = 256 * 1024,
+        batch_linger_sec: float = 0.0,
+        wire_format: str = WIRE_FORMAT_JSON,
+        max_outgoing_queue_size: int = 10_000,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        send_timeout_sec: Optional[float] = None,
+        spool_dir: Optional[str] = None,
+        max_spool_bytes: int = 1024 * 1024 * 1024,
+        num_dispatch_threads: int = 2,
+        max_handler_queue_size: int = 1024,
+        handler_overflow_policy: str = OVERFLOW_DROP_OLDEST,
+        window_capacity: int = 0,
+        frame_compression: str = FRAME_COMPRESSION_NONE,
+        compression_level: int = 6,
+        compression_min_size_bytes: int = 256,
+        target_latency_sec: float = 0.0,
+        share_connections: bool = False,
+        ) -> None:
         super().__init__(api_key, api_endpoint)
+        self.wire_format = wire_format
+        self.max_outgoing_queue_size = max_outgoing_queue_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout_sec = send_timeout_sec
+        self.spool_dir = spool_dir
+        self.max_spool_bytes = max_spool_bytes
         self.num_sensor_threads = num_sensor_threads
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.batch_linger_sec = batch_linger_sec
+        self.share_connections = share_connections
         self.streamer = None
+        self.streamers = {}
+        self.sensors = {}
+        self.default_sensor_name = None
         self.subscribers = []
+        self.dispatcher = CallbackDispatcher(num_dispatch_threads, max_handler_queue_size, handler_overflow_policy)
+        self.window_store = SensorWindowStore(window_capacity) if window_capacity > 0 else None
+        self.frame_compression = frame_compression
+        self.compression_level = compression_level
+        self.compression_min_size_bytes = compression_min_size_bytes
+        self.send_filters = SendFilterSet()
+        self.rate_controller = AdaptiveRateController(target_latency_sec) if target_latency_sec > 0 else None
+        self.ingest_threads = []
+        self.ingest_stopped = threading.Event()
+        self.ingest_stats = {"num_ingested_samples": 0, "num_failed_samples": 0}
     
     def register(self, sensor_name: str, sensor_metadata: dict = {}, topic_ids: list[str] = []) -> bool:
         """Registers a sensor with the Archetype AI platform."""
@@ -21,58 +101,263 @@ class SensorsApi(ApiBase):
         data_payload = {"sensor_name": sensor_name, "sensor_metadata": sensor_metadata, "topic_ids": topic_ids}
         response = self.requests_post(api_endpoint, data_payload=json.dumps(data_payload))
         logging.info(f"Successfully registered sensor {sensor_name} stream_uid: {response['stream_uid']}")
-        self.streamer = SocketManager(self.api_key, self.api_endpoint, num_worker_threads=self.num_sensor_threads)
-        self.streamer._start_stream(response["stream_uid"], response["sensor_endpoint"], "sensors/streamer")
+        sensor_endpoint = response["sensor_endpoint"]
+        streamer_key = sensor_endpoint if self.share_connections else (sensor_endpoint, response["stream_uid"])
+        if streamer_key not in self.streamers:
+            assert self.spool_dir is None or not self.streamers, "Spooling only supports a single sensor stream or shared connection"
+            self.streamers[streamer_key] = self._start_streamer(response["stream_uid"], sensor_endpoint)
+        self.sensors[sensor_name] = {"stream_uid": response["stream_uid"], "streamer": self.streamers[streamer_key]}
+        self.default_sensor_name = sensor_name
+        self.streamer = self.streamers[streamer_key]
         return True
+
+    def _start_streamer(self, stream_uid: str, sensor_endpoint: str) -> SocketManager:
+        streamer = SocketManager(
+            self.api_key,
+            self.api_endpoint,
+            num_worker_threads=self.num_sensor_threads,
+            max_batch_size=self.max_batch_size,
+            max_batch_bytes=self.max_batch_bytes,
+            batch_linger_sec=self.batch_linger_sec,
+            wire_format=self.wire_format,
+            max_outgoing_queue_size=self.max_outgoing_queue_size,
+            overflow_policy=self.overflow_policy,
+            send_timeout_sec=self.send_timeout_sec,
+            spool_dir=self.spool_dir,
+            max_spool_bytes=self.max_spool_bytes,
+            frame_compression=self.frame_compression,
+            compression_level=self.compression_level,
+            compression_min_size_bytes=self.compression_min_size_bytes)
+        streamer._start_stream(stream_uid, sensor_endpoint, "sensors/streamer")
+        return streamer
     
-    def subscribe(self, sensor_name: str, topic_ids: list[str] = []) -> bool:
-        """Subscribes to a sensor stream from the Archetype AI platform."""
+    def subscribe(
+        self,
+        sensor_name: str,
+        topic_ids: list[str] = [],
+        fetch_time_sec: float = 0.02,
+        max_fetch_time_sec: float = 1.0,
+        push_mode: bool = False,
+        ) -> bool:
+        """Subscribes to a sensor stream from the Archetype AI platform.
+
+        Data is fetched every fetch_time_sec while it is flowing, backing off to max_fetch_time_sec
+        while idle. With push_mode the server pushes data as it arrives instead.
+        """
         api_endpoint = self._get_endpoint(self.api_endpoint, "sensors", "subscribe")
         data_payload = {"sensor_name": sensor_name, "topic_ids": topic_ids}
         response = self.requests_post(api_endpoint, data_payload=json.dumps(data_payload))
         logging.info(f"Successfully subscribed to sensor {sensor_name} subscriber_uid: {response['subscriber_uid']}")
         subscriber = SocketManager(
-            self.api_key, self.api_endpoint, num_worker_threads=self.num_sensor_threads, fetch_time_sec=0.1)
+            self.api_key,
+            self.api_endpoint,
+            num_worker_threads=self.num_sensor_threads,
+            fetch_time_sec=fetch_time_sec,
+            max_fetch_time_sec=max_fetch_time_sec,
+            push_mode=push_mode,
+            dispatcher=self.dispatcher,
+            window_store=self.window_store,
+            frame_compression=self.frame_compression,
+            compression_level=self.compression_level,
+            compression_min_size_bytes=self.compression_min_size_bytes)
         subscriber._start_stream(response["subscriber_uid"], response["subscriber_endpoint"], "sensors/subscriber")
         self.subscribers.append(subscriber)
         return True
 
-    def send(self, topic_id: str, data: Any, timestamp: float = -1.0) -> bool:
-        assert self.streamer is not None, "Sensor not registered. Call register first."
-        success = self.streamer.send(topic_id, data, timestamp)
+    def send(self, topic_id: str, data: Any, timestamp: float = -1.0, sensor_name: Optional[str] = None) -> bool:
+        """Sends data for a registered sensor, by default the most recently registered one.
+
+        Returns true without sending if the data was downsampled or suppressed by a send filter, and
+        false if the data was dropped by the overflow policy of the outgoing queue.
+        """
+        sensor_name = sensor_name if sensor_name is not None else self.default_sensor_name
+        assert sensor_name in self.sensors, f"Sensor {sensor_name} not registered. Call register first."
+        sensor = self.sensors[sensor_name]
+        if self.rate_controller is not None:
+            self.rate_controller.update(self._get_queue_stats)
+            should_send, data = self.rate_controller.process(sensor_name, topic_id, data)
+            if not should_send:
+                return True
+        if len(self.send_filters) > 0:
+            timestamp = timestamp if timestamp >= 0 else time.time()
+            if not self.send_filters.should_send(sensor_name, topic_id, data, timestamp):
+                return True
+        success = sensor["streamer"].send(topic_id, data, timestamp, stream_uid=sensor["stream_uid"])
         return success
 
-    def close(self) -> bool:
-        if self.streamer:
-            self.streamer.close()
+    def send_batch(
+        self,
+        topic_id: str,
+        timestamps: Any,
+        values: Any,
+        sensor_name: Optional[str] = None,
+        chunk_size: int = 256,
+        ) -> int:
+        """Sends each row of a NumPy array or pandas DataFrame as data for a registered sensor.
+
+        The rows are encoded and queued in bulk (see SocketManager.send_batch), which is much faster
+        than calling send() per row. Send filters and downsampling don't apply to batches. Returns
+        the number of rows queued.
+        """
+        sensor_name = sensor_name if sensor_name is not None else self.default_sensor_name
+        assert sensor_name in self.sensors, f"Sensor {sensor_name} not registered. Call register first."
+        sensor = self.sensors[sensor_name]
+        return sensor["streamer"].send_batch(topic_id, timestamps, values, sensor["stream_uid"], chunk_size)
+
+    def add_send_filter(
+        self,
+        topic_id: str = "*",
+        sensor_name: str = "*",
+        on_change: bool = True,
+        deadband: float = 0.0,
+        min_interval_sec: float = 0.0,
+        max_interval_sec: float = 0.0,
+        ignore_keys: tuple = (),
+        ) -> bool:
+        """Filters the data sent for the sensor_name and topic_id patterns, which support fnmatch style wildcards.
+
+        With on_change, data is only sent if it differs from the last data sent for its sensor and
+        topic by more than deadband, ignoring the ignore_keys of dict data. Data is sent at most
+        every min_interval_sec, and at least every max_interval_sec as a keepalive (see SendFilter).
+        The first matching filter applies, in the order they were added.
+        """
+        send_filter = SendFilter(sensor_name, topic_id, on_change, deadband, min_interval_sec, max_interval_sec, ignore_keys)
+        self.send_filters.add_filter(send_filter)
+        return True
+
+    def get_send_filter_stats(self) -> dict:
+        """Returns the number of samples, suppressed samples and keepalives of each filtered sensor and topic."""
+        return self.send_filters.get_stats()
+
+    def set_topic_priority(self, topic_id: str, priority: int, mode: str = RATE_MODE_DECIMATE) -> bool:
+        """Sets the priority and downsampling mode (decimate or aggregate) of topics matching an fnmatch style pattern.
+
+        Lower priority topics are downsampled first when the stream falls behind. Topics default to
+        priority 0.
+        """
+        assert self.rate_controller is not None, "Adaptive downsampling is disabled. Set target_latency_sec to enable it."
+        self.rate_controller.set_topic_priority(topic_id, priority, mode)
+        return True
+
+    def _get_queue_stats(self) -> tuple[float, int, int]:
+        # Called from send(), so this reads the cheap queue snapshots rather than the full stream stats.
+        snapshots = [streamer.get_queue_snapshot() for streamer in list(self.streamers.values())]
+        return (
+            max((last_queue_wait_sec for last_queue_wait_sec, _, _ in snapshots), default=0.0),
+            sum(queue_size for _, queue_size, _ in snapshots),
+            sum(num_sent_messages for _, _, num_sent_messages in snapshots),
+        )
+
+    def get_rate_stats(self) -> dict:
+        """Returns the estimated queue latency and the keep fraction and input and sent rates of each sensor topic."""
+        assert self.rate_controller is not None, "Adaptive downsampling is disabled. Set target_latency_sec to enable it."
+        return self.rate_controller.get_stats()
+
+    def add_ingest_ring(self, ring: SharedMemoryRing, max_batch_size: int = 256, idle_sleep_sec: float = 0.001) -> bool:
+        """Starts a thread that drains samples written by producer processes into the ring and sends them.
+
+        Samples are sent for the sensor_name they were written with, or the default sensor. The
+        thread polls the ring every idle_sleep_sec while it is empty, and drains it one last time
+        on close(). The ring is not closed with the client.
+        """
+        assert self.sensors, "Sensor not registered. Call register first."
+        ingest_thread = threading.Thread(target=self._ingest_worker, args=(ring, max_batch_size, idle_sleep_sec), daemon=True)
+        ingest_thread.start()
+        self.ingest_threads.append(ingest_thread)
+        return True
+
+    def _ingest_worker(self, ring: SharedMemoryRing, max_batch_size: int, idle_sleep_sec: float) -> None:
+        while True:
+            stopped = self.ingest_stopped.is_set()
+            samples = ring.get_batch(max_batch_size)
+            for sensor_name, topic_id, data, timestamp in samples:
+                # A bad sample or a send error must not stop the drain, or the producers would block or drop.
+                try:
+                    self.send(topic_id, data, timestamp, sensor_name=sensor_name)
+                    self.ingest_stats["num_ingested_samples"] += 1
+                except Exception as exception:
+                    self.ingest_stats["num_failed_samples"] += 1
+                    logging.warning(f"Failed to send an ingested sample of sensor {sensor_name} topic_id: {topic_id}: {exception!r}")
+            if not samples:
+                if stopped:
+                    break
+                time.sleep(idle_sleep_sec)
+
+    def get_ingest_stats(self) -> dict:
+        """Returns the number of samples drained from the ingest rings that were sent and that failed to send."""
+        return dict(self.ingest_stats)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Closes all streams, flushing pending data for up to timeout seconds (forever if None)."""
+        self.ingest_stopped.set()
+        for ingest_thread in self.ingest_threads:
+            ingest_thread.join(timeout)
+        for streamer in self.streamers.values():
+            streamer.close(timeout=timeout)
         for subscriber in self.subscribers:
             subscriber.close()
+        self.dispatcher.close(timeout)
         return True 
 
-    def get_stats(self):
-        assert self.streamer is not None, "Sensor not registered. Call register first."
-        return self.streamer.get_stats()
+    def add_handler(self, handler: Callable[[str, str, Any], None], sensor_name: str = "*", topic_id: str = "*") -> int:
+        """Calls handler(sensor_name, topic_id, data) for subscribed data matching the sensor_name and topic_id patterns.
+
+        The patterns support fnmatch style wildcards. Matching data is no longer returned by
+        get_sensor_data(). Returns a handler id for remove_handler().
+        """
+        return self.dispatcher.add_handler(handler, sensor_name, topic_id)
+
+    def remove_handler(self, handler_id: int) -> bool:
+        return self.dispatcher.remove_handler(handler_id)
+
+    def get_window(self, sensor_name: str, topic_id: str) -> Optional[SensorRingBuffer]:
+        """Returns the ring buffer of the subscribed data of a sensor topic, or None if nothing was received yet."""
+        assert self.window_store is not None, "Sensor windows are disabled. Set window_capacity to enable them."
+        return self.window_store.get_window(sensor_name, topic_id)
+
+    def get_handler_stats(self) -> dict:
+        """Returns the queue size, drops, errors, dispatch latency and run time of each handler."""
+        return self.dispatcher.get_stats()
+
+    def _get_streamer(self, sensor_name: Optional[str]) -> SocketManager:
+        sensor_name = sensor_name if sensor_name is not None else self.default_sensor_name
+        assert sensor_name in self.sensors, f"Sensor {sensor_name} not registered. Call register first."
+        return self.sensors[sensor_name]["streamer"]
+
+    def get_stats(self, sensor_name: Optional[str] = None) -> dict:
+        """Returns the stats of the stream of a sensor, by default the most recently registered one.
+
+        The stats include latency histograms and per topic rates. With share_connections, they
+        cover every sensor sharing the connection, see get_sensor_stats() for per sensor rates.
+        """
+        return self._get_streamer(sensor_name).get_stats()
+
+    def get_sensor_stats(self) -> dict:
+        """Returns the number of messages sent and the message and byte rates of each registered sensor."""
+        streams_stats = {}
+        for streamer in self.streamers.values():
+            streams_stats.update(streamer.get_stats()["streams"])
+        sensor_stats = {}
+        for sensor_name, sensor in self.sensors.items():
+            stream_stats = streams_stats.get(sensor["stream_uid"], {"num_messages": 0, "messages_per_sec": 0.0, "bytes_per_sec": 0.0})
+            sensor_stats[sensor_name] = {"stream_uid": sensor["stream_uid"], **stream_stats}
+        return sensor_stats
 
-    def get_incoming_data_queue_size(self) -> int:
-        assert self.streamer is not None, "Sensor not registered. Call register first."
-        return self.streamer.incoming_data_queue.qsize()
+    def get_incoming_data_queue_size(self, sensor_name: Optional[str] = None) -> int:
+        return self._get_streamer(sensor_name).incoming_data_queue.qsize()
     
-    def get_incoming_message_queue_size(self) -> int:
-        assert self.streamer is not None, "Sensor not registered. Call register first."
-        return self.streamer.incoming_message_queue.qsize()
+    def get_incoming_message_queue_size(self, sensor_name: Optional[str] = None) -> int:
+        return self._get_streamer(sensor_name).incoming_message_queue.qsize()
     
-    def get_outgoing_message_queue_size(self) -> int:
-        assert self.streamer is not None, "Sensor not registered. Call register first."
-        return self.streamer.outgoing_message_queue.qsize()
+    def get_outgoing_message_queue_size(self, sensor_name: Optional[str] = None) -> int:
+        return self._get_streamer(sensor_name).get_outgoing_message_queue_size()
     
-    def get_max_outgoing_message_queue_size(self) -> int:
-        assert self.streamer is not None, "Sensor not registered. Call register first."
-        return self.streamer.max_outgoing_message_queue_size
+    def get_max_outgoing_message_queue_size(self, sensor_name: Optional[str] = None) -> int:
+        return self._get_streamer(sensor_name).get_max_outgoing_message_queue_size()
     
-    def get_outgoing_message_queue_latency(self) -> float:
-        """Returns the latency of the latest outgoing message queue in seconds."""
-        assert self.streamer is not None, "Sensor not registered. Call register first."
-        return self.streamer.get_outgoing_message_queue_latency()
+    def get_outgoing_message_queue_latency(self, sensor_name: Optional[str] = None) -> float:
+        """Returns the latency of the latest outgoing message queue of a sensor in seconds."""
+        return self._get_streamer(sensor_name).get_outgoing_message_queue_latency()
 
     def get_sensor_data(self) -> list[dict]:
         events = []
@@ -0,0 +1,229 @@
+from typing import Any, Optional
+from multiprocessing import shared_memory
+import json
+import logging
+import struct
+import time
+
+from archetypeai._binary_codec import decode_message, encode_message, is_binary_frame
+from archetypeai._event_buffer import OVERFLOW_BLOCK, OVERFLOW_DROP_NEWEST
+
+_RING_MAGIC = b"ATSR"
+_RING_HEADER_FORMAT = "<4sIII"  # magic, num producers, num slots per producer, slot size.
+_RING_HEADER_SIZE = 64
+# Each producer lane has a header of two cache lines, so the producer and the consumer never write
+# to the same line: write count, num put, num dropped and num oversized samples, then the read count.
+_COUNTER_FORMAT = "<Q"
+_LANE_HEADER_SIZE = 128
+_WRITE_COUNT_OFFSET = 0
+_NUM_PUT_OFFSET = 8
+_NUM_DROPPED_OFFSET = 16
+_NUM_OVERSIZED_OFFSET = 24
+_READ_COUNT_OFFSET = 64
+# Each slot holds a sample encoded as JSON, or as a binary frame if it holds arrays, prefixed by its length.
+_SLOT_LENGTH_FORMAT = "<I"
+_SLOT_LENGTH_SIZE = struct.calcsize(_SLOT_LENGTH_FORMAT)
+_BLOCK_SLEEP_SEC = 0.0005
+
+
+def _encode_record(sensor_name: Optional[str], topic_id: str, data: Any, timestamp: float) -> bytes:
+    try:
+        return json.dumps((sensor_name, topic_id, data, timestamp), separators=(",", ":")).encode()
+    except TypeError:
+        return encode_message({"sample": [sensor_name, topic_id, data, timestamp]})
+
+
+def _decode_record(record: bytes) -> tuple[Optional[str], str, Any, float]:
+    if is_binary_frame(record):
+        return tuple(decode_message(record)["sample"])
+    return tuple(json.loads(record))
+
+
+class SharedMemoryRing:
+    """A ring buffer of sensor samples in shared memory, written by many producer processes.
+
+    Lets acquisition code run one process per device, outside of the GIL of the streamer process,
+    while a single SensorsApi in the streamer process owns the websocket connections and drains the
+    ring (see SensorsApi.add_ingest_ring). The creating process picks a unique name for the ring, and
+    each producer process attaches to it by name with its own producer_index.
+
+    Every producer owns a lane of num_slots fixed size slots and is its only writer, so claiming a
+    slot needs no lock or atomic read-modify-write across processes: the producer writes the sample
+    into the slot at its write count and then publishes it by incrementing the write count, and the
+    consumer frees slots by incrementing the read count of the lane. This relies on aligned 8 byte
+    counter stores being atomic and seen in order, as on x86-64. Samples are encoded as compact JSON,
+    or with the binary codec if they hold NumPy arrays or bytes, which are copied as raw bytes. When
+    a lane is full, the sample is dropped (drop_newest) or the producer waits up to put_timeout_sec
+    for space (block), and samples larger than a slot are dropped; both are counted per lane. On
+    Python < 3.13 producers should be started by the process that created the ring (e.g. with
+    multiprocessing), since the resource tracker of an unrelated process unlinks the ring when that
+    process exits.
+    """
+
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        num_producers: int = 4,
+        num_slots: int = 4096,
+        slot_size_bytes: int = 1024,
+        ) -> None:
+        """Creates a new ring with a random name unless one is given."""
+        assert num_producers > 0, "The number of producers must be positive"
+        assert num_slots > 0, "The number of slots must be positive"
+        assert slot_size_bytes > _SLOT_LENGTH_SIZE, f"The slot size must be over {_SLOT_LENGTH_SIZE} bytes"
+        size = _RING_HEADER_SIZE + num_producers * (_LANE_HEADER_SIZE + num_slots * slot_size_bytes)
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        struct.pack_into(_RING_HEADER_FORMAT, self.shm.buf, 0, _RING_MAGIC, num_producers, num_slots, slot_size_bytes)
+        self.shm.buf[_RING_HEADER_SIZE:size] = bytes(size - _RING_HEADER_SIZE)
+        self.is_owner = True
+        self._init_layout()
+
+    @classmethod
+    def attach(
+        cls,
+        name: str,
+        producer_index: int,
+        overflow_policy: str = OVERFLOW_DROP_NEWEST,
+        put_timeout_sec: Optional[float] = None,
+        ) -> "SharedMemoryRing":
+        """Attaches a producer to the lane producer_index of an existing ring."""
+        assert overflow_policy in (OVERFLOW_BLOCK, OVERFLOW_DROP_NEWEST), f"Unsupported overflow policy: {overflow_policy}"
+        ring = cls.__new__(cls)
+        try:
+            ring.shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            ring.shm = shared_memory.SharedMemory(name=name)
+        magic, = struct.unpack_from("<4s", ring.shm.buf, 0)
+        assert magic == _RING_MAGIC, f"{name} is not a shared memory ring"
+        ring.is_owner = False
+        ring._init_layout()
+        assert 0 <= producer_index < ring.num_producers, f"Invalid producer index: {producer_index}"
+        ring.producer_index = producer_index
+        ring.slots_offset = ring._get_lane_offset(producer_index) + _LANE_HEADER_SIZE
+        # The producer is the only writer of the counters of its lane, so it keeps them locally.
+        ring.write_count = ring._get_counter(producer_index, _WRITE_COUNT_OFFSET)
+        ring.read_count = ring._get_counter(producer_index, _READ_COUNT_OFFSET)
+        ring.num_dropped_samples = ring._get_counter(producer_index, _NUM_DROPPED_OFFSET)
+        ring.num_oversized_samples = ring._get_counter(producer_index, _NUM_OVERSIZED_OFFSET)
+        ring.overflow_policy = overflow_policy
+        ring.put_timeout_sec = put_timeout_sec
+        return ring
+
+    def _init_layout(self) -> None:
+        _, self.num_producers, self.num_slots, self.slot_size_bytes = struct.unpack_from(_RING_HEADER_FORMAT, self.shm.buf, 0)
+        self.name = self.shm.name
+        self.lane_size = _LANE_HEADER_SIZE + self.num_slots * self.slot_size_bytes
+        self.producer_index = None
+        self.next_lane_index = 0
+        self.num_samples_read = 0
+
+    def _get_lane_offset(self, lane_index: int) -> int:
+        return _RING_HEADER_SIZE + lane_index * self.lane_size
+
+    def _get_counter(self, lane_index: int, counter_offset: int) -> int:
+        return struct.unpack_from(_COUNTER_FORMAT, self.shm.buf, self._get_lane_offset(lane_index) + counter_offset)[0]
+
+    def _set_counter(self, lane_index: int, counter_offset: int, value: int) -> None:
+        struct.pack_into(_COUNTER_FORMAT, self.shm.buf, self._get_lane_offset(lane_index) + counter_offset, value)
+
+    def put(self, topic_id: str, data: Any, timestamp: float = -1.0, sensor_name: Optional[str] = None) -> bool:
+        """Writes a sample into the lane of this producer. Returns false if the sample was dropped.
+
+        The sample is sent for sensor_name, or for the default sensor of the SensorsApi if None.
+        """
+        assert self.producer_index is not None, "Only attached producers can put samples"
+        timestamp = timestamp if timestamp >= 0 else time.time()
+        record = _encode_record(sensor_name, topic_id, data, timestamp)
+        if _SLOT_LENGTH_SIZE + len(record) > self.slot_size_bytes:
+            logging.debug(f"Dropped a {len(record)} byte sample larger than the ring slots on topic_id: {topic_id}")
+            self.num_oversized_samples += 1
+            self._set_counter(self.producer_index, _NUM_OVERSIZED_OFFSET, self.num_oversized_samples)
+            return False
+        if not self._wait_for_slot():
+            self.num_dropped_samples += 1
+            self._set_counter(self.producer_index, _NUM_DROPPED_OFFSET, self.num_dropped_samples)
+            return False
+        slot_offset = self.slots_offset + (self.write_count % self.num_slots) * self.slot_size_bytes
+        struct.pack_into(_SLOT_LENGTH_FORMAT, self.shm.buf, slot_offset, len(record))
+        self.shm.buf[slot_offset + _SLOT_LENGTH_SIZE:slot_offset + _SLOT_LENGTH_SIZE + len(record)] = record
+        self.write_count += 1
+        # Publishing the slot must be the last write.
+        self._set_counter(self.producer_index, _NUM_PUT_OFFSET, self.write_count)
+        self._set_counter(self.producer_index, _WRITE_COUNT_OFFSET, self.write_count)
+        return True
+
+    def _wait_for_slot(self) -> bool:
+        """Returns true once the lane has a free slot, waiting for one with the block overflow policy."""
+        # The read count is only read again once the slots known to be free have been used up.
+        if self.write_count - self.read_count < self.num_slots:
+            return True
+        self.read_count = self._get_counter(self.producer_index, _READ_COUNT_OFFSET)
+        if self.write_count - self.read_count < self.num_slots or self.overflow_policy != OVERFLOW_BLOCK:
+            return self.write_count - self.read_count < self.num_slots
+        deadline = None if self.put_timeout_sec is None else time.monotonic() + self.put_timeout_sec
+        while self.write_count - self.read_count >= self.num_slots:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(_BLOCK_SLEEP_SEC)
+            self.read_count = self._get_counter(self.producer_index, _READ_COUNT_OFFSET)
+        return True
+
+    def get_batch(self, max_samples: int = -1) -> list[tuple[Optional[str], str, Any, float]]:
+        """Reads up to max_samples (sensor_name, topic_id, data, timestamp) samples without waiting.
+
+        Lanes are drained in turn, starting from a different lane on every call, so a busy producer
+        can't starve the others. Only the process that created the ring reads from it.
+        """
+        assert self.is_owner, "Only the process that created the ring can read from it"
+        samples = []
+        for lane_step in range(self.num_producers):
+            lane_index = (self.next_lane_index + lane_step) % self.num_producers
+            num_samples = -1 if max_samples <= 0 else max_samples - len(samples)
+            if num_samples == 0:
+                break
+            self._read_lane(lane_index, num_samples, samples)
+        self.next_lane_index = (self.next_lane_index + 1) % self.num_producers
+        self.num_samples_read += len(samples)
+        return samples
+
+    def _read_lane(self, lane_index: int, max_samples: int, samples: list) -> None:
+        read_count = self._get_counter(lane_index, _READ_COUNT_OFFSET)
+        write_count = self._get_counter(lane_index, _WRITE_COUNT_OFFSET)
+        if max_samples > 0:
+            write_count = min(write_count, read_count + max_samples)
+        slots_offset = self._get_lane_offset(lane_index) + _LANE_HEADER_SIZE
+        for count in range(read_count, write_count):
+            slot_offset = slots_offset + (count % self.num_slots) * self.slot_size_bytes
+            record_length, = struct.unpack_from(_SLOT_LENGTH_FORMAT, self.shm.buf, slot_offset)
+            # The record is copied out of the slot, which is reused once the read count moves on.
+            samples.append(_decode_record(bytes(self.shm.buf[slot_offset + _SLOT_LENGTH_SIZE:slot_offset + _SLOT_LENGTH_SIZE + record_length])))
+        if write_count > read_count:
+            self._set_counter(lane_index, _READ_COUNT_OFFSET, write_count)
+
+    def __len__(self) -> int:
+        """Returns the number of samples that haven't been read yet."""
+        return sum(
+            self._get_counter(lane_index, _WRITE_COUNT_OFFSET) - self._get_counter(lane_index, _READ_COUNT_OFFSET)
+            for lane_index in range(self.num_producers))
+
+    def get_stats(self) -> dict:
+        """Returns the samples put, dropped, oversized and pending of each producer lane and in total."""
+        lanes = []
+        for lane_index in range(self.num_producers):
+            lanes.append({
+                "num_samples_put": self._get_counter(lane_index, _NUM_PUT_OFFSET),
+                "num_dropped_samples": self._get_counter(lane_index, _NUM_DROPPED_OFFSET),
+                "num_oversized_samples": self._get_counter(lane_index, _NUM_OVERSIZED_OFFSET),
+                "num_pending_samples": (
+                    self._get_counter(lane_index, _WRITE_COUNT_OFFSET) - self._get_counter(lane_index, _READ_COUNT_OFFSET)),
+            })
+        stats = {stats_name: sum(lane[stats_name] for lane in lanes) for stats_name in lanes[0]}
+        stats["num_samples_read"] = self.num_samples_read
+        stats["lanes"] = lanes
+        return stats
+
+    def close(self) -> None:
+        """Detaches from the ring, and frees it if this process created it."""
+        self.shm.close()
+        if self.is_owner:
+            self.shm.unlink()
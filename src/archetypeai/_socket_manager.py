@@ -1,59 +1,265 @@
 import logging
 import json
 import time
-from queue import Queue
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+from queue import Empty, Queue
+from typing import Any, Optional
 import threading
 
 from websocket import create_connection
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from archetypeai._base import ApiBase
+from archetypeai._batch_encoding import encode_rows, get_row_values, get_timestamps
+from archetypeai._binary_codec import decode_message, encode_message, estimate_size, is_binary_frame
+from archetypeai._dispatcher import CallbackDispatcher
+from archetypeai._event_buffer import OVERFLOW_BLOCK, ShardedEventBuffer
+from archetypeai._frame_codec import FRAME_COMPRESSION_NONE, FrameCodec, check_frame_compression, get_compression_stats
+from archetypeai._sensor_windows import SensorWindowStore
+from archetypeai._spool import MessageSpool
+from archetypeai._stream_stats import StreamStatsRecorder, merge_stream_stats
 
 _CTRL_MSG_HEADER = "cm"
 _DATA_MSG_HEADER = "dm"
+_DATA_BATCH_HEADER = "db"
 _HEADER_KEY = "h"
 _HEARTBEAT_DELAY_SEC = 5.0
+WIRE_FORMAT_JSON = "json"
+WIRE_FORMAT_BINARY = "binary"
+
+
+class OutgoingMessage:
+    """A data message queued by send().
+
+    A __slots__ record rather than a dict, so it is smaller and cheaper to create on the send path.
+    The enqueue_time and the cached batch encoding are local bookkeeping and are never sent. A chunk
+    of num_messages rows queued by send_batch() has is_chunk set and holds lists of the row data (only
+    kept for the binary wire format), timestamps and message_ids, with the rows already encoded as
+    JSON batch items. Chunks are always sent as batch items, even if they hold a single row.
+    """
+
+    __slots__ = ("topic_id", "data", "timestamp", "message_id", "stream_uid", "enqueue_time", "encoded", "num_messages", "is_chunk")
+
+    def __init__(
+        self,
+        topic_id: str,
+        data: Any,
+        timestamp: float,
+        message_id: int,
+        stream_uid: str,
+        enqueue_time: float,
+        encoded: Optional[bytes] = None,
+        num_messages: int = 1,
+        is_chunk: bool = False,
+        ) -> None:
+        self.topic_id = topic_id
+        self.data = data
+        self.timestamp = timestamp
+        self.message_id = message_id
+        self.stream_uid = stream_uid
+        self.enqueue_time = enqueue_time
+        self.encoded = encoded
+        self.num_messages = num_messages
+        self.is_chunk = is_chunk
+
+    def to_wire_message(self) -> dict:
+        return {
+            _HEADER_KEY: _DATA_MSG_HEADER,
+            "topic_id": self.topic_id,
+            "data": self.data,
+            "timestamp": self.timestamp,
+            "message_id": self.message_id,
+            "stream_uid": self.stream_uid,
+        }
+
+
+def _get_topic_id(message: OutgoingMessage) -> str:
+    return message.topic_id
 
 
 class SocketManager(ApiBase):
-    """Helper class for communicating with the Archetype AI platform via websockets."""
+    """Helper class for communicating with the Archetype AI platform via websockets.
+
+    By default each data message is sent as its own websocket frame. Set max_batch_size > 1 to coalesce
+    queued messages into a single batch frame of up to max_batch_size messages or roughly
+    max_batch_bytes of payload, waiting up to batch_linger_sec for a batch to fill. Batches keep the
+    queue (message_id) order and carry the stream_uid once per frame rather than once per message.
+
+    With wire_format="binary", data messages are sent as binary frames where NumPy arrays and
+    bytes-like values are written as typed, length-prefixed raw buffers instead of JSON text (see
+    _binary_codec). Binary frames received from the server are decoded automatically.
+
+    Outgoing messages are buffered in a queue of up to max_outgoing_queue_size messages. When it is
+    full the overflow_policy decides whether send() blocks (for up to send_timeout_sec), drops the
+    oldest or newest message, or keeps only the latest messages of each topic (see EventBuffer).
+
+    Each worker records the queue wait, socket send time and end-to-end latency (from send() until
+    the frame is written to the socket) of its messages in its own lock-free StreamStatsRecorder.
+    get_stats() merges them into p50/p90/p99/max histograms and per topic rates over the last
+    stats_window_sec seconds.
+
+    With several worker threads, each worker has its own outgoing queue and every topic_id is
+    consistently hashed to one worker (see ShardedEventBuffer), so the messages of a topic are always
+    sent in order on the same socket while workers never contend on a shared queue. If a worker fails
+    while others are still running, its topics and queued messages are rebalanced onto the remaining
+    workers instead of stopping the stream.
+
+    If spool_dir is set, outgoing messages are appended to a durable on-disk MessageSpool instead of
+    an in-memory queue, sent by a single worker thread (num_worker_threads must be 1). If its socket
+    fails, the worker reconnects with exponential backoff, re-handshakes and replays every message
+    the server hasn't confirmed in message_id order. Messages are confirmed by the next successful
+    control message round trip, so delivery is at-least-once. Unconfirmed messages are kept on disk
+    across restarts.
+
+    All worker sockets are connected and handshaken concurrently when a stream starts. The handshake
+    round trip doubles as the readiness check: a socket is ready once the server answers it, and
+    the stream fails to start if any socket isn't ready within connect_timeout_sec.
+
+    With frame_compression="zlib", each socket asks the server in its handshake to compress frames
+    with a per-connection deflate stream (see FrameCodec), and falls back to uncompressed frames if
+    the server doesn't accept. Frames smaller than compression_min_size_bytes are always sent raw.
+    Bytes on the wire, compression ratios and CPU time are reported in stats["compression"].
 
-    def __init__(self, api_key: str, api_endpoint: str, num_worker_threads: int = 1, fetch_time_sec=2.0) -> None:
+    Subscribers poll for data with fetch control messages every fetch_time_sec. If max_fetch_time_sec
+    is larger, the fetch interval adapts: it drops back to fetch_time_sec whenever a fetch returns data
+    and doubles up to max_fetch_time_sec after each empty fetch. With push_mode=True the server is
+    asked to push data as it arrives instead, and each socket is read continuously by its own reader
+    thread so no fetch messages are sent at all (requires server support). Incoming data and messages
+    are passed to the handlers of the dispatcher if one is set and any handler matches. If a
+    window_store is set, numeric sensor data is also written straight into its NumPy ring buffers.
+    Data that is neither stored nor handled is queued for get_data() and get_messages().
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        api_endpoint: str,
+        num_worker_threads: int = 1,
+        fetch_time_sec=2.0,
+        max_batch_size: int = 1,
+        max_batch_bytes: int = 256 * 1024,
+        batch_linger_sec: float = 0.0,
+        wire_format: str = WIRE_FORMAT_JSON,
+        max_outgoing_queue_size: int = 10_000,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        send_timeout_sec: Optional[float] = None,
+        stats_window_sec: float = 10.0,
+        spool_dir: Optional[str] = None,
+        max_spool_bytes: int = 1024 * 1024 * 1024,
+        spool_segment_bytes: int = 16 * 1024 * 1024,
+        max_reconnect_backoff_sec: float = 30.0,
+        max_fetch_time_sec: float = -1.0,
+        push_mode: bool = False,
+        dispatcher: Optional[CallbackDispatcher] = None,
+        window_store: Optional[SensorWindowStore] = None,
+        connect_timeout_sec: float = 10.0,
+        frame_compression: str = FRAME_COMPRESSION_NONE,
+        compression_level: int = 6,
+        compression_min_size_bytes: int = 256,
+        ) -> None:
         super().__init__(api_key, api_endpoint)
+        assert wire_format in (WIRE_FORMAT_JSON, WIRE_FORMAT_BINARY), f"Unknown wire format: {wire_format}"
+        self.wire_format = wire_format
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.batch_linger_sec = batch_linger_sec
         self.stream_uid = None
         self.streamer_endpoint = None
         self.num_workers = num_worker_threads
         self.fetch_time_sec = fetch_time_sec
+        self.max_fetch_time_sec = max(max_fetch_time_sec, fetch_time_sec)
+        assert not (push_mode and spool_dir is not None), "Push mode is only supported by subscribers"
+        # A reconnect rewinds the whole spool, which would replay the messages other workers still have in flight.
+        assert spool_dir is None or num_worker_threads == 1, "Spooling requires a single worker thread"
+        self.push_mode = push_mode
+        self.reader_threads = {}
         self.connected = False
         self.streamer_sockets = []
         self.threads = {}
-        self.post_connect_timeout_sec = 1
+        self.connect_timeout_sec = connect_timeout_sec
+        check_frame_compression(frame_compression)
+        self.frame_compression = frame_compression
+        self.compression_level = compression_level
+        self.compression_min_size_bytes = compression_min_size_bytes
+        # The frame codec of each socket that negotiated compression.
+        self.frame_codecs = {}
         self.incoming_data_queue = Queue()
         self.incoming_message_queue = Queue()
-        self.outgoing_message_queue = Queue()
-        self.stats_queue = Queue()
-        self.message_id = 0
+        self.dispatcher = dispatcher
+        self.window_store = window_store
+        self.spool = None
+        if spool_dir is not None:
+            self.spool = MessageSpool(
+                spool_dir, self._encode_spool_record, self._decode_spool_record, spool_segment_bytes, max_spool_bytes)
+            self.outgoing_message_queue = self.spool
+        else:
+            self.outgoing_message_queue = ShardedEventBuffer(
+                num_worker_threads, max_outgoing_queue_size, overflow_policy, get_key=_get_topic_id)
+        self.initial_reconnect_backoff_sec = 0.1
+        self.max_reconnect_backoff_sec = max_reconnect_backoff_sec
+        self._stop_event = threading.Event()
+        self.send_timeout_sec = send_timeout_sec
+        self.stats_window_sec = stats_window_sec
+        self.stats_recorders = {}
+        # next() on an itertools.count is atomic, so concurrent producers always get unique message ids.
+        self.message_ids = itertools.count()
+        # Serializes id assignment and appends in spool mode, where messages must be spooled in id order.
+        # Spooled messages take the next id of the spool itself, so a message that fails to encode
+        # doesn't leave a gap that would stop the spool from ever confirming the messages after it.
+        self.spool_lock = threading.Lock()
         self._run_worker_loop = False
-        self.max_outgoing_message_queue_size = 0
-        self.outgoing_message_latency_total = 0.0
-        self.outgoing_message_count = 0
         self.stats = {}
         self.stats["num_data_packets_sent"] = 0
         self.stats["max_outgoing_message_queue_size"] = 0
         self.stats["outgoing_message_queue_latency"] = 0
         self.stats["outgoing_message_latency"] = 0
+        self.stats["num_frames_sent"] = 0
+        self.stats["num_bytes_sent"] = 0
+        self.stats["avg_batch_size"] = 0.0
+        self.stats["max_batch_size"] = 0
+        self.stats["frames_per_sec"] = 0.0
+        self.stats["num_dropped_messages"] = 0
+        self.stats["num_dropped_messages_per_topic"] = {}
+        self.stats["num_discarded_messages"] = 0
+        self.stats["num_discarded_messages_per_topic"] = {}
+        self.stats["queue_wait_sec"] = {}
+        self.stats["send_time_sec"] = {}
+        self.stats["end_to_end_latency_sec"] = {}
+        self.stats["topics"] = {}
+        self.stats["streams"] = {}
+        self.stats["num_reconnects"] = 0
+        self.stats["num_rebalances"] = 0
+        self.stats["num_fetches"] = 0
+        self.stats["num_empty_fetches"] = 0
+        self.stats["fetch_interval_sec"] = fetch_time_sec
+        self.stats["compression"] = {}
+        self.stream_start_time = time.time()
     
     def _start_stream(self, stream_uid: str, streamer_endpoint: str, streamer_channel: str) -> bool:
         """Starts a new stream with the Archetype AI platform."""
         self.stream_uid = stream_uid
         self.streamer_endpoint = streamer_endpoint
         self.streamer_channel = streamer_channel
-        self.message_id = 0
         
         self._safely_stop_streams()
+        self.message_ids = itertools.count()
+        self.outgoing_message_queue.reopen()
+        self._stop_event.clear()
+        self._run_worker_loop = True
+        self.stream_start_time = time.time()
         assert self._handshake()
+        if self.push_mode:
+            self._start_readers()
+        self.stats_recorders = {}
         for worker_id, streamer_socket in enumerate(self.streamer_sockets):
-            self.threads[worker_id] = threading.Thread(target=self._worker, args=(worker_id, streamer_socket))
+            self.stats_recorders[worker_id] = StreamStatsRecorder(self.stats_window_sec)
+            self.threads[worker_id] = threading.Thread(
+                target=self._worker, args=(worker_id, streamer_socket, self.stats_recorders[worker_id]))
             self.threads[worker_id].start()
 
         self.connected = True
@@ -61,48 +267,173 @@ class SocketManager(ApiBase):
 
     def _safely_stop_streams(self):
         self._run_worker_loop = False
-        for worker_id in self.threads:
-            self.threads[worker_id].join()
+        self._stop_event.set()
+        # Wake up any workers and producers blocked on the outgoing queue.
+        self.outgoing_message_queue.close()
+        for worker_id in list(self.threads):
+            if self.threads[worker_id] is not threading.current_thread():
+                self.threads[worker_id].join()
         self.threads = {}
+        for streamer_socket in self.streamer_sockets:
+            try:
+                streamer_socket.close()
+            except Exception:
+                logging.debug("Failed to cleanly close socket")
         self.streamer_sockets = []
+        # Readers are blocked on their sockets, so they are only joined once the sockets are closed.
+        for worker_id in list(self.reader_threads):
+            if self.reader_threads[worker_id] is not threading.current_thread():
+                self.reader_threads[worker_id].join()
+        self.reader_threads = {}
+        self.frame_codecs = {}
         self.connected = False
 
-    def close(self, wait_on_pending_data: bool = True):
-        """Closes the connection with the server."""
-        if wait_on_pending_data:
-            while not self.outgoing_message_queue.empty():
-                logging.info(f"outgoing data queue size: {self.outgoing_message_queue.qsize()}")
-                time.sleep(0.1)
+    def close(self, wait_on_pending_data: bool = True, timeout: Optional[float] = None) -> dict:
+        """Closes the connection with the server.
+
+        Pending messages are flushed for up to timeout seconds (forever if None) and any messages
+        still pending after that are discarded. Returns the number of discarded messages per topic.
+        In spool mode unconfirmed messages are kept on disk instead of being discarded.
+        """
+        if wait_on_pending_data and self.threads:
+            if not self.outgoing_message_queue.join(timeout):
+                logging.warning(f"Timed out flushing {len(self.outgoing_message_queue)} outgoing messages")
         self._safely_stop_streams()
+        if self.spool is not None:
+            self.spool.flush()
+            num_spooled_messages = self.spool.get_depth()
+            if num_spooled_messages > 0:
+                logging.info(f"Keeping {num_spooled_messages} unconfirmed messages in {self.spool.spool_dir}")
+            return {"num_discarded_messages": 0, "num_discarded_messages_per_topic": {}, "num_spooled_messages": num_spooled_messages}
+        num_discarded_messages_per_topic = {}
+        for message in self.outgoing_message_queue.get_batch():
+            topic_id = message.topic_id
+            num_discarded_messages_per_topic[topic_id] = num_discarded_messages_per_topic.get(topic_id, 0) + message.num_messages
+        num_discarded_messages = sum(num_discarded_messages_per_topic.values())
+        if num_discarded_messages > 0:
+            logging.warning(f"Discarded {num_discarded_messages} pending messages: {num_discarded_messages_per_topic}")
+        self.stats["num_discarded_messages"] = num_discarded_messages
+        self.stats["num_discarded_messages_per_topic"] = num_discarded_messages_per_topic
+        return {
+            "num_discarded_messages": num_discarded_messages,
+            "num_discarded_messages_per_topic": num_discarded_messages_per_topic,
+        }
+
+    def send(self, topic_id: str, data: Any, timestamp: float = -1.0, stream_uid: Optional[str] = None) -> bool:
+        """Sends data to the Archetype AI platform under the given topic_id.
 
-    def send(self, topic_id: str, data: Any, timestamp: float = -1.0) -> bool:
-        """Sends data to the Archetype AI platform under the given topic_id."""
+        The message is sent for the stream_uid of this connection unless another stream_uid is given,
+        which lets several sensor streams share one connection. Safe to call from many producer
+        threads. Returns false if the message was dropped by the overflow policy of the outgoing queue.
+        """
         assert self.connected, "Client not connected. Make sure the stream is open!"
-        timestamp = timestamp if timestamp >= 0 else time.time()
-        message = {
-            "topic_id": topic_id,
-            "data": data,
-            "timestamp": timestamp,
-            "message_id": self.message_id,
-            "stream_uid": self.stream_uid
-        }
-        self.message_id += 1
-        self.outgoing_message_queue.put({_HEADER_KEY: _DATA_MSG_HEADER, **message})
-        self._refresh_stats()
-        return True
+        time_now = time.time()
+        timestamp = timestamp if timestamp >= 0 else time_now
+        stream_uid = stream_uid if stream_uid is not None else self.stream_uid
+        if self.spool is not None:
+            with self.spool_lock:
+                message = OutgoingMessage(topic_id, data, timestamp, self.spool.next_message_id, stream_uid, time_now)
+                success = self.spool.put(message, self.send_timeout_sec)
+        else:
+            message = OutgoingMessage(topic_id, data, timestamp, next(self.message_ids), stream_uid, time_now)
+            success = self.outgoing_message_queue.put(message, self.send_timeout_sec)
+        if not success:
+            logging.debug(f"Dropped outgoing message on topic_id: {topic_id}")
+        return success
+
+    def send_batch(
+        self,
+        topic_id: str,
+        timestamps: Any,
+        values: Any,
+        stream_uid: Optional[str] = None,
+        chunk_size: int = 256,
+        ) -> int:
+        """Sends each row of a NumPy array or pandas DataFrame as a data message under the given topic_id.
+
+        timestamps holds one timestamp in seconds per row. If None, the DatetimeIndex of a DataFrame
+        or else the current time is used. The rows are encoded in bulk (see encode_rows), given a
+        block of message ids and queued in chunks of up to chunk_size pre-encoded rows, which are sent
+        whole within batch frames. Each chunk counts as one message towards max_outgoing_queue_size.
+        In spool mode rows are spooled one by one. Returns the number of rows queued, which is less
+        than the number of rows if the overflow policy dropped a chunk.
+        """
+        assert self.connected, "Client not connected. Make sure the stream is open!"
+        assert np is not None, "NumPy is required to send batches"
+        num_rows = len(values)
+        time_now = time.time()
+        timestamps = get_timestamps(timestamps, values)
+        stream_uid = stream_uid if stream_uid is not None else self.stream_uid
+        row_values = get_row_values(values) if self.wire_format == WIRE_FORMAT_BINARY or self.spool is not None else None
+        encoded_rows = encode_rows(values) if self.wire_format == WIRE_FORMAT_JSON else None
+        num_queued_rows = 0
+        if self.spool is not None:
+            for row_index in range(num_rows):
+                with self.spool_lock:
+                    message_id = self.spool.next_message_id
+                    message = OutgoingMessage(
+                        topic_id, row_values[row_index], timestamps[row_index], message_id, stream_uid, time_now,
+                        self._encode_batch_rows(topic_id, stream_uid, encoded_rows, timestamps, row_index, [message_id]))
+                    num_queued_rows += self.spool.put(message, self.send_timeout_sec)
+            return num_queued_rows
+        for chunk_start in range(0, num_rows, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, num_rows)
+            # islice runs in C, so the chunk gets a block of ids without a lock.
+            message_ids = list(itertools.islice(self.message_ids, chunk_end - chunk_start))
+            chunk = OutgoingMessage(
+                topic_id,
+                row_values[chunk_start:chunk_end] if row_values is not None else None,
+                timestamps[chunk_start:chunk_end],
+                message_ids,
+                stream_uid,
+                time_now,
+                self._encode_batch_rows(topic_id, stream_uid, encoded_rows, timestamps, chunk_start, message_ids),
+                chunk_end - chunk_start,
+                is_chunk=True)
+            if self.outgoing_message_queue.put(chunk, self.send_timeout_sec):
+                num_queued_rows += chunk.num_messages
+            else:
+                logging.debug(f"Dropped a chunk of {chunk.num_messages} outgoing messages on topic_id: {topic_id}")
+        return num_queued_rows
+
+    def _encode_batch_rows(
+        self,
+        topic_id: str,
+        stream_uid: str,
+        encoded_rows: Optional[list[str]],
+        timestamps: list[float],
+        row_start: int,
+        message_ids: list[int],
+        ) -> Optional[bytes]:
+        """Assembles the JSON batch items of the rows from row_start, as _encode_batch_item() would encode them."""
+        if encoded_rows is None:
+            return None
+        item_prefix = f'{{"topic_id": {json.dumps(topic_id)}, "data": '
+        item_suffix = f', "stream_uid": {json.dumps(stream_uid)}}}' if stream_uid != self.stream_uid else "}"
+        row_end = row_start + len(message_ids)
+        return ", ".join([
+            f'{item_prefix}{row}, "timestamp": {timestamp!r}, "message_id": {message_id}{item_suffix}'
+            for row, timestamp, message_id in zip(encoded_rows[row_start:row_end], timestamps[row_start:row_end], message_ids)
+        ]).encode()
 
     def get_messages(self) -> Any:
         """Gets any pending messages sent to the client."""
         assert self.connected, "Client not connected. Make sure the stream is open!"
-        while not self.incoming_message_queue.empty():
-            topic_id, data = self.incoming_message_queue.get()
+        while True:
+            try:
+                topic_id, data = self.incoming_message_queue.get_nowait()
+            except Empty:
+                return
             yield topic_id, data
 
     def get_data(self) -> Any:
         """Gets any pending data sent to the client."""
         assert self.connected, "Client not connected. Make sure the stream is open!"
-        while not self.incoming_data_queue.empty():
-            sensor_name, topic_id, data = self.incoming_data_queue.get()
+        while True:
+            try:
+                sensor_name, topic_id, data = self.incoming_data_queue.get_nowait()
+            except Empty:
+                return
             yield sensor_name, topic_id, data
 
     def get_incoming_data_queue_size(self) -> int:
@@ -112,9 +443,10 @@ class SocketManager(ApiBase):
         return self.incoming_message_queue.qsize()
     
     def get_outgoing_message_queue_size(self) -> int:
-        return self.outgoing_message_queue.qsize()
+        return len(self.outgoing_message_queue)
     
     def get_max_outgoing_message_queue_size(self) -> int:
+        self._refresh_stats()
         return self.stats["max_outgoing_message_queue_size"]
     
     def get_outgoing_message_queue_latency(self) -> float:
@@ -122,10 +454,23 @@ class SocketManager(ApiBase):
         self._refresh_stats()
         return self.stats["outgoing_message_queue_latency"]
     
+    def get_queue_snapshot(self) -> tuple[float, int, int]:
+        """Returns the latest queue wait of any worker, the queue size and the number of messages sent.
+
+        Unlike get_stats(), this reads a few counters of the worker recorders without merging them,
+        so it's cheap enough to call from the producer thread.
+        """
+        stats_recorders = list(self.stats_recorders.values())
+        return (
+            max((recorder.last_queue_wait for recorder in stats_recorders), default=0.0),
+            len(self.outgoing_message_queue),
+            sum(recorder.num_messages for recorder in stats_recorders),
+        )
+
     def get_outgoing_message_latency(self) -> float:
-        """Returns the average latency of outgoing data packets in seconds."""
+        """Returns the average socket send latency of outgoing data frames in seconds."""
         self._refresh_stats()
-        return self.stats["outgoing_message_queue_latency"]
+        return self.stats["outgoing_message_latency"]
     
     def get_stats(self) -> dict:
         """Returns the stats of a sensor stream."""
@@ -133,110 +478,399 @@ class SocketManager(ApiBase):
         return self.stats
 
     def _refresh_stats(self):
-        while not self.stats_queue.empty():
-            stats_event = self.stats_queue.get()
-            if "outgoing_message_queue_latency" in stats_event:
-                self.stats["outgoing_message_queue_latency"] = stats_event["outgoing_message_queue_latency"]
-            elif "max_outgoing_message_queue_size" in stats_event:
-                self.stats["max_outgoing_message_queue_size"] = max(
-                    stats_event["max_outgoing_message_queue_size"], self.stats["max_outgoing_message_queue_size"])
-
-    def _worker(self, worker_id: str, streamer_socket) -> None:
+        stream_stats = merge_stream_stats(list(self.stats_recorders.values()))
+        self.stats["num_data_packets_sent"] = stream_stats["num_messages"]
+        self.stats["num_frames_sent"] = stream_stats["num_frames"]
+        self.stats["num_bytes_sent"] = stream_stats["num_bytes"]
+        self.stats["max_batch_size"] = stream_stats["max_batch_size"]
+        self.stats["max_outgoing_message_queue_size"] = stream_stats["max_queue_size"]
+        self.stats["outgoing_message_queue_latency"] = stream_stats["last_queue_wait"]
+        self.stats["outgoing_message_latency"] = stream_stats["send_time_sec"]["mean"]
+        self.stats["queue_wait_sec"] = stream_stats["queue_wait_sec"]
+        self.stats["send_time_sec"] = stream_stats["send_time_sec"]
+        self.stats["end_to_end_latency_sec"] = stream_stats["end_to_end_latency_sec"]
+        self.stats["topics"] = stream_stats["topics"]
+        self.stats["streams"] = stream_stats["streams"]
+        queue_stats = self.outgoing_message_queue.get_stats()
+        self.stats["num_dropped_messages"] = queue_stats["num_dropped_events"]
+        self.stats["num_dropped_messages_per_topic"] = queue_stats["num_dropped_events_per_key"]
+        self.stats["compression"] = get_compression_stats(list(self.frame_codecs.values()))
+        if self.spool is not None:
+            for stats_name in ("spool_depth", "spool_bytes", "spool_num_segments", "num_replayed_messages"):
+                self.stats[stats_name] = queue_stats[stats_name]
+        else:
+            self.stats["num_active_workers"] = queue_stats["num_shards"]
+            self.stats["num_rebalanced_messages"] = queue_stats["num_rebalanced_events"]
+        if self.stats["num_frames_sent"] > 0:
+            self.stats["avg_batch_size"] = self.stats["num_data_packets_sent"] / self.stats["num_frames_sent"]
+        run_time = time.time() - self.stream_start_time
+        self.stats["frames_per_sec"] = self.stats["num_frames_sent"] / run_time if run_time > 0 else 0.0
+
+    def _worker(self, worker_id: str, streamer_socket, stats_recorder: StreamStatsRecorder) -> None:
         logging.debug(f"Starting worker {worker_id}")
-        self._run_worker_loop = True
         try:
-            self._worker_loop(worker_id, streamer_socket)
+            while streamer_socket is not None:
+                try:
+                    self._worker_loop(worker_id, streamer_socket, stats_recorder)
+                    break
+                except Exception as exception:
+                    if self.spool is None or not self._run_worker_loop:
+                        raise
+                    logging.warning(f"Worker {worker_id} lost its connection ({exception!r}), reconnecting...")
+                    streamer_socket = self._reconnect(worker_id, streamer_socket)
         except:
             logging.exception(f"Main loop failed, closing socket!")
             # Remove this failed worker from the thread pool.
-            del self.threads[worker_id]
+            self.threads.pop(worker_id, None)
+            if self.spool is None and self._run_worker_loop and self.threads:
+                # Hand this worker's topics and queued messages over to the remaining workers.
+                try:
+                    streamer_socket.close()
+                except Exception:
+                    logging.debug("Failed to cleanly close socket")
+                num_moved_messages = self.outgoing_message_queue.remove_shard(worker_id)
+                self.stats["num_rebalances"] += 1
+                logging.warning(f"Rebalanced {num_moved_messages} messages of worker {worker_id} onto {len(self.threads)} workers")
+                return
             del streamer_socket
             # If this worker has stopped then make sure all workers stop.
             self._safely_stop_streams()
     
-    def _worker_loop(self, worker_id: str, streamer_socket) -> None:
+    def _worker_loop(self, worker_id: str, streamer_socket, stats_recorder: StreamStatsRecorder) -> None:
         heatbeat_message = {_HEADER_KEY: _CTRL_MSG_HEADER, "topic_id": "ctl_msg/heartbeat", "data": {}, "timestamp": 0}
         fetch_message = {_HEADER_KEY: _CTRL_MSG_HEADER, "topic_id": "ctl_msg/fetch", "data": {}, "timestamp": 0}
-        max_outgoing_message_queue_size = 0
+        next_heartbeat_time = 0.0
+        # Data is pushed to the reader thread in push mode, so there is nothing to fetch.
+        next_fetch_time = float("inf") if self.push_mode else 0.0
+        fetch_interval_sec = self.fetch_time_sec
+        # The ids of spooled messages sent since the last control message round trip.
+        sent_message_ids = []
+        outgoing_message_queue = self._get_worker_queue(worker_id)
         while self._run_worker_loop:
-            # Broadcast any outgoing messages.
-            while not self.outgoing_message_queue.empty():
-                time_now = time.time()
-                max_outgoing_message_queue_size = max(self.outgoing_message_queue.qsize(), max_outgoing_message_queue_size)
-                message = self.outgoing_message_queue.get()
-                queue_delay_time = time_now - message["timestamp"]
-                self.stats_queue.put({
-                    "outgoing_message_queue_latency": queue_delay_time,
-                    "max_outgoing_message_queue_size": max_outgoing_message_queue_size
-                })
-                
-                if message[_HEADER_KEY] == _CTRL_MSG_HEADER:
-                    message_sent = self._send_control_message(message, streamer_socket)
-                elif message[_HEADER_KEY] == _DATA_MSG_HEADER:
-                    message_sent = self._send_data_message(message, streamer_socket)
-                assert message_sent
-
-            # Queue a heartbeat or fetch message if needed.
+            # Send a heartbeat or fetch message directly on this worker's socket once it is due.
             time_now = time.time()
-            if self._run_worker_loop and time_now - heatbeat_message["timestamp"] >= _HEARTBEAT_DELAY_SEC:
+            control_message_sent = False
+            if time_now >= next_heartbeat_time:
                 heatbeat_message["timestamp"] = time_now
-                self.outgoing_message_queue.put({_HEADER_KEY: _CTRL_MSG_HEADER, **heatbeat_message})
-            if self._run_worker_loop and time_now - fetch_message["timestamp"] >= self.fetch_time_sec:
+                if self.push_mode:
+                    # The response is handled by the reader thread.
+                    assert self._send_data(heatbeat_message, streamer_socket) > 0
+                else:
+                    assert self._send_control_message(heatbeat_message, streamer_socket)
+                next_heartbeat_time = time_now + _HEARTBEAT_DELAY_SEC
+                control_message_sent = True
+            if time_now >= next_fetch_time:
                 fetch_message["timestamp"] = time_now
-                self.outgoing_message_queue.put({_HEADER_KEY: _CTRL_MSG_HEADER, **fetch_message})
+                assert self._send_data(fetch_message, streamer_socket) > 0
+                num_received = self._receive_control_response(streamer_socket)
+                assert num_received >= 0
+                fetch_interval_sec = self._get_next_fetch_interval(fetch_interval_sec, num_received)
+                next_fetch_time = time_now + fetch_interval_sec
+                control_message_sent = True
+            if control_message_sent and sent_message_ids:
+                # A control response means the server has received everything sent before it.
+                self.spool.confirm(sent_message_ids)
+                sent_message_ids = []
+
+            # Block on the outgoing queue until a message arrives or the next control message is due.
+            timeout_sec = max(min(next_heartbeat_time, next_fetch_time) - time.time(), 0.0)
+            try:
+                message = outgoing_message_queue.get(timeout=timeout_sec)
+            except TimeoutError:
+                continue
+
+            # Broadcast the outgoing message, coalescing any other queued messages when batching.
+            messages = self._collect_batch(message, outgoing_message_queue) if self.max_batch_size > 1 else [message]
+            queue_size = len(outgoing_message_queue) + len(messages)
+            send_start_time = time.time()
+            # Chunks of send_batch() are always sent as batches.
+            if self.max_batch_size > 1 or message.is_chunk:
+                num_bytes_sent = self._send_data_batch(messages, streamer_socket)
+            else:
+                num_bytes_sent = self._send_data_message(messages[0], streamer_socket)
+            stats_recorder.record_frame(messages, num_bytes_sent, send_start_time, time.time(), queue_size)
+            if self.spool is not None:
+                sent_message_ids.extend(message.message_id for message in messages)
+
+        if sent_message_ids:
+            # Confirm the messages sent since the last control message before stopping.
+            heatbeat_message["timestamp"] = time.time()
+            try:
+                if self._send_control_message(heatbeat_message, streamer_socket):
+                    self.spool.confirm(sent_message_ids)
+            except Exception:
+                logging.debug(f"Failed to confirm {len(sent_message_ids)} spooled messages, keeping them for replay")
+
+    def _get_next_fetch_interval(self, fetch_interval_sec: float, num_received: int) -> float:
+        """Polls fast while data is flowing and backs off exponentially while idle."""
+        self.stats["num_fetches"] += 1
+        if num_received > 0:
+            fetch_interval_sec = self.fetch_time_sec
+        else:
+            self.stats["num_empty_fetches"] += 1
+            fetch_interval_sec = min(fetch_interval_sec * 2, self.max_fetch_time_sec)
+        self.stats["fetch_interval_sec"] = fetch_interval_sec
+        return fetch_interval_sec
+
+    def _start_readers(self) -> None:
+        """Asks the server to push data and starts a reader thread for each socket."""
+        message = {_HEADER_KEY: _CTRL_MSG_HEADER, "topic_id": "ctl_msg/subscribe_push", "data": {}, "timestamp": time.time()}
+        for worker_id, streamer_socket in enumerate(self.streamer_sockets):
+            if not self._send_control_message(message, streamer_socket):
+                raise ValueError(f"Failed to enable push mode for socket {worker_id}")
+            self.reader_threads[worker_id] = threading.Thread(target=self._reader, args=(worker_id, streamer_socket))
+            self.reader_threads[worker_id].start()
+
+    def _reader(self, worker_id: int, streamer_socket) -> None:
+        """Continuously reads pushed data and control responses from a socket in push mode."""
+        logging.debug(f"Starting reader {worker_id}")
+        try:
+            while self._run_worker_loop and self._receive_control_response(streamer_socket) >= 0:
+                pass
+        except Exception:
+            if self._run_worker_loop:
+                logging.exception(f"Reader {worker_id} failed, closing socket!")
+                self._safely_stop_streams()
+
+    def _reconnect(self, worker_id: int, streamer_socket) -> Any:
+        """Reconnects a worker's socket with exponential backoff and rewinds the spool for replay.
+
+        Returns the new socket, or None if the stream was stopped first.
+        """
+        try:
+            streamer_socket.close()
+        except Exception:
+            logging.debug("Failed to cleanly close socket")
+        # The new socket negotiates its own codec, so the dead socket's codec would only leak.
+        self.frame_codecs.pop(streamer_socket, None)
+        api_endpoint = self._get_endpoint(self.streamer_endpoint, self.streamer_channel, self.stream_uid)
+        backoff_sec = self.initial_reconnect_backoff_sec
+        while self._run_worker_loop:
+            try:
+                new_socket = self._connect(api_endpoint)
+                self.streamer_sockets[worker_id] = new_socket
+                num_replayed_messages = self.spool.rewind()
+                self.stats["num_reconnects"] += 1
+                logging.info(f"Worker {worker_id} reconnected, replaying {num_replayed_messages} messages")
+                return new_socket
+            except Exception as exception:
+                logging.warning(f"Worker {worker_id} failed to reconnect: {exception}")
+            self._stop_event.wait(backoff_sec)
+            backoff_sec = min(backoff_sec * 2, self.max_reconnect_backoff_sec)
+        return None
+
+    def _get_worker_queue(self, worker_id: int) -> Any:
+        """Returns the queue a worker sends from: its own shard, or the shared spool in spool mode."""
+        if self.spool is not None:
+            return self.spool
+        return self.outgoing_message_queue.get_shard(worker_id)
+
+    def _collect_batch(self, first_message: OutgoingMessage, outgoing_message_queue) -> list[OutgoingMessage]:
+        """Drains queued data messages into a batch until a size limit or the linger time is reached."""
+        messages = [first_message]
+        num_messages = first_message.num_messages
+        num_bytes = self._get_batch_item_size(first_message)
+        linger_deadline = time.time() + self.batch_linger_sec
+        while num_messages < self.max_batch_size and num_bytes < self.max_batch_bytes:
+            next_messages = outgoing_message_queue.get_batch(1, timeout=max(linger_deadline - time.time(), 0.0))
+            if not next_messages:
+                break
+            message = next_messages[0]
+            messages.append(message)
+            num_messages += message.num_messages
+            num_bytes += self._get_batch_item_size(message)
+        return messages
+
+    def _get_batch_item_size(self, message: OutgoingMessage) -> int:
+        if self.wire_format == WIRE_FORMAT_BINARY:
+            return estimate_size(message.data)
+        return len(self._encode_batch_item(message))
+
+    def _encode_batch_item(self, message: OutgoingMessage) -> bytes:
+        """Encodes a data message without its header, caching the result on the message.
+
+        The stream_uid is only included if it differs from the one the batch frame carries.
+        """
+        if message.encoded is None:
+            message.encoded = json.dumps(self._get_batch_item(message)).encode()
+        return message.encoded
+
+    def _get_batch_item(self, message: OutgoingMessage) -> dict:
+        batch_item = {
+            "topic_id": message.topic_id,
+            "data": message.data,
+            "timestamp": message.timestamp,
+            "message_id": message.message_id,
+        }
+        if message.stream_uid != self.stream_uid:
+            batch_item["stream_uid"] = message.stream_uid
+        return batch_item
+
+    def _get_batch_items(self, message: OutgoingMessage) -> list[dict]:
+        """Returns the batch items of a message, or of each row of a send_batch() chunk."""
+        if not message.is_chunk:
+            return [self._get_batch_item(message)]
+        batch_items = [
+            {"topic_id": message.topic_id, "data": data, "timestamp": timestamp, "message_id": message_id}
+            for data, timestamp, message_id in zip(message.data, message.timestamp, message.message_id)
+        ]
+        if message.stream_uid != self.stream_uid:
+            for batch_item in batch_items:
+                batch_item["stream_uid"] = message.stream_uid
+        return batch_items
+
+    def _encode_spool_record(self, message: OutgoingMessage) -> bytes:
+        if self.wire_format == WIRE_FORMAT_BINARY:
+            return encode_message(self._get_batch_item(message))
+        return self._encode_batch_item(message)
+
+    def _decode_spool_record(self, payload: bytes) -> OutgoingMessage:
+        if is_binary_frame(payload):
+            batch_item, encoded = decode_message(payload), None
+        else:
+            # Keep the JSON encoding so it isn't encoded again when sent as part of a batch.
+            batch_item, encoded = json.loads(payload), payload
+        # The enqueue time is restored from the spool record.
+        return OutgoingMessage(
+            batch_item["topic_id"],
+            batch_item["data"],
+            batch_item["timestamp"],
+            batch_item["message_id"],
+            batch_item.get("stream_uid", self.stream_uid),
+            0.0,
+            encoded)
 
     def _handshake(self) -> bool:
+        """Connects and handshakes all worker sockets concurrently."""
         api_endpoint = self._get_endpoint(self.streamer_endpoint, self.streamer_channel, self.stream_uid)
         logging.info(f"Connecting to {api_endpoint}")
-        for worker_id in range(self.num_workers):
-            self.streamer_sockets.append(create_connection(api_endpoint))
-        if self.post_connect_timeout_sec > 0:
-            time.sleep(self.post_connect_timeout_sec)
-        # Send and receive a control message to validate the connection.
-        message = {_HEADER_KEY: _CTRL_MSG_HEADER, "topic_id": "ctl_msg/handshake", "data": {}, "timestamp": time.time()}
-        for worker_id, streamer_socket in enumerate(self.streamer_sockets):
-            if not self._send_control_message(message, streamer_socket):
-                raise ValueError(f"Failed to handshake for socket {worker_id}")
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            futures = [executor.submit(self._connect, api_endpoint) for _ in range(self.num_workers)]
+        failed_worker_ids = []
+        for worker_id, future in enumerate(futures):
+            if future.exception() is None:
+                self.streamer_sockets.append(future.result())
+            else:
+                logging.warning(f"Failed to connect socket {worker_id}: {future.exception()}")
+                failed_worker_ids.append(worker_id)
+        if failed_worker_ids:
+            for streamer_socket in self.streamer_sockets:
+                streamer_socket.close()
+            self.streamer_sockets = []
+            raise ValueError(f"Failed to handshake for sockets {failed_worker_ids}")
         return True
 
+    def _connect(self, api_endpoint: str) -> Any:
+        """Opens a socket and waits up to connect_timeout_sec for the server to answer a handshake."""
+        streamer_socket = create_connection(api_endpoint, timeout=self.connect_timeout_sec)
+        try:
+            handshake_data = {}
+            if self.frame_compression != FRAME_COMPRESSION_NONE:
+                handshake_data["frame_compression"] = self.frame_compression
+            message = {_HEADER_KEY: _CTRL_MSG_HEADER, "topic_id": "ctl_msg/handshake", "data": handshake_data, "timestamp": time.time()}
+            assert self._send_data(message, streamer_socket) > 0
+            response_bytes = streamer_socket.recv()
+            if not response_bytes:
+                raise ValueError("The socket was closed during the handshake")
+            response = decode_message(response_bytes) if is_binary_frame(response_bytes) else json.loads(response_bytes)
+            response_data = response.get("data", {})
+        except Exception:
+            streamer_socket.close()
+            raise
+        if handshake_data and response_data.get("frame_compression") == self.frame_compression:
+            self.frame_codecs[streamer_socket] = FrameCodec(self.compression_level, self.compression_min_size_bytes)
+        elif handshake_data:
+            logging.info(f"The server doesn't support {self.frame_compression} frame compression, sending uncompressed frames")
+        # The socket is ready, so the workers can block on it indefinitely.
+        streamer_socket.settimeout(None)
+        return streamer_socket
+
     def _send_control_message(self, message: dict, streamer_socket) -> bool:
         assert message[_HEADER_KEY] == _CTRL_MSG_HEADER
         # Send the control message.
         assert self._send_data(message, streamer_socket) > 0
         # Get the control response.
+        return self._receive_control_response(streamer_socket) >= 0
+
+    def _receive_control_response(self, streamer_socket) -> int:
+        """Receives a response and queues any data it holds. Returns the number of items received or -1 if the socket closed."""
         response_bytes = streamer_socket.recv()
         if not response_bytes:
-            return False
-        response = json.loads(response_bytes)
+            return -1
+        frame_codec = self.frame_codecs.get(streamer_socket)
+        if frame_codec is not None:
+            response_bytes = frame_codec.decode(response_bytes)
+        response = decode_message(response_bytes) if is_binary_frame(response_bytes) else json.loads(response_bytes)
         if "topic_id" in response:
             if response["topic_id"].startswith("ctl_msg/"):
                 logging.debug(f"Got control message: {response['topic_id']}")
-            else:
-                self.incoming_message_queue.put((response["topic_id"], response["data"]))
-        elif "messages" in response:
+                return 0
+            self._queue_message(response["topic_id"], response["data"])
+            return 1
+        if "messages" in response:
             for message in response["messages"]:
-                self.incoming_message_queue.put((message["topic_id"], message["message"]))
-        elif "sensor_data" in response:
+                self._queue_message(message["topic_id"], message["message"])
+            return len(response["messages"])
+        if "sensor_data" in response:
             for event in response["sensor_data"]:
-                self.incoming_data_queue.put((event["sensor_name"], event["topic_id"], event["data"]))
-        return True
+                self._queue_sensor_data(event)
+            return len(response["sensor_data"])
+        return 0
+
+    def _queue_sensor_data(self, event: dict) -> None:
+        sensor_name, topic_id, data = event["sensor_name"], event["topic_id"], event["data"]
+        is_stored = self.window_store is not None and self.window_store.add(sensor_name, topic_id, data, event.get("timestamp", -1.0))
+        is_handled = self.dispatcher is not None and self.dispatcher.dispatch(sensor_name, topic_id, data)
+        # Data that is neither stored nor handled is left for get_data().
+        if not is_stored and not is_handled:
+            self.incoming_data_queue.put((sensor_name, topic_id, data))
+
+    def _queue_message(self, topic_id: str, message: Any) -> None:
+        # Messages are dispatched with an empty sensor name, and left for get_messages() if no handler matches.
+        if self.dispatcher is None or not self.dispatcher.dispatch("", topic_id, message):
+            self.incoming_message_queue.put((topic_id, message))
 
-    def _send_data_message(self, message: dict, streamer_socket) -> bool:
+    def _send_data_message(self, message: OutgoingMessage, streamer_socket) -> int:
         """Sends a data message to the server, does not wait for a response."""
-        assert message[_HEADER_KEY] == _DATA_MSG_HEADER
-        start_time = time.time()
-        num_bytes_sent = self._send_data(message, streamer_socket)
+        num_bytes_sent = self._send_data(message.to_wire_message(), streamer_socket)
         assert num_bytes_sent > 0, f"Failed to send message!"
-        end_time = time.time()
-        latency = end_time - start_time
-        topic_id = message["topic_id"]
-        logging.debug(f"Sent topic_id: {topic_id} payload size: {num_bytes_sent} bytes latency: {latency}")
-        self.outgoing_message_latency_total += latency
-        self.outgoing_message_count += 1
-        return True
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"Sent topic_id: {message.topic_id} payload size: {num_bytes_sent} bytes")
+        return num_bytes_sent
+
+    def _send_data_batch(self, messages: list[OutgoingMessage], streamer_socket) -> int:
+        """Sends a batch of data messages as a single frame, does not wait for a response."""
+        if self.wire_format == WIRE_FORMAT_BINARY:
+            return self._send_binary_data_batch(messages, streamer_socket)
+        # The frame is assembled from the already encoded messages to avoid encoding them twice.
+        header = json.dumps({_HEADER_KEY: _DATA_BATCH_HEADER, "stream_uid": self.stream_uid})[:-1].encode()
+        message_bytes = b"".join([header, b', "messages": [', b", ".join(
+            [self._encode_batch_item(message) for message in messages]), b"]}"])
+        num_bytes_sent = self._send_frame(message_bytes, streamer_socket)
+        logging.debug(f"Sent batch of {len(messages)} messages payload size: {num_bytes_sent} bytes")
+        return num_bytes_sent
+
+    def _send_binary_data_batch(self, messages: list[OutgoingMessage], streamer_socket) -> int:
+        batch_message = {
+            _HEADER_KEY: _DATA_BATCH_HEADER,
+            "stream_uid": self.stream_uid,
+            "messages": [batch_item for message in messages for batch_item in self._get_batch_items(message)],
+        }
+        num_bytes_sent = self._send_data(batch_message, streamer_socket)
+        logging.debug(f"Sent batch of {len(messages)} messages payload size: {num_bytes_sent} bytes")
+        return num_bytes_sent
 
     def _send_data(self, message: dict, streamer_socket) -> int:
-        message_bytes = json.dumps(message).encode()
+        if self.wire_format == WIRE_FORMAT_BINARY and message[_HEADER_KEY] != _CTRL_MSG_HEADER:
+            message_bytes = encode_message(message)
+        else:
+            message_bytes = json.dumps(message).encode()
+        return self._send_frame(message_bytes, streamer_socket)
+
+    def _send_frame(self, message_bytes: bytes, streamer_socket) -> int:
+        """Sends a frame, compressed if the socket negotiated compression. Returns the bytes on the wire."""
+        frame_codec = self.frame_codecs.get(streamer_socket)
+        if frame_codec is not None:
+            message_bytes = frame_codec.encode(message_bytes)
         streamer_socket.send_binary(message_bytes)
-        num_bytes_sent = len(message_bytes)
-        return num_bytes_sent
\ No newline at end of file
+        return len(message_bytes)
\ No newline at end of file
@@ -0,0 +1,304 @@
+from typing import Any, Callable, Iterable, Optional
+import logging
+import os
+from pathlib import Path
+import struct
+import threading
+import time
+
+_SEGMENT_FILE_EXT = ".seg"
+_CHECKPOINT_FILENAME = "confirmed.ckpt"
+# Each record is prefixed by its payload length, message_id and enqueue time.
+_RECORD_HEADER_FORMAT = "<IQd"
+_RECORD_HEADER_SIZE = struct.calcsize(_RECORD_HEADER_FORMAT)
+
+
+class _SpoolSegment:
+    """A single append-only segment file of the spool."""
+
+    def __init__(self, filename: Path, first_message_id: int) -> None:
+        self.filename = filename
+        self.first_message_id = first_message_id
+        self.last_message_id = first_message_id - 1
+        self.size = 0
+
+
+class MessageSpool:
+    """A segmented on-disk write-ahead log of outgoing sensor messages.
+
+    Messages are appended to segment files of up to segment_size_bytes under spool_dir, each named by
+    the first message_id it holds. Consumers read messages in message_id order with get/get_batch and
+    confirm them once the server has received them; segments that only hold confirmed messages are
+    deleted. rewind() moves the read position back to the first unconfirmed message so it can be
+    replayed after a reconnect. Once the spool exceeds max_disk_bytes its oldest segment is dropped.
+
+    Messages are records with message_id and enqueue_time attributes (see OutgoingMessage) that are
+    stored with encode_fn and restored with decode_fn; the enqueue_time is kept in the record header.
+    The spool has the same put/get/get_batch/join/close interface as EventBuffer so it can be used as
+    the outgoing queue of a SocketManager. Records are flushed to the OS on every put and fsynced when a
+    segment is completed or the spool is flushed. Flushing also checkpoints the confirmed position, and
+    unconfirmed messages left on disk are replayed by the next spool opened on the same directory.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str,
+        encode_fn: Callable[[Any], bytes],
+        decode_fn: Callable[[bytes], Any],
+        segment_size_bytes: int = 16 * 1024 * 1024,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+        ) -> None:
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.encode_fn = encode_fn
+        self.decode_fn = decode_fn
+        self.segment_size_bytes = segment_size_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.closed = False
+        self.segments = self._load_segments()
+        self.next_message_id = self.segments[-1].last_message_id + 1 if self.segments else 0
+        # All messages up to confirmed_message_id have been received by the server.
+        self.confirmed_message_id = self.segments[0].first_message_id - 1 if self.segments else -1
+        if self.segments:
+            self.confirmed_message_id = max(self.confirmed_message_id, self._load_checkpoint())
+        self.confirmed_ahead = set()
+        self.read_message_id = self.confirmed_message_id + 1
+        self.read_segment_index = 0
+        self.read_handle = None
+        self.write_handle = None
+        self.num_dropped_messages = 0
+        self.num_replayed_messages = 0
+        self.num_messages_put = 0
+
+    def __len__(self) -> int:
+        """Returns the number of messages that haven't been read yet."""
+        with self.lock:
+            return self.next_message_id - self.read_message_id
+
+    def put(self, message: Any, timeout: Optional[float] = None) -> bool:
+        """Appends a message. Its message_id must be next_message_id, so confirmed ids never have gaps.
+
+        next_message_id only advances once a message is appended, so a message that fails to encode
+        doesn't use up its id.
+        """
+        payload = self.encode_fn(message)
+        with self.lock:
+            assert message.message_id == self.next_message_id, "Messages must be spooled in message_id order"
+            self._append_record(message.message_id, message.enqueue_time, payload)
+            self.not_empty.notify()
+        return True
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Returns the next unread message, waiting up to timeout seconds. Raises TimeoutError if none arrive."""
+        messages = self.get_batch(1, timeout)
+        if not messages:
+            raise TimeoutError("No messages available")
+        return messages[0]
+
+    def get_batch(self, max_events: int = -1, timeout: Optional[float] = 0.0) -> list:
+        """Reads up to max_events unread messages in message_id order."""
+        with self.lock:
+            if self.read_message_id >= self.next_message_id and timeout != 0.0:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self.read_message_id >= self.next_message_id and not self.closed:
+                    remaining_time = None if deadline is None else deadline - time.monotonic()
+                    if remaining_time is not None and remaining_time <= 0:
+                        break
+                    self.not_empty.wait(remaining_time)
+            messages = []
+            while self.read_message_id < self.next_message_id and (max_events <= 0 or len(messages) < max_events):
+                message = self._read_record()
+                if message is not None:
+                    messages.append(message)
+            if messages:
+                self.not_full.notify_all()
+            return messages
+
+    def confirm(self, message_ids: Iterable[int]) -> None:
+        """Marks messages as received by the server and deletes fully confirmed segments."""
+        with self.lock:
+            self.confirmed_ahead.update(message_ids)
+            while self.confirmed_message_id + 1 in self.confirmed_ahead:
+                self.confirmed_message_id += 1
+                self.confirmed_ahead.remove(self.confirmed_message_id)
+            while self.segments and self.segments[0].last_message_id <= self.confirmed_message_id:
+                if len(self.segments) == 1 and self.write_handle is not None:
+                    # The segment being written is fully confirmed, the next message starts a new one.
+                    self.write_handle.close()
+                    self.write_handle = None
+                self._delete_oldest_segment()
+
+    def rewind(self) -> int:
+        """Moves the read position back to the first unconfirmed message. Returns the number of messages to replay."""
+        with self.lock:
+            self.confirmed_ahead = set()
+            num_replayed_messages = self.read_message_id - (self.confirmed_message_id + 1)
+            self.num_replayed_messages += num_replayed_messages
+            self._seek(self.confirmed_message_id + 1)
+            self.not_empty.notify_all()
+            return num_replayed_messages
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits up to timeout seconds for all messages to be read. Returns true if none are left."""
+        with self.lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.read_message_id < self.next_message_id and not self.closed:
+                remaining_time = None if deadline is None else deadline - time.monotonic()
+                if remaining_time is not None and remaining_time <= 0:
+                    break
+                self.not_full.wait(remaining_time)
+            return self.read_message_id >= self.next_message_id
+
+    def close(self) -> None:
+        """Wakes up any blocked consumers; spooled messages are kept on disk."""
+        with self.lock:
+            self.closed = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+    def reopen(self) -> None:
+        """Reopens a closed spool so it can be reused."""
+        with self.lock:
+            self.closed = False
+
+    def flush(self) -> None:
+        """Flushes and fsyncs the segment being written and checkpoints the confirmed position."""
+        with self.lock:
+            if self.write_handle is not None:
+                self.write_handle.flush()
+                os.fsync(self.write_handle.fileno())
+            checkpoint_filename = self.spool_dir / _CHECKPOINT_FILENAME
+            temp_filename = checkpoint_filename.with_suffix(".tmp")
+            temp_filename.write_text(str(self.confirmed_message_id))
+            os.replace(temp_filename, checkpoint_filename)
+
+    def get_depth(self) -> int:
+        """Returns the number of spooled messages not confirmed yet."""
+        with self.lock:
+            return self.next_message_id - self.confirmed_message_id - 1
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "queue_size": self.next_message_id - self.read_message_id,
+                "num_events_put": self.num_messages_put,
+                "num_dropped_events": self.num_dropped_messages,
+                "num_dropped_events_per_key": {},
+                "spool_depth": self.next_message_id - self.confirmed_message_id - 1,
+                "spool_bytes": sum(segment.size for segment in self.segments),
+                "spool_num_segments": len(self.segments),
+                "num_replayed_messages": self.num_replayed_messages,
+            }
+
+    def _load_segments(self) -> list[_SpoolSegment]:
+        segments = []
+        for filename in sorted(self.spool_dir.glob(f"*{_SEGMENT_FILE_EXT}")):
+            segment = _SpoolSegment(filename, int(filename.stem))
+            # Scan the record headers, truncating any partially written record at the end.
+            with open(filename, "rb+") as file_handle:
+                while True:
+                    header = file_handle.read(_RECORD_HEADER_SIZE)
+                    if len(header) < _RECORD_HEADER_SIZE:
+                        break
+                    payload_length, message_id, _ = struct.unpack(_RECORD_HEADER_FORMAT, header)
+                    if len(file_handle.read(payload_length)) < payload_length:
+                        break
+                    segment.last_message_id = message_id
+                    segment.size += _RECORD_HEADER_SIZE + payload_length
+                file_handle.truncate(segment.size)
+            if segment.size == 0:
+                filename.unlink()
+                continue
+            segments.append(segment)
+        if segments:
+            logging.info(f"Loaded {len(segments)} spool segments from {self.spool_dir}")
+        return segments
+
+    def _load_checkpoint(self) -> int:
+        try:
+            return int((self.spool_dir / _CHECKPOINT_FILENAME).read_text())
+        except (OSError, ValueError):
+            return -1
+
+    def _append_record(self, message_id: int, enqueue_time: float, payload: bytes) -> None:
+        # Must be called with the lock held.
+        record_size = _RECORD_HEADER_SIZE + len(payload)
+        if not self.segments or self.write_handle is None or self.segments[-1].size + record_size > self.segment_size_bytes:
+            self._start_segment(message_id)
+        while sum(segment.size for segment in self.segments) + record_size > self.max_disk_bytes and len(self.segments) > 1:
+            self._drop_oldest_segment()
+        self.write_handle.write(struct.pack(_RECORD_HEADER_FORMAT, len(payload), message_id, enqueue_time))
+        self.write_handle.write(payload)
+        self.write_handle.flush()
+        segment = self.segments[-1]
+        segment.last_message_id = message_id
+        segment.size += record_size
+        self.next_message_id = message_id + 1
+        self.num_messages_put += 1
+
+    def _start_segment(self, first_message_id: int) -> None:
+        # Must be called with the lock held.
+        if self.write_handle is not None:
+            self.write_handle.flush()
+            os.fsync(self.write_handle.fileno())
+            self.write_handle.close()
+        segment = _SpoolSegment(self.spool_dir / f"{first_message_id:020d}{_SEGMENT_FILE_EXT}", first_message_id)
+        self.segments.append(segment)
+        self.write_handle = open(segment.filename, "ab")
+
+    def _drop_oldest_segment(self) -> None:
+        # Must be called with the lock held. Drops unconfirmed messages to stay under the disk cap.
+        segment = self.segments[0]
+        num_dropped_messages = segment.last_message_id - max(segment.first_message_id - 1, self.confirmed_message_id)
+        self.num_dropped_messages += max(num_dropped_messages, 0)
+        logging.warning(f"Spool is over {self.max_disk_bytes} bytes, dropped {num_dropped_messages} messages")
+        self.confirmed_message_id = max(self.confirmed_message_id, segment.last_message_id)
+        self.confirmed_ahead = {message_id for message_id in self.confirmed_ahead if message_id > self.confirmed_message_id}
+        self._delete_oldest_segment()
+        if self.read_message_id <= self.confirmed_message_id:
+            self._seek(self.confirmed_message_id + 1)
+
+    def _delete_oldest_segment(self) -> None:
+        # Must be called with the lock held.
+        segment = self.segments.pop(0)
+        if self.read_segment_index > 0:
+            self.read_segment_index -= 1
+        elif self.read_handle is not None:
+            self.read_handle.close()
+            self.read_handle = None
+        segment.filename.unlink(missing_ok=True)
+
+    def _seek(self, message_id: int) -> None:
+        # Must be called with the lock held. The next record read is the first with an id >= message_id.
+        if self.read_handle is not None:
+            self.read_handle.close()
+            self.read_handle = None
+        self.read_segment_index = 0
+        self.read_message_id = message_id
+        while self.read_segment_index < len(self.segments) - 1 and \
+                self.segments[self.read_segment_index].last_message_id < message_id:
+            self.read_segment_index += 1
+
+    def _read_record(self) -> Optional[dict]:
+        # Must be called with the lock held. Returns None for records skipped before the read position.
+        if self.read_handle is None:
+            self.read_handle = open(self.segments[self.read_segment_index].filename, "rb")
+        header = self.read_handle.read(_RECORD_HEADER_SIZE)
+        if len(header) < _RECORD_HEADER_SIZE:
+            # The end of this segment, move on to the next one.
+            self.read_handle.close()
+            self.read_handle = None
+            self.read_segment_index += 1
+            return None
+        payload_length, message_id, enqueue_time = struct.unpack(_RECORD_HEADER_FORMAT, header)
+        if message_id < self.read_message_id:
+            self.read_handle.seek(payload_length, os.SEEK_CUR)
+            return None
+        payload = self.read_handle.read(payload_length)
+        self.read_message_id = message_id + 1
+        message = self.decode_fn(payload)
+        message.enqueue_time = enqueue_time
+        return message
@@ -1,24 +1,252 @@
-from typing import Callable
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional, Tuple
+import asyncio
+import gzip
 import json
 import logging
-from queue import Queue
+import re
 import threading
 import time
 import ast
+from collections import deque
+from collections.abc import Mapping
 
 import httpx
 from httpx_sse import connect_sse
 
+from archetypeai._capture import CAPTURE_INDEX_FILE_EXT, EventCaptureWriter, load_capture_index
+from archetypeai._event_buffer import EventBuffer, OVERFLOW_BLOCK
+
+_HEARTBEAT_EVENT_TYPE = "sse.stream.heartbeat"
+_END_EVENT_TYPE = "sse.stream.end"
+_POLL_TIMEOUT_SEC = 0.1
+_MAX_TRACKED_EVENT_IDS = 4096
+# Matches payloads whose first key is the event type, e.g. {"type": "inference.result", ...}.
+_TYPE_PREFIX_PATTERN = re.compile(r'\s*\{\s*"type"\s*:\s*"([^"\\]*)"')
+
+
+def is_heartbeat_event(event: Mapping) -> bool:
+    return isinstance(event, Mapping) and event.get("type", None) == _HEARTBEAT_EVENT_TYPE
+
+
+def sniff_event_type(data: str) -> Optional[str]:
+    """Returns the event type without decoding the payload, or None if the type is not the first key."""
+    match = _TYPE_PREFIX_PATTERN.match(data)
+    return match.group(1) if match else None
+
+
+class LazyEvent(Mapping):
+    """A read-only event whose JSON payload is only decoded once a field other than type is read."""
+
+    __slots__ = ("raw_data", "event_type", "_event_data")
+
+    def __init__(self, raw_data: str, event_type: str) -> None:
+        self.raw_data = raw_data
+        self.event_type = event_type
+        self._event_data = None
+
+    def __getitem__(self, key: str):
+        if key == "type":
+            return self.event_type
+        return self.to_dict()[key]
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def __repr__(self) -> str:
+        return f"LazyEvent(type={self.event_type!r}, decoded={self._event_data is not None})"
+
+    def to_dict(self) -> dict:
+        """Decodes (once) and returns the full event."""
+        if self._event_data is None:
+            self._event_data = json.loads(self.raw_data)
+        return self._event_data
+
+
+class SseEventFilter:
+    """Selects and decodes SSE event payloads.
+
+    If event_types is set, only events of those types are kept; fields limits each kept event to the
+    given top-level keys (the type is always kept). The event type is sniffed from the start of the
+    raw payload, so unwanted events and heartbeats are dropped without a JSON decode whenever the
+    server sends the type as the first key. With lazy_decode, kept events are returned as LazyEvent
+    and the decode cost moves to the consumer, which only pays it for the events it inspects.
+    """
+
+    def __init__(
+        self,
+        event_types: Optional[Iterable[str]] = None,
+        fields: Optional[Iterable[str]] = None,
+        lazy_decode: bool = False,
+        forward_heartbeats: bool = False,
+        ) -> None:
+        self.event_types = set(event_types) if event_types is not None else None
+        self.fields = ["type", *fields] if fields is not None else None
+        self.lazy_decode = lazy_decode
+        self.forward_heartbeats = forward_heartbeats
+
+    def is_wanted(self, event_type: str) -> bool:
+        if event_type == _HEARTBEAT_EVENT_TYPE:
+            return self.forward_heartbeats
+        return self.event_types is None or event_type in self.event_types
+
+    def decode(self, data: str) -> Tuple[str, Optional[Mapping]]:
+        """Returns the event type and the decoded event, or None for the event if it is filtered out."""
+        event_type = sniff_event_type(data)
+        if event_type is not None:
+            if not self.is_wanted(event_type):
+                return event_type, None
+            if self.lazy_decode and self.fields is None:
+                return event_type, LazyEvent(data, event_type)
+        event_data = json.loads(data)
+        event_type = event_data.get("type", "")
+        if not self.is_wanted(event_type):
+            return event_type, None
+        if self.fields is not None:
+            event_data = {key: event_data[key] for key in self.fields if key in event_data}
+        return event_type, event_data
+
+
+class SseResumeState:
+    """Tracks event ids and reconnect metrics so an SSE stream can be resumed after a disconnect."""
+
+    def __init__(self) -> None:
+        self.last_event_id = ""
+        self.previous_event_id = ""
+        self.seen_event_ids = set()
+        self.seen_event_id_order = deque()
+        self.disconnect_time = None
+        self.stats = {
+            "num_reconnects": 0,
+            "num_duplicate_events": 0,
+            "last_gap_sec": 0.0,
+            "max_gap_sec": 0.0,
+            "total_gap_sec": 0.0,
+        }
+
+    def get_headers(self, header: dict) -> dict:
+        """Returns the request headers, including the Last-Event-ID when resuming a stream."""
+        headers = {**header, "Accept": "text/event-stream"}
+        if self.last_event_id:
+            headers["Last-Event-ID"] = self.last_event_id
+        return headers
+
+    def on_connected(self) -> None:
+        self.previous_event_id = ""
+        if self.disconnect_time is None:
+            return
+        gap_sec = time.time() - self.disconnect_time
+        self.disconnect_time = None
+        self.stats["num_reconnects"] += 1
+        self.stats["last_gap_sec"] = gap_sec
+        self.stats["max_gap_sec"] = max(gap_sec, self.stats["max_gap_sec"])
+        self.stats["total_gap_sec"] += gap_sec
+
+    def on_disconnected(self) -> None:
+        if self.disconnect_time is None:
+            self.disconnect_time = time.time()
+
+    def is_new_event(self, event_id: str) -> bool:
+        """Records the event id, returns false if the event is a replay of one already seen."""
+        # Events without an id field inherit the previous id, so only new ids are checked.
+        if not event_id or event_id == self.previous_event_id:
+            return True
+        self.previous_event_id = event_id
+        if event_id in self.seen_event_ids:
+            self.stats["num_duplicate_events"] += 1
+            return False
+        self.last_event_id = event_id
+        self.seen_event_ids.add(event_id)
+        self.seen_event_id_order.append(event_id)
+        if len(self.seen_event_id_order) > _MAX_TRACKED_EVENT_IDS:
+            self.seen_event_ids.discard(self.seen_event_id_order.popleft())
+        return True
+
+
+class SseReconnectBackoff:
+    """Capped exponential reconnect backoff for SSE streams, limited by the total outage time.
+
+    An outage starts at the first disconnect after events were last received, and a failed connection
+    gives up once the outage has lasted max_outage_sec (forever if negative). Receiving events ends
+    the outage and resets the backoff, so a long lived stream survives any number of separate drops.
+    """
+
+    def __init__(self, initial_backoff_sec: float, max_backoff_sec: float, max_outage_sec: float) -> None:
+        self.initial_backoff_sec = initial_backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.max_outage_sec = max_outage_sec
+        self.backoff_sec = initial_backoff_sec
+        self.outage_start_time = None
+
+    def on_events_received(self) -> None:
+        self.backoff_sec = self.initial_backoff_sec
+        self.outage_start_time = None
+
+    def get_backoff(self, failed: bool) -> Optional[float]:
+        """Returns the time to wait before reconnecting, or None if a failed connection should give up."""
+        current_time = time.monotonic()
+        if self.outage_start_time is None:
+            self.outage_start_time = current_time
+        elif failed and 0.0 <= self.max_outage_sec <= current_time - self.outage_start_time:
+            return None
+        backoff_sec = self.backoff_sec
+        self.backoff_sec = min(backoff_sec * 2, self.max_backoff_sec)
+        return backoff_sec
+
 
 class ServerSideEventsReader:
-    """Manages a threaded SSE reader."""
+    """Manages a threaded SSE reader.
+
+    Events are buffered in a bounded queue of max_queue_size events. When the consumer falls behind,
+    the overflow_policy decides whether the socket reader blocks (block), the oldest event is dropped
+    (drop_oldest) or queued heartbeats are dropped first (drop_heartbeats).
+
+    If the connection drops, the reader reconnects with a capped exponential backoff starting at
+    initial_backoff_sec and resumes the stream by sending the id of the last received event in the
+    Last-Event-ID header. Any events the server replays are deduplicated by their event id. The
+    reader only stops retrying once it has failed to get events for max_outage_sec (see
+    SseReconnectBackoff).
+
+    Heartbeats are consumed by the reader and only queued if forward_heartbeats is set. Use
+    event_types, fields and lazy_decode to skip decoding events the consumer doesn't need, see
+    SseEventFilter.
 
-    def __init__(self, session_endpoint: str, header: dict, max_read_time_sec: float = -1.0, max_retries: int = 3):
+    Set capture_filename to tee every received event into a capture file that can be played back
+    offline with CaptureReplayReader.
+    """
+
+    def __init__(
+        self,
+        session_endpoint: str,
+        header: dict,
+        max_read_time_sec: float = -1.0,
+        max_outage_sec: float = 30.0,
+        max_queue_size: int = 1024,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        initial_backoff_sec: float = 0.02,
+        max_backoff_sec: float = 2.0,
+        event_types: Optional[Iterable[str]] = None,
+        fields: Optional[Iterable[str]] = None,
+        lazy_decode: bool = False,
+        forward_heartbeats: bool = False,
+        capture_filename: Optional[str] = None,
+        ):
         self.max_read_time_sec = max_read_time_sec
-        self.max_retries = max_retries
+        self.max_outage_sec = max_outage_sec
+        self.initial_backoff_sec = initial_backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.reconnect_backoff = SseReconnectBackoff(initial_backoff_sec, max_backoff_sec, max_outage_sec)
         self.heartbeat_sec = 30
-        self.continue_worker_loop = False
-        self.read_event_queue = Queue()
+        self.resume_state = SseResumeState()
+        self.event_filter = SseEventFilter(event_types, fields, lazy_decode, forward_heartbeats)
+        self.last_heartbeat_time = 0.0
+        self.stats = {"num_heartbeats": 0, "num_filtered_events": 0}
+        self.capture_writer = EventCaptureWriter(capture_filename) if capture_filename else None
+        self.stop_event = threading.Event()
+        self.read_event_queue = EventBuffer(max_queue_size, overflow_policy, is_heartbeat=is_heartbeat_event)
+        self.continue_worker_loop = True
         self.worker = threading.Thread(
             target=self._worker, args=(session_endpoint, header))
         self.worker.start()
@@ -26,89 +254,118 @@ class ServerSideEventsReader:
     def __del__(self):
         self.close()
 
+    def __aiter__(self) -> AsyncIterator[dict]:
+        return self.aread()
+
     def close(self) -> bool:
         """Stops and closes an active reader."""
         worker_stopped = False
         self.continue_worker_loop = False
-        if self.worker is not None:
-            self.continue_worker_loop = False
-            self.worker.join()
+        self.stop_event.set()
+        # Wake up the worker in case it is blocked on a full queue.
+        self.read_event_queue.close()
+        worker = self.worker
+        if worker is not None:
+            if worker is not threading.current_thread():
+                worker.join()
             self.worker = None
             worker_stopped = True
         return worker_stopped
 
+    def is_running(self) -> bool:
+        """Returns true while the background worker is reading from the stream."""
+        return self.continue_worker_loop
+
     def read(self, max_num_events: int = -1, block: bool = False):
-        """Reads any queued events."""
+        """Reads any queued events.
+
+        In non-blocking mode only the events already queued are returned. In blocking mode events are
+        yielded as they arrive until the stream ends or max_num_events have been read.
+        """
         num_events_read = 0
-        queue_not_empty = not self.read_event_queue.empty()
-        keep_reading = True if block else queue_not_empty
-        while keep_reading:
-            if queue_not_empty or block:
-                event = self.read_event_queue.get(block=block)
+        while max_num_events <= 0 or num_events_read < max_num_events:
+            max_batch_size = max_num_events - num_events_read if max_num_events > 0 else -1
+            events = self.read_batch(max_batch_size, timeout=_POLL_TIMEOUT_SEC if block else 0.0)
+            if not events and (not block or self._is_drained()):
+                break
+            for event in events:
                 yield event
-                num_events_read += 1
-            # Stop reading if we've reached the end of the events (in non-blocking mode)
-            # or if we've reached the maximum number of events.
-            queue_empty = not self.read_event_queue.empty()
-            queue_not_empty = not queue_empty
-            if queue_empty and not block:
-                keep_reading = False
-            if max_num_events > 0 and num_events_read >= max_num_events:
-                keep_reading = False
-            # Always stop the reader loop if the main worker loop has stopped.
-            keep_reading &= self.continue_worker_loop
-    
+            num_events_read += len(events)
+
+    def read_batch(self, max_events: int = -1, timeout: Optional[float] = 0.0) -> list[dict]:
+        """Drains up to max_events queued events at once, waiting up to timeout seconds for the first."""
+        return self.read_event_queue.get_batch(max_events, timeout)
+
+    async def aread(self, max_num_events: int = -1) -> AsyncIterator[dict]:
+        """Asynchronously yields events as they arrive until the stream ends (use via async for)."""
+        loop = asyncio.get_running_loop()
+        num_events_read = 0
+        while max_num_events <= 0 or num_events_read < max_num_events:
+            max_batch_size = max_num_events - num_events_read if max_num_events > 0 else -1
+            events = await loop.run_in_executor(None, self.read_batch, max_batch_size, _POLL_TIMEOUT_SEC)
+            if not events and self._is_drained():
+                break
+            for event in events:
+                yield event
+            num_events_read += len(events)
+
+    def get_stats(self) -> dict:
+        """Returns the queue stats (dropped events, high-water mark) and reconnect/gap metrics."""
+        return {**self.read_event_queue.get_stats(), **self.resume_state.stats, **self.stats}
+
+    def _is_drained(self) -> bool:
+        return not self.continue_worker_loop and len(self.read_event_queue) == 0
+
     def _worker(self, session_endpoint: str, header: dict) -> None:
-        self.continue_worker_loop = True
-        restart_delay_sec = 1
-        num_retries = 0
         start_time = time.time()
         while self.continue_worker_loop:
+            failed = False
             try:
-                success = self._run_worker_loop(session_endpoint, header, start_time)
-                if success:
-                    num_retries = 0
+                self._run_worker_loop(session_endpoint, header, start_time)
             except Exception as exception:
-                num_retries += 1
-                if num_retries <= self.max_retries:
-                    logging.exception("Failed to run reader loop - restarting...")
-                    time.sleep(restart_delay_sec)
-                    restart_delay_sec = max(restart_delay_sec * 2, 10)
-                else:
-                    logging.exception("Failed to run reader loop - reached max retries, stopping...")
-                    self.continue_worker_loop = False
+                failed = True
+                logging.exception("Failed to run reader loop")
+            if not self.continue_worker_loop:
+                break
+            # The stream dropped, back off before resuming from the last event id.
+            self.resume_state.on_disconnected()
+            backoff_sec = self.reconnect_backoff.get_backoff(failed)
+            if backoff_sec is None:
+                logging.error(f"[sse reader] No events received for {self.max_outage_sec} sec, stopping...")
+                break
+            last_event_id = self.resume_state.last_event_id
+            logging.info(f"[sse reader] Reconnecting in {backoff_sec:.3f} sec, last event id: {last_event_id}")
+            self.stop_event.wait(backoff_sec)
         self.continue_worker_loop = False
-        self.worker = None
+        self.read_event_queue.close()
+        if self.capture_writer is not None:
+            self.capture_writer.close()
 
-    def _run_worker_loop(self, session_endpoint: str, header: dict, start_time: float) -> bool:
-        """Connects to and reads events from an SSE remote connection until instructed to stop."""
+    def _run_worker_loop(self, session_endpoint: str, header: dict, start_time: float) -> int:
+        """Connects to and reads events from an SSE remote connection until instructed to stop.
+
+        Returns the number of new events read from this connection.
+        """
         logging.info(f"[sse reader] Connecting to {session_endpoint}")
-        headers = {**header, "Accept": "text/event-stream"}
+        headers = self.resume_state.get_headers(header)
         num_events_read = 0
         with httpx.Client() as client:
             with connect_sse(client, "GET", session_endpoint, headers=headers, timeout=10.0) as event_source:
+                self.resume_state.on_connected()
+                debug_logging = logging.getLogger().isEnabledFor(logging.DEBUG)
                 # Try and read any SSE events, this will block until an event is received.
                 for event in event_source.iter_sse():
                     assert event.event == "message", event
-                    try:
-                        logging.debug(event)
-                        event_data = json.loads(event.data)
-
-                        assert "type" in event_data, event
-                        self.read_event_queue.put(event_data)
-                        num_events_read += 1
-                        if event_data["type"] == "sse.stream.heartbeat":
-                            continue
-                        if event_data["type"] == "sse.stream.end":
-                            # Cancel the worker loop so the thread will gracefully stop.
-                            self.continue_worker_loop = False
-                            break
-                        if self.max_read_time_sec >= 0 and time.time() - start_time >= self.max_read_time_sec:
-                            self.continue_worker_loop = False
-                            break
-                    except Exception as exception:
-                        logging.debug(f"Failed to parse JSON packet: {event}")
-
+                    if not self.resume_state.is_new_event(event.id):
+                        continue
+                    num_events_read += 1
+                    if num_events_read == 1:
+                        # Ends any outage even if this connection drops with an error later.
+                        self.reconnect_backoff.on_events_received()
+                    if not self._handle_event(event.data, debug_logging):
+                        break
+                    if self.max_read_time_sec >= 0 and time.time() - start_time >= self.max_read_time_sec:
+                        self.continue_worker_loop = False
                     if not self.continue_worker_loop:
                         logging.info(f"[sse reader] Received stop signal...")
                         break
@@ -117,4 +374,140 @@ class ServerSideEventsReader:
         run_time = current_time - start_time
         logging.info(f"[sse reader] Reached end of stream. num_events: {num_events_read} run_time: {run_time:.2f} sec")
 
-        return True
\ No newline at end of file
+        return num_events_read
+
+    def _handle_event(self, data: str, debug_logging: bool = False) -> bool:
+        """Filters, decodes and queues a raw event. Returns false once the end of the stream is reached."""
+        if debug_logging:
+            logging.debug(f"[sse reader] {data}")
+        if self.capture_writer is not None:
+            self.capture_writer.write(data)
+        try:
+            event_type, event_data = self.event_filter.decode(data)
+        except Exception as exception:
+            logging.debug(f"Failed to parse JSON packet: {data}")
+            return True
+        if event_type == _HEARTBEAT_EVENT_TYPE:
+            self.stats["num_heartbeats"] += 1
+            self.last_heartbeat_time = time.time()
+        if event_data is not None:
+            self.read_event_queue.put(event_data)
+        elif event_type != _HEARTBEAT_EVENT_TYPE:
+            self.stats["num_filtered_events"] += 1
+        if event_type == _END_EVENT_TYPE:
+            # Cancel the worker loop so the thread will gracefully stop.
+            self.continue_worker_loop = False
+            return False
+        return True
+
+
+class CaptureReplayReader:
+    """Replays a capture file with the same read() interface as ServerSideEventsReader.
+
+    With speed=1.0 events are released at their original pacing, larger values replay faster and
+    speed <= 0 replays at full speed. Use start_time_sec or start_event_index to seek into the
+    capture. Events are filtered and decoded with the same options as the live reader.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        speed: float = 1.0,
+        start_time_sec: float = 0.0,
+        start_event_index: int = 0,
+        event_types: Optional[list[str]] = None,
+        fields: Optional[list[str]] = None,
+        lazy_decode: bool = False,
+        forward_heartbeats: bool = False,
+        ) -> None:
+        self.filename = str(filename)
+        self.speed = speed
+        self.event_filter = SseEventFilter(event_types, fields, lazy_decode, forward_heartbeats)
+        self.chunks = load_capture_index(self.filename + CAPTURE_INDEX_FILE_EXT)
+        self.capture_start_time = self.chunks[0]["start_time"] if self.chunks else 0.0
+        self.records = self._iter_records(start_time_sec, start_event_index)
+        self.next_record = None
+        self.replay_start_time = None
+        self.first_receive_time = None
+        self.finished = False
+        self.num_events_replayed = 0
+
+    def __iter__(self) -> Iterator[dict]:
+        return self.read(block=True)
+
+    def close(self) -> bool:
+        self.finished = True
+        return True
+
+    def is_running(self) -> bool:
+        return not self.finished
+
+    def get_num_events(self) -> int:
+        """Returns the total number of events in the capture."""
+        if not self.chunks:
+            return 0
+        return self.chunks[-1]["first_event_index"] + self.chunks[-1]["num_events"]
+
+    def read(self, max_num_events: int = -1, block: bool = False) -> Iterator[dict]:
+        """Reads the replayed events that are due.
+
+        In non-blocking mode only events whose replay time has passed are returned. In blocking mode
+        the reader sleeps until each event is due and stops at the end of the capture.
+        """
+        num_events_read = 0
+        while not self.finished and (max_num_events <= 0 or num_events_read < max_num_events):
+            if self.next_record is None:
+                self.next_record = next(self.records, None)
+                if self.next_record is None:
+                    self.finished = True
+                    break
+            wait_time_sec = self._get_wait_time(self.next_record["t"])
+            if wait_time_sec > 0:
+                if not block:
+                    break
+                time.sleep(wait_time_sec)
+            record, self.next_record = self.next_record, None
+            _, event_data = self.event_filter.decode(record["data"])
+            if event_data is None:
+                continue
+            self.num_events_replayed += 1
+            num_events_read += 1
+            yield event_data
+
+    def read_batch(self, max_events: int = -1, timeout: Optional[float] = 0.0) -> list[dict]:
+        """Returns up to max_events due events, waiting up to timeout seconds for the first."""
+        deadline = None if timeout is None else time.time() + timeout
+        events = list(self.read(max_events))
+        while not events and not self.finished and (deadline is None or time.time() < deadline):
+            time.sleep(0.001)
+            events = list(self.read(max_events))
+        return events
+
+    def get_stats(self) -> dict:
+        return {"num_events_replayed": self.num_events_replayed, "num_events": self.get_num_events()}
+
+    def _get_wait_time(self, receive_time: float) -> float:
+        if self.speed <= 0:
+            return 0.0
+        if self.replay_start_time is None:
+            self.replay_start_time = time.time()
+            self.first_receive_time = receive_time
+        due_time = self.replay_start_time + (receive_time - self.first_receive_time) / self.speed
+        return due_time - time.time()
+
+    def _iter_records(self, start_time_sec: float, start_event_index: int) -> Iterator[dict]:
+        start_time = self.capture_start_time + start_time_sec
+        # Skip straight to the last chunk that starts at or before the requested position.
+        first_chunk = 0
+        for chunk_index, chunk in enumerate(self.chunks):
+            if chunk["first_event_index"] <= start_event_index and chunk["start_time"] <= start_time:
+                first_chunk = chunk_index
+        with open(self.filename, "rb") as file_handle:
+            for chunk in self.chunks[first_chunk:]:
+                file_handle.seek(chunk["offset"])
+                lines = gzip.decompress(file_handle.read(chunk["size"])).decode().splitlines()
+                for event_index, line in enumerate(lines, start=chunk["first_event_index"]):
+                    record = json.loads(line)
+                    if event_index < start_event_index or record["t"] < start_time:
+                        continue
+                    yield record
@@ -0,0 +1,235 @@
+from typing import Iterable, Iterator, Optional, Tuple
+import asyncio
+import logging
+import threading
+
+import httpx
+from httpx_sse import aconnect_sse
+
+from archetypeai._event_buffer import EventBuffer, OVERFLOW_BLOCK
+from archetypeai._sse import SseEventFilter, SseReconnectBackoff, SseResumeState, is_heartbeat_event, _END_EVENT_TYPE, _POLL_TIMEOUT_SEC
+
+
+class _HubSession:
+    """The per-session state of a stream read by the hub."""
+
+    def __init__(self, session_id: str, session_endpoint: str, event_buffer: EventBuffer, reconnect_backoff: SseReconnectBackoff) -> None:
+        self.session_id = session_id
+        self.session_endpoint = session_endpoint
+        self.event_buffer = event_buffer
+        self.resume_state = SseResumeState()
+        self.reconnect_backoff = reconnect_backoff
+        self.running = True
+        self.future = None
+
+
+class SseConsumerHub:
+    """Reads the SSE streams of many lens sessions from a single background asyncio loop.
+
+    All streams share one httpx connection pool and one thread, rather than a client and a thread per
+    session. Each session is buffered in its own bounded queue so a noisy session can only fill its
+    own buffer, and the merged read() serves the sessions round-robin so none of them starve.
+    Dropped streams are resumed with Last-Event-ID, retried until a session has failed to get events
+    for max_outage_sec, and events are filtered the same as in ServerSideEventsReader.
+    """
+
+    def __init__(
+        self,
+        consumer_endpoint: str,
+        header: dict,
+        max_queue_size_per_session: int = 1024,
+        overflow_policy: str = OVERFLOW_BLOCK,
+        max_connections: Optional[int] = None,
+        max_outage_sec: float = 30.0,
+        initial_backoff_sec: float = 0.02,
+        max_backoff_sec: float = 2.0,
+        event_types: Optional[Iterable[str]] = None,
+        fields: Optional[Iterable[str]] = None,
+        lazy_decode: bool = False,
+        forward_heartbeats: bool = False,
+        ) -> None:
+        self.consumer_endpoint = consumer_endpoint
+        self.header = header
+        self.max_queue_size_per_session = max_queue_size_per_session
+        self.overflow_policy = overflow_policy
+        self.max_outage_sec = max_outage_sec
+        self.initial_backoff_sec = initial_backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.event_filter = SseEventFilter(event_types, fields, lazy_decode, forward_heartbeats)
+        self.sessions = {}
+        self.next_session_index = 0
+        self.lock = threading.Lock()
+        self.data_available = threading.Condition(self.lock)
+        self.loop = asyncio.new_event_loop()
+        # Each SSE stream holds a connection open, so the pool is unbounded unless capped by the caller.
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.client = httpx.AsyncClient(limits=limits, timeout=10.0)
+        self.worker = threading.Thread(target=self._run_loop, daemon=True)
+        self.worker.start()
+
+    def __del__(self):
+        self.close()
+
+    def add_session(self, session_id: str) -> bool:
+        """Starts reading the SSE stream of a session. Returns false if it is already being read."""
+        assert self.worker is not None, "Hub is closed!"
+        with self.lock:
+            if session_id in self.sessions:
+                return False
+            event_buffer = EventBuffer(
+                self.max_queue_size_per_session, self.overflow_policy, is_heartbeat=is_heartbeat_event)
+            reconnect_backoff = SseReconnectBackoff(self.initial_backoff_sec, self.max_backoff_sec, self.max_outage_sec)
+            session = _HubSession(session_id, f"{self.consumer_endpoint}/{session_id}", event_buffer, reconnect_backoff)
+            self.sessions[session_id] = session
+        session.future = asyncio.run_coroutine_threadsafe(self._read_session(session), self.loop)
+        return True
+
+    def remove_session(self, session_id: str) -> bool:
+        """Stops reading a session and discards any of its unread events."""
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.running = False
+        session.event_buffer.close()
+        session.future.cancel()
+        return True
+
+    def get_session_ids(self) -> list[str]:
+        with self.lock:
+            return list(self.sessions.keys())
+
+    def read(self, max_num_events: int = -1, block: bool = False) -> Iterator[Tuple[str, dict]]:
+        """Reads (session_id, event) pairs merged fairly across all sessions.
+
+        In blocking mode events are yielded as they arrive until every session has ended.
+        """
+        num_events_read = 0
+        while max_num_events <= 0 or num_events_read < max_num_events:
+            with self.data_available:
+                session_event = self._pop_next_event()
+                if session_event is None and block:
+                    self.data_available.wait(_POLL_TIMEOUT_SEC)
+                    session_event = self._pop_next_event()
+            if session_event is None:
+                if not block or self._is_drained():
+                    break
+                continue
+            yield session_event
+            num_events_read += 1
+
+    def read_session(
+        self, session_id: str, max_num_events: int = -1, block: bool = False) -> Iterator[dict]:
+        """Reads the events of a single session."""
+        session = self.sessions[session_id]
+        num_events_read = 0
+        while max_num_events <= 0 or num_events_read < max_num_events:
+            max_batch_size = max_num_events - num_events_read if max_num_events > 0 else -1
+            events = session.event_buffer.get_batch(max_batch_size, timeout=_POLL_TIMEOUT_SEC if block else 0.0)
+            if not events and (not block or (not session.running and len(session.event_buffer) == 0)):
+                break
+            for event in events:
+                yield event
+            num_events_read += len(events)
+
+    def get_stats(self) -> dict:
+        """Returns the queue and reconnect stats of each session."""
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return {
+            session.session_id: {
+                "running": session.running,
+                **session.event_buffer.get_stats(),
+                **session.resume_state.stats,
+            } for session in sessions
+        }
+
+    def close(self) -> bool:
+        """Stops reading all sessions and shuts down the background loop."""
+        if self.worker is None:
+            return False
+        for session_id in self.get_session_ids():
+            self.remove_session(session_id)
+        asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.worker.join()
+        self.worker = None
+        self.loop.close()
+        return True
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _pop_next_event(self) -> Optional[Tuple[str, dict]]:
+        # Must be called with the lock held. Starts from the session after the last one served.
+        sessions = list(self.sessions.values())
+        for offset in range(len(sessions)):
+            session_index = (self.next_session_index + offset) % len(sessions)
+            events = sessions[session_index].event_buffer.get_batch(1)
+            if events:
+                self.next_session_index = session_index + 1
+                return sessions[session_index].session_id, events[0]
+        return None
+
+    def _is_drained(self) -> bool:
+        with self.lock:
+            return all(not session.running and len(session.event_buffer) == 0 for session in self.sessions.values())
+
+    def _notify(self) -> None:
+        with self.data_available:
+            self.data_available.notify_all()
+
+    async def _read_session(self, session: _HubSession) -> None:
+        while session.running:
+            failed = False
+            try:
+                await self._read_session_stream(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exception:
+                failed = True
+                logging.exception(f"[sse hub] Failed to read session {session.session_id}")
+            if not session.running:
+                break
+            session.resume_state.on_disconnected()
+            backoff_sec = session.reconnect_backoff.get_backoff(failed)
+            if backoff_sec is None:
+                logging.error(f"[sse hub] No events received for session {session.session_id} for {self.max_outage_sec} sec, stopping...")
+                break
+            await asyncio.sleep(backoff_sec)
+        session.running = False
+        self._notify()
+
+    async def _read_session_stream(self, session: _HubSession) -> int:
+        logging.info(f"[sse hub] Connecting to {session.session_endpoint}")
+        headers = session.resume_state.get_headers(self.header)
+        num_events_read = 0
+        async with aconnect_sse(self.client, "GET", session.session_endpoint, headers=headers) as event_source:
+            session.resume_state.on_connected()
+            async for event in event_source.aiter_sse():
+                if not session.resume_state.is_new_event(event.id):
+                    continue
+                num_events_read += 1
+                if num_events_read == 1:
+                    session.reconnect_backoff.on_events_received()
+                try:
+                    event_type, event_data = self.event_filter.decode(event.data)
+                except Exception as exception:
+                    logging.debug(f"Failed to parse JSON packet: {event}")
+                    continue
+                if event_type == _END_EVENT_TYPE:
+                    session.running = False
+                if event_data is None:
+                    if not session.running:
+                        break
+                    continue
+                # Pause reading this session's socket while its buffer is full, without blocking the loop.
+                if self.overflow_policy == OVERFLOW_BLOCK:
+                    while len(session.event_buffer) >= self.max_queue_size_per_session and session.running:
+                        await asyncio.sleep(_POLL_TIMEOUT_SEC / 10)
+                session.event_buffer.put(event_data)
+                self._notify()
+                if not session.running:
+                    break
+        return num_events_read
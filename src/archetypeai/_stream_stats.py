@@ -0,0 +1,212 @@
+from typing import Iterable
+import math
+import time
+
+_PERCENTILES = (50, 90, 99)
+
+
+class LatencyHistogram:
+    """A fixed size, log bucketed histogram of latencies in seconds.
+
+    Bucket boundaries grow by a factor of (1 + relative_error) from min_value_sec up to max_value_sec,
+    so percentiles are accurate to within relative_error and recording a value is O(1) with no
+    allocation. Values outside the range are clamped into the first or last bucket.
+    """
+
+    def __init__(self, min_value_sec: float = 1e-6, max_value_sec: float = 100.0, relative_error: float = 0.05) -> None:
+        self.min_value_sec = min_value_sec
+        self.log_base = math.log1p(relative_error)
+        self.num_buckets = int(math.log(max_value_sec / min_value_sec) / self.log_base) + 2
+        # Reciprocals so recording a value needs no divisions.
+        self._inverse_min_value = 1.0 / min_value_sec
+        self._inverse_log_base = 1.0 / self.log_base
+        self.counts = [0] * self.num_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max_value = 0.0
+
+    def record(self, value: float, count: int = 1) -> None:
+        """Records count occurrences of a value."""
+        bucket_index = 0
+        if value > self.min_value_sec:
+            bucket_index = int(math.log(value * self._inverse_min_value) * self._inverse_log_base) + 1
+            if bucket_index >= self.num_buckets:
+                bucket_index = self.num_buckets - 1
+        self.counts[bucket_index] += count
+        self.count += count
+        self.total += value * count
+        if value > self.max_value:
+            self.max_value = value
+
+    def merge(self, histogram: "LatencyHistogram") -> None:
+        """Adds the counts of a histogram with the same bucket layout into this one."""
+        assert histogram.num_buckets == self.num_buckets, "Histograms have different bucket layouts"
+        for bucket_index, count in enumerate(list(histogram.counts)):
+            self.counts[bucket_index] += count
+        self.count += histogram.count
+        self.total += histogram.total
+        self.max_value = max(self.max_value, histogram.max_value)
+
+    def get_percentile(self, percentile: float) -> float:
+        """Returns the upper bound of the bucket holding the given percentile."""
+        if self.count == 0:
+            return 0.0
+        target_count = percentile / 100.0 * self.count
+        cumulative_count = 0
+        for bucket_index, count in enumerate(self.counts):
+            cumulative_count += count
+            if cumulative_count >= target_count and count > 0:
+                upper_bound = self.min_value_sec * math.exp(bucket_index * self.log_base)
+                return min(upper_bound, self.max_value)
+        return self.max_value
+
+    def get_stats(self) -> dict:
+        stats = {"count": self.count, "mean": self.total / self.count if self.count > 0 else 0.0}
+        for percentile in _PERCENTILES:
+            stats[f"p{percentile}"] = self.get_percentile(percentile)
+        stats["max"] = self.max_value
+        return stats
+
+
+class SlidingWindowCounter:
+    """Counts messages and bytes over a sliding time window using a ring of fixed width buckets."""
+
+    def __init__(self, window_sec: float = 10.0, bucket_sec: float = 1.0) -> None:
+        self.window_sec = window_sec
+        self.bucket_sec = bucket_sec
+        self.num_buckets = max(int(math.ceil(window_sec / bucket_sec)), 1)
+        self.bucket_ids = [-1] * self.num_buckets
+        self.message_counts = [0] * self.num_buckets
+        self.byte_counts = [0] * self.num_buckets
+        self.num_messages = 0
+        self.num_bytes = 0
+        self.start_time = -1.0
+
+    def add(self, num_messages: int, num_bytes: float, time_now: float) -> None:
+        if self.start_time < 0:
+            self.start_time = time_now
+        bucket_id = int(time_now / self.bucket_sec)
+        bucket_index = bucket_id % self.num_buckets
+        if self.bucket_ids[bucket_index] != bucket_id:
+            self.bucket_ids[bucket_index] = bucket_id
+            self.message_counts[bucket_index] = 0
+            self.byte_counts[bucket_index] = 0
+        self.message_counts[bucket_index] += num_messages
+        self.byte_counts[bucket_index] += num_bytes
+        self.num_messages += num_messages
+        self.num_bytes += num_bytes
+
+    def get_rates(self, time_now: float) -> tuple[float, float]:
+        """Returns the messages/sec and bytes/sec within the window (or since the first message)."""
+        num_messages, num_bytes = self.get_totals(time_now)
+        window_sec = max(min(self.window_sec, time_now - self.start_time), self.bucket_sec)
+        return num_messages / window_sec, num_bytes / window_sec
+
+    def get_totals(self, time_now: float) -> tuple[int, float]:
+        """Returns the number of messages and bytes counted within the window."""
+        first_bucket_id = int(time_now / self.bucket_sec) - self.num_buckets + 1
+        num_messages = 0
+        num_bytes = 0
+        for bucket_index, bucket_id in enumerate(list(self.bucket_ids)):
+            if bucket_id >= first_bucket_id:
+                num_messages += self.message_counts[bucket_index]
+                num_bytes += self.byte_counts[bucket_index]
+        return num_messages, num_bytes
+
+
+class StreamStatsRecorder:
+    """Records the send stats of a single stream worker.
+
+    Each worker owns its own recorder and is its only writer, so recording takes no locks and never
+    blocks on a reader. Readers merge the recorders of all workers on demand (see merge_stream_stats),
+    which may see a frame that is only partially recorded but never blocks the worker.
+    """
+
+    def __init__(self, window_sec: float = 10.0) -> None:
+        self.window_sec = window_sec
+        self.queue_wait = LatencyHistogram()
+        self.send_time = LatencyHistogram()
+        self.end_to_end_latency = LatencyHistogram()
+        self.topic_counters = {}
+        self.stream_counters = {}
+        self.num_messages = 0
+        self.num_frames = 0
+        self.num_bytes = 0
+        self.max_batch_size = 0
+        self.max_queue_size = 0
+        self.last_queue_wait = 0.0
+
+    def record_frame(
+        self, messages: list, num_bytes: int, send_start_time: float, send_end_time: float, queue_size: int) -> None:
+        """Records a frame of messages, each with the topic_id, stream_uid, enqueue_time and num_messages set by send()."""
+        self.send_time.record(send_end_time - send_start_time)
+        queue_wait_record = self.queue_wait.record
+        end_to_end_latency_record = self.end_to_end_latency.record
+        stream_topic_num_messages = {}
+        num_frame_messages = 0
+        for message in messages:
+            enqueue_time = message.enqueue_time
+            num_messages = message.num_messages
+            queue_wait_record(send_start_time - enqueue_time, num_messages)
+            end_to_end_latency_record(send_end_time - enqueue_time, num_messages)
+            stream_topic = (message.stream_uid, message.topic_id)
+            stream_topic_num_messages[stream_topic] = stream_topic_num_messages.get(stream_topic, 0) + num_messages
+            num_frame_messages += num_messages
+        self.last_queue_wait = send_start_time - enqueue_time
+        # The frame size is split evenly between its messages for the per topic and per stream byte rates.
+        num_bytes_per_message = num_bytes / num_frame_messages
+        for (stream_uid, topic_id), num_messages in stream_topic_num_messages.items():
+            num_bytes_of_messages = num_bytes_per_message * num_messages
+            self._get_counter(self.topic_counters, topic_id).add(num_messages, num_bytes_of_messages, send_end_time)
+            self._get_counter(self.stream_counters, stream_uid).add(num_messages, num_bytes_of_messages, send_end_time)
+        self.num_messages += num_frame_messages
+        self.num_frames += 1
+        self.num_bytes += num_bytes
+        self.max_batch_size = max(self.max_batch_size, num_frame_messages)
+        self.max_queue_size = max(self.max_queue_size, queue_size)
+
+    def _get_counter(self, counters: dict, key: str) -> SlidingWindowCounter:
+        counter = counters.get(key)
+        if counter is None:
+            counter = SlidingWindowCounter(self.window_sec)
+            counters[key] = counter
+        return counter
+
+
+def merge_stream_stats(recorders: Iterable[StreamStatsRecorder], time_now: float = -1.0) -> dict:
+    """Merges the stats of several worker recorders into latency percentiles and per topic rates."""
+    time_now = time_now if time_now >= 0 else time.time()
+    queue_wait = LatencyHistogram()
+    send_time = LatencyHistogram()
+    end_to_end_latency = LatencyHistogram()
+    topics = {}
+    streams = {}
+    stats = {"num_messages": 0, "num_frames": 0, "num_bytes": 0, "max_batch_size": 0, "max_queue_size": 0, "last_queue_wait": 0.0}
+    for recorder in recorders:
+        queue_wait.merge(recorder.queue_wait)
+        send_time.merge(recorder.send_time)
+        end_to_end_latency.merge(recorder.end_to_end_latency)
+        stats["num_messages"] += recorder.num_messages
+        stats["num_frames"] += recorder.num_frames
+        stats["num_bytes"] += recorder.num_bytes
+        stats["max_batch_size"] = max(stats["max_batch_size"], recorder.max_batch_size)
+        stats["max_queue_size"] = max(stats["max_queue_size"], recorder.max_queue_size)
+        stats["last_queue_wait"] = recorder.last_queue_wait
+        _merge_counters(topics, recorder.topic_counters, time_now)
+        _merge_counters(streams, recorder.stream_counters, time_now)
+    stats["queue_wait_sec"] = queue_wait.get_stats()
+    stats["send_time_sec"] = send_time.get_stats()
+    stats["end_to_end_latency_sec"] = end_to_end_latency.get_stats()
+    stats["topics"] = topics
+    stats["streams"] = streams
+    return stats
+
+
+def _merge_counters(merged_stats: dict, counters: dict, time_now: float) -> None:
+    # Copy the dict first as the worker may add a new counter while it is being read.
+    for key, counter in dict(counters).items():
+        messages_per_sec, bytes_per_sec = counter.get_rates(time_now)
+        counter_stats = merged_stats.setdefault(key, {"num_messages": 0, "messages_per_sec": 0.0, "bytes_per_sec": 0.0})
+        counter_stats["num_messages"] += counter.num_messages
+        counter_stats["messages_per_sec"] += messages_per_sec
+        counter_stats["bytes_per_sec"] += bytes_per_sec
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from archetypeai._batch_encoding import encode_rows, get_timestamps
+
+
+def test_encode_rows_matches_json_encoding_per_row():
+    np = pytest.importorskip("numpy")
+    for values in (
+        np.arange(12, dtype=np.float64).reshape(4, 3) / 3,
+        np.array([1, -2, 3], dtype=np.int16),
+        np.array([[True, False]]),
+        np.array([[1.5, np.nan]]),
+        np.array(["a, b", "c"]),
+    ):
+        assert encode_rows(values) == [json.dumps(row) for row in values.tolist()]
+    assert encode_rows([{"x": 1}, [2, 3]]) == ['{"x": 1}', "[2, 3]"]
+
+
+def test_get_timestamps_validates_timestamps():
+    np = pytest.importorskip("numpy")
+    assert get_timestamps(np.arange(3), np.zeros((3, 2))) == [0.0, 1.0, 2.0]
+    assert len(set(get_timestamps(None, np.zeros(4)))) == 1
+    with pytest.raises(AssertionError):
+        get_timestamps([1.0, 2.0], np.zeros(3))
+    with pytest.raises(AssertionError):
+        get_timestamps([1.0, np.inf], np.zeros(2))
+
+
+def test_encode_rows_encodes_dataframe_records():
+    pd = pytest.importorskip("pandas")
+    index = pd.to_datetime([1.0, 2.0], unit="s")
+    frame = pd.DataFrame({"x": [1.5, 2.5], "label": ["a", "b"]}, index=index)
+    assert [json.loads(row) for row in encode_rows(frame)] == [{"x": 1.5, "label": "a"}, {"x": 2.5, "label": "b"}]
+    assert get_timestamps(None, frame) == [1.0, 2.0]
@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+
+import pytest
+
+from archetypeai._broadcast_batcher import BroadcastBatcher
+from archetypeai._messaging import MessagingApi
+
+
+def test_broadcast_batcher_batches_messages_across_topics():
+    batches = []
+    def send_fn(encoded_messages):
+        batches.append([json.loads(encoded) for encoded in encoded_messages])
+        return {"batch_index": len(batches) - 1}
+    batcher = BroadcastBatcher(send_fn, max_batch_size=10, linger_sec=0.05)
+    futures = [batcher.put(f"topic_{index % 3}", {"index": index}) for index in range(25)]
+    assert [future.result(timeout=5.0)["batch_index"] for future in futures] == [index // 10 for index in range(25)]
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    messages = [message for batch in batches for message in batch]
+    assert messages == [{"topic_id": f"topic_{index % 3}", "message": {"index": index}} for index in range(25)]
+    assert batcher.close()
+    stats = batcher.get_stats()
+    assert (stats["num_messages"], stats["num_batches"], stats["avg_batch_size"]) == (25, 3, 25 / 3)
+
+
+def test_broadcast_batcher_limits_batch_bytes_and_fails_futures():
+    num_messages_per_batch = []
+    def send_fn(encoded_messages):
+        num_messages_per_batch.append(len(encoded_messages))
+        raise ValueError("Request failed")
+    batcher = BroadcastBatcher(send_fn, max_batch_bytes=200, linger_sec=1.0)
+    futures = [batcher.put("topic_a", "x" * 50) for _ in range(6)]
+    with pytest.raises(ValueError):
+        futures[0].result(timeout=5.0)
+    assert batcher.close()
+    assert all(isinstance(future.exception(), ValueError) for future in futures)
+    assert num_messages_per_batch == [2, 2, 2]
+    assert batcher.get_stats()["num_failed_messages"] == 6
+
+
+def test_broadcast_batcher_close_flushes_lingering_messages():
+    batches = []
+    batcher = BroadcastBatcher(batches.append, linger_sec=60.0)
+    futures = [batcher.put("topic_a", index) for index in range(3)]
+    start_time = time.time()
+    assert batcher.close()
+    assert time.time() - start_time < 1.0
+    assert len(batches) == 1 and all(future.done() for future in futures)
+    with pytest.raises(AssertionError):
+        batcher.put("topic_a", 3)
+
+
+def test_messaging_api_broadcasts_many_messages_in_one_request(monkeypatch):
+    messaging = MessagingApi("fake_api_key", "https://localhost", broadcast_linger_sec=0.01)
+    payloads = []
+    lock = threading.Lock()
+    def fake_requests_post(api_endpoint, data_payload):
+        with lock:
+            payloads.append(json.loads(data_payload))
+        return {"num_messages": len(payloads[-1]["messages"])}
+    monkeypatch.setattr(messaging, "requests_post", fake_requests_post)
+    messages = [{"topic_id": f"topic_{index % 2}", "message": {"index": index}} for index in range(5)]
+    assert messaging.broadcast_many(messages) == {"num_messages": 5}
+    assert payloads == [{"client_name": "python_client", "messages": messages}]
+
+    def produce(producer_index: int):
+        for index in range(50):
+            messaging.broadcast_async(f"topic_{producer_index}", {"index": index})
+    producers = [threading.Thread(target=produce, args=(producer_index,)) for producer_index in range(4)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    messaging.close()
+    batched_messages = [message for payload in payloads[1:] for message in payload["messages"]]
+    for producer_index in range(4):
+        topic_messages = [message["message"]["index"] for message in batched_messages if message["topic_id"] == f"topic_{producer_index}"]
+        assert topic_messages == list(range(50))
+    assert len(payloads) - 1 < 200
+    assert messaging.get_broadcast_stats()["num_messages"] == 200
@@ -0,0 +1,10 @@
+import pytest
+
+from local_servers import LocalStreamerServer
+
+
+@pytest.fixture
+def streamer_server():
+    server = LocalStreamerServer()
+    yield server
+    server.close()
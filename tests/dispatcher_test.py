@@ -0,0 +1,53 @@
+import threading
+import time
+
+from archetypeai._dispatcher import CallbackDispatcher
+
+
+def test_dispatcher_matches_wildcards_and_keeps_order():
+    dispatcher = CallbackDispatcher(num_threads=4)
+    received = {"imu": [], "all": []}
+    imu_handler_id = dispatcher.add_handler(lambda *event: received["imu"].append(event), sensor_pattern="imu_*")
+    dispatcher.add_handler(lambda *event: received["all"].append(event), topic_pattern="accel*")
+    for index in range(200):
+        for sensor_name in ("imu_0", "imu_1", "camera"):
+            dispatcher.dispatch(sensor_name, "accel", index)
+    assert not dispatcher.dispatch("camera", "frame", 0)
+    assert dispatcher.join(timeout=5.0)
+    for sensor_name in ("imu_0", "imu_1"):
+        assert [data for name, _, data in received["imu"] if name == sensor_name] == list(range(200))
+    assert len(received["all"]) == 600
+    stats = dispatcher.get_stats()
+    assert stats[imu_handler_id]["num_events"] == 400
+    assert stats[imu_handler_id]["handler_time_sec"]["count"] == 400
+    assert stats[imu_handler_id]["dispatch_latency_sec"]["max"] >= 0.0
+
+    assert dispatcher.remove_handler(imu_handler_id)
+    assert not dispatcher.dispatch("imu_0", "gyro", 0)
+    dispatcher.close()
+    assert not dispatcher.threads
+
+
+def test_dispatcher_isolates_slow_and_failing_handlers():
+    dispatcher = CallbackDispatcher(num_threads=2, max_handler_queue_size=4)
+    release = threading.Event()
+    fast_events = []
+    def failing_handler(sensor_name, topic_id, data):
+        raise ValueError("bad data")
+    dispatcher.add_handler(lambda *event: release.wait(), topic_pattern="slow")
+    fast_handler_id = dispatcher.add_handler(lambda *event: fast_events.append(event), topic_pattern="fast")
+    failing_handler_id = dispatcher.add_handler(failing_handler, topic_pattern="fast")
+    for index in range(10):
+        dispatcher.dispatch("sensor", "slow", index)
+    # The blocked handler drops its oldest events but doesn't hold up the others.
+    start_time = time.time()
+    while len(fast_events) < 3 and time.time() - start_time < 5.0:
+        dispatcher.dispatch("sensor", "fast", len(fast_events))
+        time.sleep(0.01)
+    assert len(fast_events) >= 3
+    stats = dispatcher.get_stats()
+    assert stats[0]["num_dropped_events"] >= 5
+    assert stats[failing_handler_id]["num_errors"] == stats[failing_handler_id]["num_events"] > 0
+    assert stats[fast_handler_id]["num_errors"] == 0
+    release.set()
+    dispatcher.close()
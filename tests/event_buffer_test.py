@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from archetypeai._event_buffer import EventBuffer, ShardedEventBuffer
+from archetypeai._sse import is_heartbeat_event
+
+
+def test_event_buffer_overflow_policies():
+    buffer = EventBuffer(max_size=2, overflow_policy="drop_oldest")
+    for index in range(5):
+        buffer.put(index)
+    assert buffer.get_batch() == [3, 4]
+    assert buffer.get_stats()["num_dropped_events"] == 3
+    assert buffer.get_stats()["queue_high_water_mark"] == 2
+
+    buffer = EventBuffer(max_size=2, overflow_policy="drop_heartbeats", is_heartbeat=is_heartbeat_event)
+    heartbeat = {"type": "sse.stream.heartbeat"}
+    buffer.put(heartbeat)
+    buffer.put({"type": "a"})
+    buffer.put({"type": "b"})
+    assert not buffer.put(heartbeat)
+    assert buffer.get_batch() == [{"type": "a"}, {"type": "b"}]
+
+    buffer = EventBuffer(max_size=1, overflow_policy="block")
+    buffer.put(0)
+    assert not buffer.put(1, timeout=0.01)
+    threading.Timer(0.05, buffer.get_batch).start()
+    assert buffer.put(2, timeout=1.0)
+    assert buffer.get(timeout=1.0) == 2
+    with pytest.raises(TimeoutError):
+        buffer.get(timeout=0.01)
+
+    buffer = EventBuffer(max_size=2, overflow_policy="drop_newest", get_key=lambda event: event[0])
+    for event in ["a0", "b0", "a1", "b1"]:
+        buffer.put(event)
+    assert buffer.get_batch() == ["a0", "b0"]
+    assert buffer.get_stats()["num_dropped_events_per_key"] == {"a": 1, "b": 1}
+
+    buffer = EventBuffer(max_size=3, overflow_policy="keep_latest", get_key=lambda event: event[0])
+    for event in ["a0", "b0", "a1", "a2", "a3", "c0"]:
+        buffer.put(event)
+    assert buffer.get_batch() == ["a2", "a3", "c0"]
+    assert buffer.get_stats()["num_dropped_events_per_key"] == {"a": 2, "b": 1}
+
+
+def test_sharded_event_buffer_keeps_key_order_across_rebalance():
+    buffer = ShardedEventBuffer(num_shards=3, max_size=0, get_key=lambda event: event[0])
+    events = [(f"topic_{key}", index) for index in range(10) for key in range(20)]
+    for event in events:
+        buffer.put(event)
+    shard_indices = {key: buffer.get_shard_index(key) for key, _ in events}
+    assert set(shard_indices.values()) == {0, 1, 2}
+    for shard_index in range(3):
+        shard_events = buffer.get_shard(shard_index).get_batch(5)
+        assert all(shard_indices[key] == shard_index for key, _ in shard_events)
+
+    # Only the keys of the removed shard move, and their events keep their order.
+    num_moved_events = buffer.remove_shard(1)
+    assert num_moved_events == 10 * list(shard_indices.values()).count(1) - 5
+    assert all(buffer.get_shard_index(key) == shard_index for key, shard_index in shard_indices.items() if shard_index != 1)
+    assert len(buffer.get_shard(1)) == 0
+    buffer.put(("topic_new", 0))
+    remaining_events = buffer.get_batch()
+    assert len(remaining_events) == len(events) - 15 + 1
+    for key in shard_indices:
+        indices = [index for event_key, index in remaining_events if event_key == key]
+        assert indices == sorted(indices)
+    assert buffer.get_stats()["num_shards"] == 2
+    buffer.reopen()
+    assert buffer.get_stats()["num_shards"] == 3
+
+
+def test_sharded_event_buffer_rebalances_without_blocking_or_reordering():
+    # Moved events are requeued beyond max_size rather than blocking on a full shard.
+    buffer = ShardedEventBuffer(num_shards=2, max_size=8, get_key=lambda event: event[0])
+    keys = [f"topic_{key}" for key in range(20)]
+    for index in range(4):
+        for key in keys:
+            buffer.put((key, index), timeout=0.0)
+    start_time = time.time()
+    num_moved_events = buffer.remove_shard(1)
+    assert time.time() - start_time < 1.0
+    assert num_moved_events == 4
+    assert len(buffer.get_shard(0)) == 8
+
+    # Events put while a shard is removed queue behind the older events of their key.
+    buffer = ShardedEventBuffer(num_shards=3, max_size=0, get_key=lambda event: event[0])
+    num_events = 20000
+    def produce():
+        for index in range(num_events):
+            buffer.put((keys[index % len(keys)], index))
+    producer = threading.Thread(target=produce)
+    producer.start()
+    while len(buffer) < num_events // 4:
+        time.sleep(0.001)
+    buffer.remove_shard(1)
+    producer.join()
+    events = buffer.get_batch()
+    assert len(events) == num_events
+    for key in keys:
+        indices = [index for event_key, index in events if event_key == key]
+        assert indices == sorted(indices)
@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+import threading
+
+from websockets.sync.server import serve
+
+from archetypeai._frame_codec import FrameCodec, get_compression_stats, is_compressed_frame
+from archetypeai._lens_session_socket import LensSessionSocket
+
+_EXAMPLE_DATA_FILENAME = Path(__file__).parent.parent / "example_data" / "home_sensor_log.jsonl"
+
+
+def test_frame_codec_round_trips_and_compresses_across_frames():
+    sender = FrameCodec(level=6, min_size_bytes=64)
+    receiver = FrameCodec()
+    rows = [json.loads(line) for line in _EXAMPLE_DATA_FILENAME.read_text().splitlines()] * 10
+    for index, row in enumerate(rows):
+        frame = json.dumps({"h": "dm", "topic_id": "home", "data": row, "message_id": index}).encode()
+        wire_frame = sender.encode(frame)
+        assert is_compressed_frame(wire_frame)
+        assert receiver.decode(wire_frame) == frame
+    # Frames below the threshold are sent raw but can be interleaved with compressed ones.
+    small_frame = b'{"h": "cm"}'
+    assert sender.encode(small_frame) == small_frame
+    assert receiver.decode(small_frame) == small_frame
+    frame = json.dumps({"h": "dm", "data": rows[0]}).encode()
+    assert receiver.decode(sender.encode(frame)) == frame
+
+    stats = sender.get_stats()
+    assert stats["num_frames_sent"] == len(rows) + 2
+    assert stats["num_compressed_frames_sent"] == len(rows) + 1
+    # Repeated rows compress against the earlier frames of the connection.
+    assert stats["compression_ratio_sent"] > 5.0
+    assert stats["compression_time_sec"] > 0.0
+    merged_stats = get_compression_stats([sender, receiver])
+    assert merged_stats["num_raw_bytes_received"] == stats["num_raw_bytes_sent"]
+    assert merged_stats["num_wire_bytes_received"] == stats["num_wire_bytes_sent"]
+
+
+def test_lens_session_socket_falls_back_to_raw_frames_if_the_session_never_answers():
+    def handler(websocket):
+        # Echo every event except the compression request, which an older session ignores.
+        for frame in websocket:
+            if json.loads(frame)["type"] != "session.frame_compression":
+                websocket.send(frame)
+
+    server = serve(handler, "127.0.0.1", 0, compression=None)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    session_socket = LensSessionSocket(
+        f"ws://127.0.0.1:{server.socket.getsockname()[1]}", {}, frame_compression="zlib", negotiation_timeout_sec=0.2)
+    try:
+        assert session_socket.send_and_recv({"type": "session.status"}) == {"type": "session.status"}
+        assert session_socket.frame_codecs == []
+    finally:
+        session_socket.close()
+        server.shutdown()
+        thread.join()
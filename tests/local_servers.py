@@ -0,0 +1,238 @@
+# Local stand-ins for the Archetype AI websocket and broadcast endpoints, shared by the unit tests and benchmarks.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import multiprocessing
+import socket
+import threading
+import time
+
+from websockets.sync.server import serve
+
+from archetypeai._binary_codec import decode_message, encode_message, is_binary_frame, is_buffer
+from archetypeai._frame_codec import FrameCodec
+from archetypeai._stream_stats import LatencyHistogram
+
+
+def wait_for(condition_fn, timeout_sec: float = 5.0) -> bool:
+    """Polls condition_fn until it returns true or timeout_sec passes, returning its last result."""
+    deadline = time.time() + timeout_sec
+    while not condition_fn() and time.time() < deadline:
+        time.sleep(0.005)
+    return condition_fn()
+
+
+class LocalStreamerServer:
+    """A local stand-in for the sensor streamer, sensor subscriber and messaging websocket endpoints.
+
+    Control messages are answered with an echo of their topic_id, except fetch messages which are
+    answered with any queued sensor data or messages. Data messages are recorded and not answered.
+    Connections that send a subscribe_push control message get queued data pushed to them instead.
+    If frame_compression is set, handshakes asking for it are accepted and the frames of those
+    connections are compressed in both directions. A frame_delay_sec > 0 is waited after every data
+    frame to simulate a slow uplink, with a small receive buffer so the backlog stays on the client.
+    The time from the timestamp of each data message to its arrival is recorded in data_latency.
+    """
+
+    def __init__(self, port: int = 0, record_messages: bool = True, frame_compression: str = "", frame_delay_sec: float = 0.0) -> None:
+        self.record_messages = record_messages
+        self.frame_delay_sec = frame_delay_sec
+        self.frame_compression = frame_compression
+        self.frame_codecs = {}
+        self.send_locks = {}
+        self.lock = threading.Lock()
+        self.received_messages = []
+        self.pending_sensor_data = []
+        self.pending_messages = []
+        self.connections = set()
+        self.push_connections = {}
+        self.stats = {"num_connections": 0, "num_frames": 0, "num_bytes": 0, "num_control_messages": 0, "num_data_messages": 0}
+        server_logger = logging.getLogger("local_streamer_server")
+        server_logger.setLevel(logging.CRITICAL)
+        self.data_latency = LatencyHistogram()
+        self.server = serve(self._handler, "127.0.0.1", port, compression=None, max_size=None, logger=server_logger)
+        if frame_delay_sec > 0:
+            # Accepted sockets inherit the buffer size, which also turns off receive buffer autotuning.
+            self.server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+        self.port = self.server.socket.getsockname()[1]
+        self.endpoint = f"ws://127.0.0.1:{self.port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.thread.join()
+
+    def queue_sensor_data(self, sensor_name: str, topic_id: str, data) -> None:
+        """Queues sensor data to be returned by the next fetch of a subscriber, or pushes it in push mode."""
+        event = {"sensor_name": sensor_name, "topic_id": topic_id, "data": data}
+        if not self._push("/sensors/subscriber", {"sensor_data": [event]}):
+            with self.lock:
+                self.pending_sensor_data.append(event)
+
+    def queue_message(self, topic_id: str, message) -> None:
+        """Queues a message to be returned by the next fetch of a messaging subscriber, or pushes it in push mode."""
+        message = {"topic_id": topic_id, "message": message}
+        if not self._push("/messaging", {"messages": [message]}):
+            with self.lock:
+                self.pending_messages.append(message)
+
+    def get_data_messages(self) -> list[dict]:
+        with self.lock:
+            return list(self.received_messages)
+
+    def disconnect_clients(self) -> None:
+        """Abruptly closes all open client connections, e.g. to simulate a network outage."""
+        with self.lock:
+            connections = list(self.connections)
+        for websocket in connections:
+            websocket.socket.close()
+
+    def _push(self, channel_name: str, response: dict) -> bool:
+        with self.lock:
+            websockets = [websocket for websocket, channel in self.push_connections.items() if channel_name in channel]
+        for websocket in websockets:
+            self._send_response(websocket, response)
+        return len(websockets) > 0
+
+    def _handler(self, websocket) -> None:
+        with self.lock:
+            self.stats["num_connections"] += 1
+            self.connections.add(websocket)
+            self.send_locks[websocket] = threading.Lock()
+        try:
+            self._handle_frames(websocket)
+        finally:
+            with self.lock:
+                self.connections.discard(websocket)
+                self.push_connections.pop(websocket, None)
+                self.frame_codecs.pop(websocket, None)
+                self.send_locks.pop(websocket, None)
+
+    def _handle_frames(self, websocket) -> None:
+        channel = websocket.request.path
+        for frame in websocket:
+            with self.lock:
+                self.stats["num_frames"] += 1
+                self.stats["num_bytes"] += len(frame)
+                frame_codec = self.frame_codecs.get(websocket)
+            if frame_codec is not None:
+                frame = frame_codec.decode(frame)
+            for message in self._decode_frame(frame):
+                if message["h"] == "cm":
+                    if message["topic_id"] == "ctl_msg/subscribe_push":
+                        with self.lock:
+                            self.push_connections[websocket] = channel
+                    response = self._get_control_response(channel, message)
+                    self._send_response(websocket, response)
+                    if message["topic_id"] == "ctl_msg/handshake" and "frame_compression" in response["data"]:
+                        # Only the frames after the handshake response are compressed.
+                        with self.lock:
+                            self.frame_codecs[websocket] = FrameCodec(min_size_bytes=0)
+                else:
+                    with self.lock:
+                        self.stats["num_data_messages"] += 1
+                        if "timestamp" in message:
+                            self.data_latency.record(time.time() - message["timestamp"])
+                        if self.record_messages:
+                            self.received_messages.append(message)
+            if self.frame_delay_sec > 0 and message["h"] != "cm":
+                time.sleep(self.frame_delay_sec)
+
+    def _decode_frame(self, frame) -> list[dict]:
+        message = decode_message(frame) if is_binary_frame(frame) else json.loads(frame)
+        if message["h"] == "db":
+            return [{"h": "dm", "stream_uid": message["stream_uid"], **item} for item in message["messages"]]
+        return [message]
+
+    def _send_response(self, websocket, response: dict) -> None:
+        # Sensor data with arrays or bytes is returned as a binary frame.
+        sensor_data = response.get("sensor_data", [])
+        if any(is_buffer(event["data"]) for event in sensor_data):
+            response_bytes = encode_message(response)
+        else:
+            response_bytes = json.dumps(response).encode()
+        with self.lock:
+            frame_codec = self.frame_codecs.get(websocket)
+            send_lock = self.send_locks.get(websocket, threading.Lock())
+        # Compressed frames must be sent in the order they were compressed.
+        with send_lock:
+            websocket.send(frame_codec.encode(response_bytes) if frame_codec is not None else response_bytes)
+
+    def _get_control_response(self, channel: str, message: dict) -> dict:
+        with self.lock:
+            self.stats["num_control_messages"] += 1
+            if message["topic_id"] == "ctl_msg/fetch":
+                if "/sensors/subscriber" in channel:
+                    sensor_data, self.pending_sensor_data = self.pending_sensor_data, []
+                    return {"sensor_data": sensor_data}
+                if "/messaging" in channel:
+                    messages, self.pending_messages = self.pending_messages, []
+                    return {"messages": messages}
+            if message["topic_id"] == "ctl_msg/handshake" and self.frame_compression:
+                if message["data"].get("frame_compression") == self.frame_compression:
+                    return {"topic_id": message["topic_id"], "data": {"frame_compression": self.frame_compression}}
+        return {"topic_id": message["topic_id"], "data": {}}
+
+
+def _run_server(port_queue, stats_queue, stop_event) -> None:
+    server = LocalStreamerServer(record_messages=False)
+    port_queue.put(server.port)
+    stop_event.wait()
+    stats_queue.put(server.stats)
+    server.close()
+
+
+class LocalStreamerProcess:
+    """Runs a LocalStreamerServer in a separate process so it doesn't share the client's CPU time."""
+
+    def __init__(self) -> None:
+        self.port_queue = multiprocessing.Queue()
+        self.stats_queue = multiprocessing.Queue()
+        self.stop_event = multiprocessing.Event()
+        self.process = multiprocessing.Process(
+            target=_run_server, args=(self.port_queue, self.stats_queue, self.stop_event), daemon=True)
+        self.process.start()
+        self.endpoint = f"ws://127.0.0.1:{self.port_queue.get(timeout=10)}"
+
+    def close(self) -> dict:
+        """Stops the server and returns its stats."""
+        self.stop_event.set()
+        stats = self.stats_queue.get(timeout=10)
+        self.process.join()
+        return stats
+
+
+class LocalBroadcastServer:
+    """A local stand-in for the messaging broadcast HTTP endpoint, which counts the requests and messages it receives."""
+
+    def __init__(self, port: int = 0) -> None:
+        self.lock = threading.Lock()
+        self.stats = {"num_requests": 0, "num_messages": 0}
+        local_server = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with local_server.lock:
+                    local_server.stats["num_requests"] += 1
+                    local_server.stats["num_messages"] += len(payload["messages"])
+                body = json.dumps({"num_messages": len(payload["messages"])}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
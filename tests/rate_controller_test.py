@@ -0,0 +1,74 @@
+import pytest
+
+from archetypeai import _rate_controller
+from archetypeai._rate_controller import AdaptiveRateController, RATE_MODE_AGGREGATE
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.time = 0.0
+
+    def monotonic(self) -> float:
+        return self.time
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(_rate_controller.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def send_samples(controller: AdaptiveRateController, topic_id: str, num_samples: int) -> list:
+    sent = []
+    for index in range(num_samples):
+        should_send, data = controller.process("imu", topic_id, {"index": index, "value": float(index), "state": f"s{index}"})
+        if should_send:
+            sent.append(data)
+    return sent
+
+
+def test_rate_controller_sheds_low_priority_topics_first_and_restores_them_last(clock: FakeClock):
+    controller = AdaptiveRateController(target_latency_sec=1.0, min_keep_fraction=0.1, update_interval_sec=1.0)
+    controller.set_topic_priority("alarm*", priority=10)
+    controller.set_topic_priority("video", priority=-1)
+    clock.time += 1.0
+    assert controller.update(lambda: (0.0, 0, 0))
+    assert not controller.update(lambda: (0.0, 0, 0))
+    for topic_id in ("alarm_door", "imu", "video"):
+        send_samples(controller, topic_id, 100)
+    # 300 samples/sec against an uplink that only sent 100 and has a backlog of 20 beyond the target.
+    clock.time += 1.0
+    assert controller.update(lambda: (2.0, 120, 100))
+    assert controller.get_keep_fraction("alarm_door") == 0.8
+    assert controller.get_keep_fraction("imu") == 0.1
+    assert controller.get_keep_fraction("video") == 0.1
+    assert [data["index"] for data in send_samples(controller, "imu", 20)] == [0, 10]
+
+    # Headroom restores the highest priority downsampled topics first.
+    for num_sent_messages in (200, 300, 400):
+        clock.time += 1.0
+        assert controller.update(lambda: (0.0, 0, num_sent_messages))
+    assert controller.get_keep_fraction("alarm_door") == 1.0
+    assert controller.get_keep_fraction("imu") == pytest.approx(0.2)
+    assert controller.get_keep_fraction("video") == 0.1
+    stats = controller.get_stats()
+    assert stats["sensors"]["imu"]["video"]["priority"] == -1
+    assert stats["num_decreases"] == 1
+    assert stats["num_increases"] == 3
+
+
+def test_rate_controller_aggregates_the_skipped_samples(clock: FakeClock):
+    controller = AdaptiveRateController(target_latency_sec=1.0, update_interval_sec=1.0)
+    controller.set_topic_priority("imu", priority=0, mode=RATE_MODE_AGGREGATE)
+    clock.time += 1.0
+    controller.update(lambda: (0.0, 0, 0))
+    send_samples(controller, "imu", 100)
+    clock.time += 1.0
+    controller.update(lambda: (2.0, 25, 25))
+    assert controller.get_keep_fraction("imu") == 0.25
+    sent = send_samples(controller, "imu", 9)
+    # The first sample goes out at once, then the mean of every 4 samples.
+    assert [data["value"] for data in sent] == [0.0, 2.5, 6.5]
+    assert [data["state"] for data in sent] == ["s0", "s4", "s8"]
@@ -0,0 +1,120 @@
+import json
+import os
+from pathlib import Path
+import time
+
+from archetypeai import ArchetypeAI, ResultCache
+from archetypeai._result_cache import hash_payload
+
+
+def make_query_event(image_data, focus: str = "Describe the image.") -> dict:
+    return {
+        "type": "model.query",
+        "event_data": {
+            "model_version": "Newton::test",
+            "instruction": "Answer the question.",
+            "focus": focus,
+            "max_new_tokens": 32,
+            "data": [{"type": "base64_img", "base64_img": image_data}],
+        }
+    }
+
+
+def test_hash_payload_is_canonical():
+    payload_a = {"query": "q", "file_ids": ["a", "b"]}
+    payload_b = {"file_ids": ["a", "b"], "query": "q"}
+    assert hash_payload(payload_a) == hash_payload(payload_b)
+    assert hash_payload(payload_a) != hash_payload({"query": "q", "file_ids": ["b", "a"]})
+    assert hash_payload(payload_a, namespace="summarize") != hash_payload(payload_a, namespace="describe")
+    assert hash_payload({"img": b"\x00\x01"}) == hash_payload({"img": memoryview(b"\x00\x01")})
+    assert hash_payload({"img": b"\x00\x01"}) != hash_payload({"img": "\x00\x01"})
+
+
+def test_cache_hit_miss_and_lru_eviction(tmp_path: Path):
+    cache = ResultCache(tmp_path, max_size_bytes=250)
+    assert cache.get("a") is None
+    assert cache.put("a", {"value": "a" * 50})
+    assert cache.put("b", {"value": "b" * 50})
+    assert cache.get("a") == {"value": "a" * 50}
+    # Adding a third entry evicts "b" as "a" was used more recently.
+    assert cache.put("c", {"value": "c" * 50})
+    assert cache.get("b") is None
+    stats = cache.get_stats()
+    assert stats["num_hits"] == 1
+    assert stats["num_misses"] == 2
+    assert stats["num_evictions"] == 1
+    assert stats["size_bytes"] <= 250
+
+    # The index is rebuilt from disk.
+    reloaded_cache = ResultCache(tmp_path, max_size_bytes=250)
+    assert reloaded_cache.get("a") == {"value": "a" * 50}
+    assert reloaded_cache.get("c") == {"value": "c" * 50}
+
+
+def test_cache_ttl(tmp_path: Path):
+    cache = ResultCache(tmp_path, ttl_sec=0.05)
+    cache.put("a", {"value": 1})
+    assert cache.get("a") == {"value": 1}
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert not os.listdir(tmp_path)
+
+
+def test_client_process_event_and_capabilities_are_cached(tmp_path: Path, monkeypatch):
+    cache = ResultCache(tmp_path)
+    client = ArchetypeAI("fake_api_key", result_cache=cache)
+    assert client.lens.sessions.result_cache is cache
+    assert client.capabilities.result_cache is cache
+
+    num_requests = []
+    def fake_requests_post(api_endpoint, data_payload, additional_headers={}):
+        num_requests.append(api_endpoint)
+        return {"response": len(num_requests)}
+    monkeypatch.setattr(client.lens.sessions, "requests_post", fake_requests_post)
+    monkeypatch.setattr(client.capabilities, "requests_post", fake_requests_post)
+
+    event = make_query_event("aGVsbG8=")
+    assert client.lens.sessions.process_event("session_a", event) == {"response": 1}
+    assert client.lens.sessions.process_event("session_a", event) == {"response": 1}
+    # Sessions the client didn't create could run a different lens, so they don't share results.
+    assert client.lens.sessions.process_event("session_b", event) == {"response": 2}
+    assert client.lens.sessions.process_event("session_a", make_query_event("aGVsbG8=", "Count")) == {"response": 3}
+    assert client.lens.sessions.process_event("session_a", event, bypass_cache=True) == {"response": 4}
+    assert client.lens.sessions.process_event("session_a", event) == {"response": 4}
+    # Non-deterministic events are never cached.
+    client.lens.sessions.process_event("session_a", {"type": "session.validate"})
+    client.lens.sessions.process_event("session_a", {"type": "session.validate"})
+    assert len(num_requests) == 6
+
+    assert client.capabilities.summarize("q", ["a.mp4"]) == {"response": 7}
+    assert client.capabilities.summarize("q", ["a.mp4"]) == {"response": 7}
+    assert client.capabilities.describe("q", ["a.mp4"]) == {"response": 8}
+    assert cache.get_stats()["num_hits"] == 3
+
+
+def test_client_process_event_shares_results_across_sessions_of_the_same_lens(tmp_path: Path, monkeypatch):
+    client = ArchetypeAI("fake_api_key", result_cache=ResultCache(tmp_path))
+    sessions = client.lens.sessions
+    num_requests = []
+    def fake_requests_post(api_endpoint, data_payload, additional_headers={}):
+        if api_endpoint.endswith("lens/sessions/create"):
+            lens_id = json.loads(data_payload)["lens_id"]
+            return {"session_id": f"session_{len(sessions.session_cache_identities)}_{lens_id}"}
+        num_requests.append(api_endpoint)
+        return {"response": len(num_requests)}
+    monkeypatch.setattr(sessions, "requests_post", fake_requests_post)
+
+    session_a = sessions.create("lens_a")["session_id"]
+    session_b = sessions.create("lens_a")["session_id"]
+    session_c = sessions.create("lens_c")["session_id"]
+    event = make_query_event("aGVsbG8=")
+    assert sessions.process_event(session_a, event) == {"response": 1}
+    assert sessions.process_event(session_b, event) == {"response": 1}
+    assert sessions.process_event(session_c, event) == {"response": 2}
+    # A modified session no longer matches its lens, nor the results cached before the modification.
+    sessions.process_event(session_b, {"type": "session.modify", "event_data": {"focus": "trucks"}})
+    assert sessions.process_event(session_b, event) == {"response": 4}
+    assert sessions.process_event(session_b, event) == {"response": 4}
+    sessions.process_event(session_b, {"type": "session.modify", "event_data": {"focus": "cars"}})
+    assert sessions.process_event(session_b, event) == {"response": 6}
+    assert sessions.process_event(session_a, event) == {"response": 1}
@@ -0,0 +1,45 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from archetypeai._send_filter import SendFilter, SendFilterSet, is_unchanged
+
+_EXAMPLE_DATA_FILENAME = Path(__file__).parent.parent / "example_data" / "home_sensor_log.jsonl"
+
+
+def test_is_unchanged_applies_the_deadband_to_every_number():
+    assert is_unchanged({"accel": [0.1, 0.2], "state": "on"}, {"accel": [0.15, 0.2], "state": "on"}, deadband=0.1)
+    assert not is_unchanged({"accel": [0.1, 0.2], "state": "on"}, {"accel": [0.1, 0.2], "state": "off"}, deadband=0.1)
+    assert not is_unchanged([0.1, 0.2], [0.1, 0.5], deadband=0.1)
+    assert not is_unchanged(True, False, deadband=1.0)
+    assert is_unchanged({"timestamp": 1, "door": "open"}, {"timestamp": 2, "door": "open"}, ignore_keys=("timestamp",))
+    assert not is_unchanged({"door": "open"}, {"door": "open", "window": "open"})
+    np = pytest.importorskip("numpy")
+    assert is_unchanged(np.array([1.0, 2.0]), np.array([1.05, 2.0]), deadband=0.1)
+    assert not is_unchanged(np.array([1.0, 2.0]), np.array([1.0, 2.0, 3.0]))
+    assert is_unchanged({"accel": np.zeros(3)}, {"accel": np.zeros(3)})
+
+
+def test_send_filter_suppresses_repeated_home_sensor_rows():
+    rows = [json.loads(line) for line in _EXAMPLE_DATA_FILENAME.read_text().splitlines()]
+    send_filter = SendFilter(ignore_keys=("timestamp",), max_interval_sec=10.0)
+    sent_rows = [row for index, row in enumerate(rows) if send_filter.should_send("home", "sensors", row, 2.0 * index)]
+    changed_rows = [row for index, row in enumerate(rows) if index == 0 or any(
+        row[key] != rows[index - 1][key] for key in row if key != "timestamp")]
+    stats = send_filter.stats[("home", "sensors")]
+    assert len(sent_rows) == len(changed_rows) + stats["num_keepalives"]
+    assert stats["num_suppressed_samples"] == len(rows) - len(sent_rows)
+    assert stats["num_suppressed_samples"] > 0
+
+
+def test_send_filter_intervals_and_filter_set_matching():
+    send_filters = SendFilterSet()
+    send_filters.add_filter(SendFilter(topic_pattern="temperature", deadband=0.5, min_interval_sec=1.0, max_interval_sec=5.0))
+    values = [20.0, 20.2, 25.0, 25.1, 25.2, 25.3, 21.0]
+    timestamps = [0.0, 1.0, 1.5, 2.0, 3.0, 7.0, 8.0]
+    sent = [send_filters.should_send("room", "temperature", value, timestamp) for value, timestamp in zip(values, timestamps)]
+    # Within the deadband, under the min interval, sent on change, deadband, keepalive and on change.
+    assert sent == [True, False, True, False, False, True, True]
+    assert all(send_filters.should_send("room", "humidity", 50.0, 0.0) for _ in range(3))
+    assert send_filters.get_stats() == {"room": {"temperature": {"num_samples": 7, "num_suppressed_samples": 3, "num_keepalives": 1}}}
@@ -0,0 +1,44 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from archetypeai._sensor_windows import SensorRingBuffer, SensorWindowStore
+
+
+def test_ring_buffer_windows_are_contiguous_views():
+    buffer = SensorRingBuffer(capacity=5, num_channels=2)
+    for index in range(3):
+        buffer.append(float(index), [index, -index])
+    # A block that wraps around the end of the ring.
+    buffer.extend(np.arange(3.0, 9.0), np.stack([np.arange(3, 9), -np.arange(3, 9)], axis=1))
+    timestamps, values = buffer.get_last()
+    assert timestamps.tolist() == [4.0, 5.0, 6.0, 7.0, 8.0]
+    assert values[:, 0].tolist() == [4.0, 5.0, 6.0, 7.0, 8.0]
+    assert np.shares_memory(values, buffer.values)
+    assert buffer.get_last(2)[0].tolist() == [7.0, 8.0]
+    assert buffer.get_since(2.0)[0].tolist() == [6.0, 7.0, 8.0]
+    assert len(buffer) == 5
+
+    assert buffer.mean().tolist() == [6.0, -6.0]
+    assert buffer.min(window_sec=1.0).tolist() == [7.0, -8.0]
+    assert buffer.max(num_samples=3).tolist() == [8.0, -6.0]
+    assert np.allclose(buffer.rms(num_samples=2), np.sqrt((49 + 64) / 2))
+    grid_timestamps, grid_values = buffer.resample(2.0, window_sec=1.0)
+    assert grid_timestamps.tolist() == [7.0, 7.5, 8.0]
+    assert grid_values[:, 1].tolist() == [-7.0, -7.5, -8.0]
+    assert np.isnan(SensorRingBuffer(capacity=2, num_channels=1).mean()).all()
+
+
+def test_window_store_keeps_numeric_data_per_topic():
+    store = SensorWindowStore(capacity=4)
+    assert store.add("imu", "accel", [0.1, 0.2, 0.3], timestamp=1.0)
+    assert store.add("imu", "accel", np.ones((3, 3)), timestamp=2.0)
+    assert store.add("imu", "temperature", 21.5, timestamp=2.0)
+    assert not store.add("imu", "status", {"ok": True})
+    assert not store.add("imu", "accel", [1.0, 2.0])
+    timestamps, values = store.get_window("imu", "accel").get_last()
+    assert timestamps.tolist() == [1.0, 2.0, 2.0, 2.0]
+    assert values.shape == (4, 3)
+    assert store.get_window("imu", "temperature").get_last()[1].tolist() == [[21.5]]
+    assert sorted(store.get_keys()) == [("imu", "accel"), ("imu", "temperature")]
+    assert store.get_window("imu", "status") is None
@@ -0,0 +1,127 @@
+import pytest
+
+from archetypeai._sensors import SensorsApi
+from archetypeai._shm_ring import SharedMemoryRing
+from local_servers import LocalStreamerServer, wait_for
+
+
+def test_sensors_api_streams_each_sensor_on_its_own_connection(streamer_server: LocalStreamerServer, monkeypatch):
+    sensors = SensorsApi("fake_api_key", streamer_server.endpoint)
+    def fake_requests_post(api_endpoint, data_payload):
+        return {"stream_uid": f"stream_{len(sensors.sensors)}", "sensor_endpoint": streamer_server.endpoint}
+    monkeypatch.setattr(sensors, "requests_post", fake_requests_post)
+    assert sensors.register("sensor_0")
+    assert sensors.register("sensor_1")
+    assert len(sensors.streamers) == 2
+    assert wait_for(lambda: streamer_server.stats["num_connections"] == 2)
+    for index in range(5):
+        assert sensors.send("imu", {"index": index}, sensor_name="sensor_0")
+    assert sensors.send("imu", {"index": 0})
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 6)
+    assert wait_for(lambda: sensors.get_stats("sensor_0")["num_data_packets_sent"] == 5)
+    assert wait_for(lambda: sensors.get_stats()["num_data_packets_sent"] == 1)
+    assert sensors.get_outgoing_message_queue_size("sensor_0") == 0
+    with pytest.raises(AssertionError):
+        sensors.get_stats("sensor_2")
+    sensors.close()
+
+
+def test_sensors_api_shares_connections_between_sensors(streamer_server: LocalStreamerServer, monkeypatch):
+    sensors = SensorsApi("fake_api_key", streamer_server.endpoint, max_batch_size=8, share_connections=True)
+    def fake_requests_post(api_endpoint, data_payload):
+        return {"stream_uid": f"stream_{len(sensors.sensors)}", "sensor_endpoint": streamer_server.endpoint}
+    monkeypatch.setattr(sensors, "requests_post", fake_requests_post)
+    sensor_names = [f"sensor_{index}" for index in range(20)]
+    for sensor_name in sensor_names:
+        assert sensors.register(sensor_name)
+    assert len(sensors.streamers) == 1
+    assert streamer_server.stats["num_connections"] == 1
+
+    for index in range(10):
+        for sensor_name in sensor_names:
+            assert sensors.send("imu", {"index": index}, sensor_name=sensor_name)
+    assert sensors.send("imu", {"index": 10})
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 201)
+    messages = streamer_server.get_data_messages()
+    for sensor_index in range(20):
+        indices = [message["data"]["index"] for message in messages if message["stream_uid"] == f"stream_{sensor_index}"]
+        assert indices == list(range(11 if sensor_index == 19 else 10))
+
+    assert wait_for(lambda: sensors.get_sensor_stats()["sensor_19"]["num_messages"] == 11)
+    sensor_stats = sensors.get_sensor_stats()
+    assert sensor_stats["sensor_0"]["stream_uid"] == "stream_0"
+    assert sensor_stats["sensor_0"]["num_messages"] == 10
+    assert sensor_stats["sensor_0"]["bytes_per_sec"] > 0.0
+    sensors.close()
+
+
+def test_sensors_api_streams_samples_from_an_ingest_ring(streamer_server: LocalStreamerServer, monkeypatch):
+    sensors = SensorsApi("fake_api_key", streamer_server.endpoint)
+    def fake_requests_post(api_endpoint, data_payload):
+        return {"stream_uid": f"stream_{len(sensors.sensors)}", "sensor_endpoint": streamer_server.endpoint}
+    monkeypatch.setattr(sensors, "requests_post", fake_requests_post)
+    assert sensors.register("sensor_0")
+    assert sensors.register("sensor_1")
+    ring = SharedMemoryRing(num_producers=1, num_slots=8)
+    assert sensors.add_ingest_ring(ring)
+    producer = SharedMemoryRing.attach(ring.name, 0)
+    assert producer.put("imu", {"index": 0}, sensor_name="sensor_0")
+    # A sample of an unregistered sensor fails to send without stopping the drain.
+    assert producer.put("imu", {"index": -1}, sensor_name="unknown_sensor")
+    assert producer.put("imu", {"index": 1}, timestamp=5.0)
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 2)
+    assert sensors.get_ingest_stats() == {"num_ingested_samples": 2, "num_failed_samples": 1}
+    sensors.close()
+    messages = sorted(streamer_server.get_data_messages(), key=lambda message: message["data"]["index"])
+    assert [message["stream_uid"] for message in messages] == ["stream_0", "stream_1"]
+    assert messages[1]["timestamp"] == 5.0
+    producer.close()
+    ring.close()
+
+
+def test_sensors_api_send_filters_suppress_unchanged_data(streamer_server: LocalStreamerServer, monkeypatch):
+    sensors = SensorsApi("fake_api_key", streamer_server.endpoint)
+    monkeypatch.setattr(sensors, "requests_post", lambda api_endpoint, data_payload: {"stream_uid": "stream_0", "sensor_endpoint": streamer_server.endpoint})
+    assert sensors.register("door")
+    assert sensors.add_send_filter("state", ignore_keys=("timestamp",))
+    for index, state in enumerate(["closed", "closed", "open", "open", "closed"]):
+        assert sensors.send("state", {"timestamp": index, "front_door_sensor": state}, timestamp=float(index))
+        assert sensors.send("battery", 0.9, timestamp=float(index))
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 8)
+    sensors.close()
+    states = [message["data"]["front_door_sensor"] for message in streamer_server.get_data_messages() if message["topic_id"] == "state"]
+    assert states == ["closed", "open", "closed"]
+    assert sensors.get_send_filter_stats()["door"]["state"]["num_suppressed_samples"] == 2
+
+
+def test_sensors_api_reports_the_rate_of_downsampled_topics(streamer_server: LocalStreamerServer, monkeypatch):
+    sensors = SensorsApi("fake_api_key", streamer_server.endpoint, target_latency_sec=0.5)
+    monkeypatch.setattr(sensors, "requests_post", lambda api_endpoint, data_payload: {"stream_uid": "stream_0", "sensor_endpoint": streamer_server.endpoint})
+    assert sensors.register("imu_sensor")
+    assert sensors.set_topic_priority("accel", priority=1)
+    for index in range(10):
+        assert sensors.send("accel", [index, index, index])
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 10)
+    topic_stats = sensors.get_rate_stats()["sensors"]["imu_sensor"]["accel"]
+    assert topic_stats["priority"] == 1
+    assert topic_stats["keep_fraction"] == 1.0
+    sensors.close()
+
+
+def test_sensors_api_sends_array_batches_for_each_sensor(streamer_server: LocalStreamerServer, monkeypatch):
+    np = pytest.importorskip("numpy")
+    sensors = SensorsApi("fake_api_key", streamer_server.endpoint)
+    def fake_requests_post(api_endpoint, data_payload):
+        return {"stream_uid": f"stream_{len(sensors.sensors)}", "sensor_endpoint": streamer_server.endpoint}
+    monkeypatch.setattr(sensors, "requests_post", fake_requests_post)
+    assert sensors.register("sensor_0")
+    assert sensors.register("sensor_1")
+    values = np.arange(40.0).reshape(20, 2)
+    assert sensors.send_batch("imu", np.arange(20.0), values, sensor_name="sensor_0", chunk_size=8) == 20
+    assert sensors.send_batch("imu", np.arange(20.0), values) == 20
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 40)
+    messages = streamer_server.get_data_messages()
+    for sensor_index in range(2):
+        sensor_messages = [message for message in messages if message["stream_uid"] == f"stream_{sensor_index}"]
+        assert [message["data"] for message in sensor_messages] == values.tolist()
+    sensors.close()
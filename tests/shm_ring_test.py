@@ -0,0 +1,54 @@
+import multiprocessing
+import time
+
+import pytest
+
+from archetypeai._event_buffer import OVERFLOW_BLOCK
+from archetypeai._shm_ring import SharedMemoryRing
+
+
+def produce(ring_name: str, producer_index: int, num_samples: int) -> None:
+    ring = SharedMemoryRing.attach(ring_name, producer_index, OVERFLOW_BLOCK, put_timeout_sec=10.0)
+    for index in range(num_samples):
+        assert ring.put("imu", {"producer": producer_index, "index": index}, timestamp=float(index), sensor_name=f"device_{producer_index}")
+    ring.close()
+
+
+def test_ring_collects_samples_from_many_processes():
+    ring = SharedMemoryRing(num_producers=3, num_slots=16, slot_size_bytes=256)
+    producers = [multiprocessing.Process(target=produce, args=(ring.name, index, 200), daemon=True) for index in range(3)]
+    for producer in producers:
+        producer.start()
+    samples = []
+    deadline = time.time() + 30.0
+    while len(samples) < 600 and time.time() < deadline:
+        samples.extend(ring.get_batch(max_samples=32))
+    for producer in producers:
+        producer.join(timeout=max(deadline - time.time(), 1.0))
+        assert producer.exitcode == 0
+    assert len(samples) == 600, f"Timed out with {len(samples)} of 600 samples"
+    for producer_index in range(3):
+        producer_samples = [sample for sample in samples if sample[0] == f"device_{producer_index}"]
+        assert [data["index"] for _, _, data, _ in producer_samples] == list(range(200))
+        assert [timestamp for _, _, _, timestamp in producer_samples] == [float(index) for index in range(200)]
+    stats = ring.get_stats()
+    assert stats["num_samples_put"] == stats["num_samples_read"] == 600
+    assert stats["num_dropped_samples"] == 0
+    ring.close()
+
+
+def test_ring_counts_dropped_and_oversized_samples():
+    ring = SharedMemoryRing(num_producers=2, num_slots=4, slot_size_bytes=128)
+    producer = SharedMemoryRing.attach(ring.name, 1)
+    for index in range(6):
+        assert producer.put("imu", [index]) == (index < 4)
+    assert not producer.put("imu", "x" * 200)
+    assert len(ring) == 4
+    assert [data for _, _, data, _ in ring.get_batch()] == [[0], [1], [2], [3]]
+    assert producer.put("imu", [6])
+    stats = ring.get_stats()
+    assert stats["lanes"][1] == {"num_samples_put": 5, "num_dropped_samples": 2, "num_oversized_samples": 1, "num_pending_samples": 1}
+    with pytest.raises(AssertionError):
+        SharedMemoryRing.attach(ring.name, 2)
+    producer.close()
+    ring.close()
@@ -0,0 +1,390 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from archetypeai._dispatcher import CallbackDispatcher
+from archetypeai._socket_manager import SocketManager
+from local_servers import LocalStreamerServer, wait_for
+
+
+def start_streamer(server: LocalStreamerServer, **kwargs) -> SocketManager:
+    streamer = SocketManager("fake_api_key", server.endpoint, **kwargs)
+    streamer._start_stream("test_stream", server.endpoint, "sensors/streamer")
+    return streamer
+
+
+def test_socket_manager_sends_data_in_order(streamer_server: LocalStreamerServer):
+    streamer = start_streamer(streamer_server)
+    for index in range(100):
+        assert streamer.send("topic_a", {"index": index})
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 100)
+    messages = streamer_server.get_data_messages()
+    assert [message["data"]["index"] for message in messages] == list(range(100))
+    assert [message["message_id"] for message in messages] == list(range(100))
+    assert all(message["stream_uid"] == "test_stream" for message in messages)
+    assert not any(key.startswith("_") for message in messages for key in message)
+    assert wait_for(lambda: streamer.get_stats()["num_data_packets_sent"] == 100)
+    stats = streamer.get_stats()
+    for histogram_name in ("queue_wait_sec", "send_time_sec", "end_to_end_latency_sec"):
+        assert stats[histogram_name]["count"] == 100
+        assert 0.0 <= stats[histogram_name]["p50"] <= stats[histogram_name]["p99"] <= stats[histogram_name]["max"]
+    assert stats["topics"]["topic_a"]["num_messages"] == 100
+    assert stats["topics"]["topic_a"]["messages_per_sec"] > 0.0
+    assert stats["outgoing_message_latency"] == stats["send_time_sec"]["mean"]
+    assert streamer.get_queue_snapshot() == (stats["outgoing_message_queue_latency"], 0, 100)
+    streamer.close()
+
+
+def test_socket_manager_idle_worker_blocks_and_stops_promptly(streamer_server: LocalStreamerServer):
+    streamer = start_streamer(streamer_server, fetch_time_sec=10.0)
+    start_cpu_time = time.process_time()
+    time.sleep(0.5)
+    # An idle worker should block on the queue rather than spin.
+    assert time.process_time() - start_cpu_time < 0.2
+    start_time = time.time()
+    streamer.close()
+    assert time.time() - start_time < 1.0
+    assert not streamer.threads
+
+
+def test_socket_manager_batches_messages_into_frames(streamer_server: LocalStreamerServer):
+    streamer = start_streamer(streamer_server, max_batch_size=16, batch_linger_sec=0.05)
+    for index in range(100):
+        streamer.send(f"topic_{index % 3}", {"index": index})
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 100)
+    messages = streamer_server.get_data_messages()
+    assert [message["message_id"] for message in messages] == list(range(100))
+    assert [message["topic_id"] for message in messages] == [f"topic_{index % 3}" for index in range(100)]
+    # The worker records its stats after the frame is sent.
+    assert wait_for(lambda: streamer.get_stats()["num_data_packets_sent"] == 100)
+    stats = streamer.get_stats()
+    assert stats["max_batch_size"] <= 16
+    assert stats["num_frames_sent"] < 100
+    assert stats["avg_batch_size"] > 1.0
+    assert stats["frames_per_sec"] > 0.0
+    streamer.close()
+
+
+def test_socket_manager_sends_binary_arrays(streamer_server: LocalStreamerServer):
+    np = pytest.importorskip("numpy")
+    streamer = start_streamer(streamer_server, wire_format="binary", max_batch_size=8)
+    frames = [np.arange(index, index + 12, dtype=np.float32).reshape(3, 4) for index in range(20)]
+    for index, frame in enumerate(frames):
+        assert streamer.send("topic_a", {"frame": frame, "raw": b"\x01\x02", "index": index})
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 20)
+    messages = streamer_server.get_data_messages()
+    assert [message["message_id"] for message in messages] == list(range(20))
+    for message, frame in zip(messages, frames):
+        assert message["data"]["frame"].dtype == np.float32
+        assert np.array_equal(message["data"]["frame"], frame)
+        assert message["data"]["raw"] == b"\x01\x02"
+    streamer.close()
+
+
+def test_socket_manager_decodes_binary_sensor_data(streamer_server: LocalStreamerServer):
+    np = pytest.importorskip("numpy")
+    subscriber = SocketManager("fake_api_key", streamer_server.endpoint, fetch_time_sec=0.01)
+    streamer_server.queue_sensor_data("sensor_a", "topic_a", np.ones((2, 3), dtype=np.int16))
+    subscriber._start_stream("test_stream", streamer_server.endpoint, "sensors/subscriber")
+    assert wait_for(lambda: subscriber.get_incoming_data_queue_size() == 1)
+    sensor_name, topic_id, data = next(iter(subscriber.get_data()))
+    assert (sensor_name, topic_id) == ("sensor_a", "topic_a")
+    assert np.array_equal(data, np.ones((2, 3), dtype=np.int16))
+    subscriber.close()
+
+
+def test_socket_manager_shards_topics_across_workers(streamer_server: LocalStreamerServer):
+    streamer = start_streamer(streamer_server, num_worker_threads=3)
+    topic_ids = [f"topic_{index}" for index in range(12)]
+    for index in range(50):
+        for topic_id in topic_ids:
+            assert streamer.send(topic_id, {"index": index})
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 600)
+    messages = streamer_server.get_data_messages()
+    for topic_id in topic_ids:
+        assert [message["data"]["index"] for message in messages if message["topic_id"] == topic_id] == list(range(50))
+
+    # A failed worker's topics are taken over by the remaining workers.
+    streamer.streamer_sockets[0].close()
+    for topic_id in topic_ids:
+        assert streamer.send(topic_id, {"index": 50})
+    assert wait_for(lambda: streamer.get_stats()["num_rebalances"] == 1)
+    assert streamer.get_stats()["num_active_workers"] == 2
+    for topic_id in topic_ids:
+        assert streamer.send(topic_id, {"index": 51})
+    assert wait_for(lambda: sum(message["data"]["index"] == 51 for message in streamer_server.get_data_messages()) == 12)
+    assert len(streamer.threads) == 2
+    streamer.close()
+
+
+def block_sends(streamer: SocketManager) -> threading.Event:
+    """Blocks the streamer's data sends until the returned event is set."""
+    release = threading.Event()
+    send_data_message = streamer._send_data_message
+    def blocked_send_data_message(message, streamer_socket):
+        release.wait()
+        return send_data_message(message, streamer_socket)
+    streamer._send_data_message = blocked_send_data_message
+    return release
+
+
+def test_socket_manager_keeps_latest_messages_per_topic(streamer_server: LocalStreamerServer):
+    streamer = start_streamer(streamer_server, max_outgoing_queue_size=4, overflow_policy="keep_latest")
+    release = block_sends(streamer)
+    assert streamer.send("topic_a", 0)
+    assert wait_for(lambda: streamer.get_outgoing_message_queue_size() == 0)
+    for topic_id, data in [("topic_a", 1), ("topic_b", 1), ("topic_a", 2), ("topic_a", 3), ("topic_a", 4), ("topic_a", 5)]:
+        assert streamer.send(topic_id, data)
+    stats = streamer.get_stats()
+    assert stats["num_dropped_messages"] == 2
+    assert stats["num_dropped_messages_per_topic"] == {"topic_a": 2}
+    release.set()
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 5)
+    messages = streamer_server.get_data_messages()
+    assert [(message["topic_id"], message["data"]) for message in messages] == [
+        ("topic_a", 0), ("topic_b", 1), ("topic_a", 3), ("topic_a", 4), ("topic_a", 5)]
+    streamer.close()
+
+
+def test_socket_manager_close_discards_pending_messages_after_timeout(streamer_server: LocalStreamerServer):
+    streamer = start_streamer(streamer_server, max_outgoing_queue_size=2, overflow_policy="block", send_timeout_sec=0.01)
+    release = block_sends(streamer)
+    assert streamer.send("topic_a", 0)
+    assert wait_for(lambda: streamer.get_outgoing_message_queue_size() == 0)
+    assert streamer.send("topic_a", 1)
+    assert streamer.send("topic_b", 2)
+    # The queue is full and the uplink is stalled, so the producer times out.
+    assert not streamer.send("topic_b", 3)
+    threading.Timer(0.3, release.set).start()
+    start_time = time.time()
+    report = streamer.close(timeout=0.1)
+    assert time.time() - start_time < 2.0
+    assert report == {"num_discarded_messages": 2, "num_discarded_messages_per_topic": {"topic_a": 1, "topic_b": 1}}
+    assert streamer.get_stats()["num_dropped_messages_per_topic"] == {"topic_b": 1}
+    assert not streamer.threads
+
+
+def test_socket_manager_spool_replays_messages_after_reconnect(streamer_server: LocalStreamerServer, tmp_path):
+    streamer = start_streamer(streamer_server, spool_dir=tmp_path, fetch_time_sec=0.2)
+    for index in range(50):
+        assert streamer.send("topic_a", {"index": index})
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 50)
+    streamer_server.disconnect_clients()
+    for index in range(50, 100):
+        assert streamer.send("topic_a", {"index": index})
+    assert wait_for(lambda: {message["message_id"] for message in streamer_server.get_data_messages()} == set(range(100)))
+    assert wait_for(lambda: streamer.get_stats()["spool_depth"] == 0)
+    assert streamer.get_stats()["num_reconnects"] == 1
+    assert streamer.close()["num_spooled_messages"] == 0
+    assert list(tmp_path.glob("*.seg")) == []
+
+
+def test_socket_manager_reconnect_drops_the_frame_codec_of_the_dead_socket(tmp_path):
+    compressing_server = LocalStreamerServer(frame_compression="zlib")
+    streamer = start_streamer(compressing_server, spool_dir=tmp_path, fetch_time_sec=0.2, frame_compression="zlib")
+    assert streamer.send("topic_a", {"index": 0})
+    assert wait_for(lambda: len(compressing_server.get_data_messages()) == 1)
+    compressing_server.disconnect_clients()
+    assert streamer.send("topic_a", {"index": 1})
+    assert wait_for(lambda: streamer.get_stats()["num_reconnects"] == 1)
+    assert list(streamer.frame_codecs) == streamer.streamer_sockets
+    streamer.close()
+    compressing_server.close()
+
+
+def test_socket_manager_spool_requires_a_single_worker(tmp_path):
+    with pytest.raises(AssertionError):
+        SocketManager("fake_api_key", "ws://127.0.0.1:1", num_worker_threads=2, spool_dir=tmp_path)
+
+
+def test_socket_manager_spool_confirms_messages_after_an_encoding_error(streamer_server: LocalStreamerServer, tmp_path):
+    streamer = start_streamer(streamer_server, spool_dir=tmp_path, fetch_time_sec=0.05)
+    assert streamer.send("topic_a", {"index": 0})
+    with pytest.raises(TypeError):
+        streamer.send("topic_a", {"index": object()})
+    for index in range(1, 4):
+        assert streamer.send("topic_a", {"index": index})
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 4)
+    assert [message["message_id"] for message in streamer_server.get_data_messages()] == list(range(4))
+    # Without a gap in the message ids every sent message gets confirmed.
+    assert wait_for(lambda: streamer.get_stats()["spool_depth"] == 0)
+    assert streamer.close()["num_spooled_messages"] == 0
+
+
+def test_socket_manager_adapts_fetch_interval(streamer_server: LocalStreamerServer):
+    subscriber = SocketManager("fake_api_key", streamer_server.endpoint, fetch_time_sec=0.01, max_fetch_time_sec=0.2)
+    subscriber._start_stream("test_stream", streamer_server.endpoint, "sensors/subscriber")
+    # The fetch interval backs off while idle.
+    assert wait_for(lambda: subscriber.get_stats()["fetch_interval_sec"] == 0.2)
+    num_fetches = subscriber.get_stats()["num_fetches"]
+    time.sleep(0.5)
+    assert subscriber.get_stats()["num_fetches"] - num_fetches <= 4
+    # And drops back to polling fast once data flows.
+    streamer_server.queue_sensor_data("sensor_a", "topic_a", {"index": 0})
+    assert wait_for(lambda: subscriber.get_incoming_data_queue_size() == 1)
+    assert wait_for(lambda: subscriber.get_stats()["fetch_interval_sec"] < 0.2)
+    subscriber.close()
+
+
+def test_socket_manager_push_mode_reads_data_continuously(streamer_server: LocalStreamerServer):
+    subscriber = SocketManager("fake_api_key", streamer_server.endpoint, push_mode=True)
+    subscriber._start_stream("test_stream", streamer_server.endpoint, "sensors/subscriber")
+    for index in range(10):
+        streamer_server.queue_sensor_data("sensor_a", "topic_a", {"index": index})
+        assert wait_for(lambda: subscriber.get_incoming_data_queue_size() == index + 1, timeout_sec=0.5)
+    assert [data["index"] for _, _, data in subscriber.get_data()] == list(range(10))
+    assert subscriber.get_stats()["num_fetches"] == 0
+    start_time = time.time()
+    subscriber.close()
+    assert time.time() - start_time < 1.0
+    assert not subscriber.reader_threads
+
+
+def test_socket_manager_dispatches_data_to_handlers(streamer_server: LocalStreamerServer):
+    dispatcher = CallbackDispatcher()
+    received_events = []
+    dispatcher.add_handler(lambda *event: received_events.append(event), topic_pattern="imu/*")
+    subscriber = SocketManager("fake_api_key", streamer_server.endpoint, push_mode=True, dispatcher=dispatcher)
+    subscriber._start_stream("test_stream", streamer_server.endpoint, "sensors/subscriber")
+    for index in range(10):
+        streamer_server.queue_sensor_data("sensor_a", "imu/accel", {"index": index})
+    streamer_server.queue_sensor_data("sensor_a", "camera", {"index": 0})
+    assert wait_for(lambda: len(received_events) == 10 and subscriber.get_incoming_data_queue_size() == 1)
+    assert [data["index"] for _, _, data in received_events] == list(range(10))
+    assert list(subscriber.get_data()) == [("sensor_a", "camera", {"index": 0})]
+    subscriber.close()
+    dispatcher.close()
+
+
+def test_socket_manager_writes_numeric_data_to_windows(streamer_server: LocalStreamerServer):
+    pytest.importorskip("numpy")
+    from archetypeai._sensor_windows import SensorWindowStore
+    window_store = SensorWindowStore(capacity=8)
+    subscriber = SocketManager("fake_api_key", streamer_server.endpoint, push_mode=True, window_store=window_store)
+    subscriber._start_stream("test_stream", streamer_server.endpoint, "sensors/subscriber")
+    for index in range(10):
+        streamer_server.queue_sensor_data("sensor_a", "accel", [index, 2 * index, 3 * index])
+    streamer_server.queue_sensor_data("sensor_a", "status", {"ok": True})
+    assert wait_for(lambda: window_store.get_window("sensor_a", "accel") is not None and window_store.get_window("sensor_a", "accel").num_samples == 10)
+    window = window_store.get_window("sensor_a", "accel")
+    assert window.get_last(3)[1][:, 2].tolist() == [21.0, 24.0, 27.0]
+    assert window.mean().tolist() == [5.5, 11.0, 16.5]
+    assert wait_for(lambda: subscriber.get_incoming_data_queue_size() == 1)
+    assert list(subscriber.get_data()) == [("sensor_a", "status", {"ok": True})]
+    subscriber.close()
+
+
+def test_socket_manager_starts_quickly_and_times_out_unready_servers(streamer_server: LocalStreamerServer):
+    start_time = time.time()
+    streamer = start_streamer(streamer_server, num_worker_threads=4)
+    assert time.time() - start_time < 0.5
+    assert streamer_server.stats["num_connections"] == 4
+    streamer.close()
+
+    # A server that accepts connections but never answers the websocket upgrade.
+    with socket.create_server(("127.0.0.1", 0)) as silent_server:
+        endpoint = f"ws://127.0.0.1:{silent_server.getsockname()[1]}"
+        streamer = SocketManager("fake_api_key", endpoint, num_worker_threads=2, connect_timeout_sec=0.2)
+        start_time = time.time()
+        with pytest.raises(ValueError):
+            streamer._start_stream("test_stream", endpoint, "sensors/streamer")
+        assert time.time() - start_time < 2.0
+        assert streamer.streamer_sockets == []
+
+
+def test_socket_manager_negotiates_frame_compression(streamer_server: LocalStreamerServer):
+    # The default server doesn't support compression, so frames are sent raw.
+    streamer = start_streamer(streamer_server, frame_compression="zlib")
+    assert streamer.frame_codecs == {}
+    streamer.close()
+
+    compressing_server = LocalStreamerServer(frame_compression="zlib")
+    streamer = start_streamer(compressing_server, frame_compression="zlib", max_batch_size=16, compression_min_size_bytes=64)
+    row = {"kitchen_faucet_sensor": "off", "front_door_sensor": "closed", "living_room_sensor": "empty"}
+    for index in range(200):
+        assert streamer.send("home", {"index": index, **row})
+    assert wait_for(lambda: len(compressing_server.get_data_messages()) == 200)
+    assert [message["data"]["index"] for message in compressing_server.get_data_messages()] == list(range(200))
+    stats = streamer.get_stats()["compression"]
+    assert stats["num_compressed_frames_sent"] > 0
+    assert stats["compression_ratio_sent"] > 2.0
+    assert stats["num_frames_received"] > 0
+    streamer.close()
+
+    subscriber = SocketManager("fake_api_key", compressing_server.endpoint, push_mode=True, frame_compression="zlib")
+    subscriber._start_stream("test_stream", compressing_server.endpoint, "sensors/subscriber")
+    for index in range(5):
+        compressing_server.queue_sensor_data("home", "state", {"index": index, **row})
+    assert wait_for(lambda: subscriber.get_incoming_data_queue_size() == 5)
+    assert [data["index"] for _, _, data in subscriber.get_data()] == list(range(5))
+    subscriber.close()
+    compressing_server.close()
+
+
+def test_socket_manager_send_is_safe_from_many_producers(streamer_server: LocalStreamerServer):
+    streamer = start_streamer(streamer_server, num_worker_threads=4)
+    def produce(producer_index: int):
+        for index in range(200):
+            assert streamer.send(f"topic_{producer_index}", {"index": index})
+    producers = [threading.Thread(target=produce, args=(producer_index,)) for producer_index in range(16)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 3200)
+    messages = streamer_server.get_data_messages()
+    assert sorted(message["message_id"] for message in messages) == list(range(3200))
+    for producer_index in range(16):
+        topic_messages = [message for message in messages if message["topic_id"] == f"topic_{producer_index}"]
+        assert [message["data"]["index"] for message in topic_messages] == list(range(200))
+    streamer.close()
+
+
+def test_socket_manager_sends_array_batches(streamer_server: LocalStreamerServer):
+    np = pytest.importorskip("numpy")
+    streamer = start_streamer(streamer_server)
+    assert streamer.send("topic_a", {"index": 0})
+    values = np.arange(1000, dtype=np.float32).reshape(500, 2) / 4
+    timestamps = np.linspace(100.0, 105.0, 500)
+    assert streamer.send_batch("topic_b", timestamps, values, chunk_size=64) == 500
+    assert streamer.send_batch("topic_c", None, np.arange(10)) == 10
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 511)
+    messages = streamer_server.get_data_messages()
+    assert [message["message_id"] for message in messages] == list(range(511))
+    assert [message["data"] for message in messages[1:501]] == values.tolist()
+    assert [message["timestamp"] for message in messages[1:501]] == timestamps.tolist()
+    assert [message["data"] for message in messages[501:]] == list(range(10))
+    assert all(message["stream_uid"] == "test_stream" for message in messages)
+    assert wait_for(lambda: streamer.get_stats()["num_data_packets_sent"] == 511)
+    assert streamer.get_stats()["topics"]["topic_b"]["num_messages"] == 500
+    streamer.close()
+
+
+def test_socket_manager_sends_binary_array_batches(streamer_server: LocalStreamerServer):
+    np = pytest.importorskip("numpy")
+    streamer = start_streamer(streamer_server, wire_format="binary")
+    values = np.arange(300, dtype=np.int64).reshape(100, 3)
+    assert streamer.send_batch("topic_a", np.arange(100.0), values, chunk_size=32) == 100
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 100)
+    messages = streamer_server.get_data_messages()
+    assert [message["message_id"] for message in messages] == list(range(100))
+    assert [message["timestamp"] for message in messages] == list(np.arange(100.0))
+    for message, row in zip(messages, values):
+        assert np.array_equal(message["data"], row)
+    streamer.close()
+
+
+@pytest.mark.parametrize("wire_format", ["json", "binary"])
+def test_socket_manager_sends_single_row_chunks(streamer_server: LocalStreamerServer, wire_format: str):
+    np = pytest.importorskip("numpy")
+    streamer = start_streamer(streamer_server, wire_format=wire_format)
+    assert streamer.send_batch("topic_a", np.arange(3.0), np.arange(6.0).reshape(3, 2), chunk_size=2) == 3
+    assert streamer.send_batch("topic_b", [3.0], np.array([[6.0, 7.0]])) == 1
+    assert wait_for(lambda: len(streamer_server.get_data_messages()) == 4)
+    messages = streamer_server.get_data_messages()
+    assert [message["message_id"] for message in messages] == list(range(4))
+    assert [message["timestamp"] for message in messages] == [0.0, 1.0, 2.0, 3.0]
+    assert [list(message["data"]) for message in messages] == np.arange(8.0).reshape(4, 2).tolist()
+    streamer.close()
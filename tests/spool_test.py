@@ -0,0 +1,67 @@
+import json
+
+from archetypeai._socket_manager import OutgoingMessage
+from archetypeai._spool import MessageSpool
+
+
+def create_spool(spool_dir, **kwargs) -> MessageSpool:
+    return MessageSpool(spool_dir, lambda message: json.dumps(message.data).encode(),
+                        lambda payload: OutgoingMessage("topic_a", json.loads(payload), 0.0, -1, "stream", 0.0), **kwargs)
+
+
+def put_messages(spool: MessageSpool, message_ids) -> None:
+    for message_id in message_ids:
+        assert spool.put(OutgoingMessage("topic_a", {"index": message_id}, 0.0, message_id, "stream", 1.0))
+
+
+def test_spool_reads_confirms_and_trims_segments(tmp_path):
+    spool = create_spool(tmp_path, segment_size_bytes=256)
+    put_messages(spool, range(100))
+    assert len(spool) == 100
+    num_segments = spool.get_stats()["spool_num_segments"]
+    assert num_segments > 1
+    messages = spool.get_batch(60)
+    assert [message.data["index"] for message in messages] == list(range(60))
+    assert messages[0].enqueue_time == 1.0
+    spool.confirm(range(10, 50))
+    assert spool.get_depth() == 100
+    spool.confirm(range(10))
+    assert spool.get_depth() == 50
+    assert spool.get_stats()["spool_num_segments"] < num_segments
+
+    # Rewinding replays the read but unconfirmed messages in order.
+    assert spool.rewind() == 10
+    assert [message.data["index"] for message in spool.get_batch()] == list(range(50, 100))
+    spool.confirm(range(50, 100))
+    assert spool.get_depth() == 0
+    assert spool.get_stats()["spool_num_segments"] == 0
+    assert list(tmp_path.glob("*.seg")) == []
+
+
+def test_spool_replays_unconfirmed_messages_after_restart(tmp_path):
+    spool = create_spool(tmp_path, segment_size_bytes=256)
+    put_messages(spool, range(30))
+    spool.get_batch()
+    spool.confirm(range(20))
+    spool.flush()
+    # Simulate a crash while a record was being written.
+    last_segment = sorted(tmp_path.glob("*.seg"))[-1]
+    with open(last_segment, "ab") as file_handle:
+        file_handle.write(b"\x10\x00")
+
+    spool = create_spool(tmp_path, segment_size_bytes=256)
+    assert spool.next_message_id == 30
+    assert [message.data["index"] for message in spool.get_batch()] == list(range(20, 30))
+    put_messages(spool, range(30, 35))
+    assert [message.data["index"] for message in spool.get_batch()] == list(range(30, 35))
+
+
+def test_spool_drops_oldest_segments_over_disk_cap(tmp_path):
+    spool = create_spool(tmp_path, segment_size_bytes=256, max_disk_bytes=1024)
+    put_messages(spool, range(200))
+    stats = spool.get_stats()
+    assert stats["spool_bytes"] <= 1024
+    assert stats["num_dropped_events"] > 0
+    messages = spool.get_batch()
+    assert len(messages) == 200 - stats["num_dropped_events"]
+    assert messages[-1].data["index"] == 199
@@ -0,0 +1,284 @@
+from typing import Union
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from archetypeai._capture import EventCaptureWriter
+from archetypeai._sse import CaptureReplayReader, LazyEvent, ServerSideEventsReader, SseEventFilter, is_heartbeat_event
+from archetypeai._sse_hub import SseConsumerHub
+
+
+class LocalSseServer:
+    """A local stand-in for the lens SSE consumer endpoint that streams a fixed list of events.
+
+    Each event is sent with its index as the event id. If drop_after is set, the connection is closed
+    after that many events and the next request resumes from its Last-Event-ID header, replaying
+    num_replayed events the client has already seen. With fail_mid_stream, the response declares a
+    longer body than it sends, so dropped connections raise in the client rather than end cleanly.
+    """
+
+    def __init__(
+        self,
+        events: Union[list[dict], dict],
+        event_delay_sec: float = 0.0,
+        drop_after: int = 0,
+        num_replayed: int = 0,
+        fail_mid_stream: bool = False,
+        ) -> None:
+        self.events = events
+        self.fail_mid_stream = fail_mid_stream
+        self.event_delay_sec = event_delay_sec
+        self.drop_after = drop_after
+        self.num_replayed = num_replayed
+        self.request_headers = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.request_headers.append(dict(self.headers))
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                if server.fail_mid_stream:
+                    self.send_header("Content-Length", str(1 << 30))
+                self.end_headers()
+                server.stream_events(self)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.endpoint = f"http://127.0.0.1:{self.httpd.server_address[1]}/consumer"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stream_events(self, handler: BaseHTTPRequestHandler) -> None:
+        # A dict of events streams a different list per session, keyed by the last path segment.
+        events = self.events
+        if isinstance(events, dict):
+            events = events[handler.path.rstrip("/").split("/")[-1]]
+        last_event_id = handler.headers.get("Last-Event-ID", None)
+        first_index = 0 if last_event_id is None else max(int(last_event_id) + 1 - self.num_replayed, 0)
+        last_index = len(events) if self.drop_after <= 0 else first_index + self.drop_after
+        for index in range(first_index, min(last_index, len(events))):
+            event = events[index]
+            handler.wfile.write(f"id: {index}\ndata: {json.dumps(event)}\n\n".encode())
+            handler.wfile.flush()
+            if self.event_delay_sec > 0:
+                time.sleep(self.event_delay_sec)
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_events(num_events: int, heartbeat_every: int = 0) -> list[dict]:
+    events = []
+    for index in range(num_events):
+        if heartbeat_every and index % heartbeat_every == 0:
+            events.append({"type": "sse.stream.heartbeat"})
+        events.append({"type": "inference.result", "event_data": {"index": index}})
+    events.append({"type": "sse.stream.end"})
+    return events
+
+
+@pytest.fixture
+def sse_server():
+    servers = []
+    def create_server(events: list[dict], **kwargs) -> LocalSseServer:
+        servers.append(LocalSseServer(events, **kwargs))
+        return servers[-1]
+    yield create_server
+    for server in servers:
+        server.close()
+
+
+def test_sse_reader_blocking_read_returns_all_events(sse_server):
+    server = sse_server(make_events(50, heartbeat_every=10), event_delay_sec=0.001)
+    reader = ServerSideEventsReader(server.endpoint, {}, max_queue_size=4)
+    events = list(reader.read(block=True))
+    reader.close()
+    # A small queue applies backpressure to the socket reader rather than losing events.
+    indices = [event["event_data"]["index"] for event in events if event["type"] == "inference.result"]
+    assert indices == list(range(50))
+    assert events[-1]["type"] == "sse.stream.end"
+    stats = reader.get_stats()
+    assert stats["num_dropped_events"] == 0
+    assert stats["queue_high_water_mark"] <= 4
+
+
+def test_sse_reader_read_batch_and_async_iterator(sse_server):
+    server = sse_server(make_events(20))
+    reader = ServerSideEventsReader(server.endpoint, {})
+    first_batch = reader.read_batch(max_events=5, timeout=5.0)
+    assert 1 <= len(first_batch) <= 5
+
+    async def consume() -> list[dict]:
+        return [event async for event in reader]
+
+    remaining_events = asyncio.run(consume())
+    reader.close()
+    assert len(first_batch) + len(remaining_events) == 21
+
+
+def test_sse_reader_resumes_from_last_event_id(sse_server):
+    server = sse_server(make_events(30), drop_after=7, num_replayed=2)
+    reader = ServerSideEventsReader(server.endpoint, {}, initial_backoff_sec=0.01, max_backoff_sec=0.05)
+    start_time = time.time()
+    events = list(reader.read(block=True))
+    run_time = time.time() - start_time
+    reader.close()
+
+    indices = [event["event_data"]["index"] for event in events if event["type"] == "inference.result"]
+    assert indices == list(range(30))
+    assert events[-1]["type"] == "sse.stream.end"
+    resumed_ids = [headers.get("Last-Event-ID", None) for headers in server.request_headers]
+    assert resumed_ids[0] is None
+    assert resumed_ids[1:] == ["6", "11", "16", "21", "26"]
+
+    stats = reader.get_stats()
+    assert stats["num_reconnects"] == 5
+    assert stats["num_duplicate_events"] == 10
+    assert 0.0 < stats["max_gap_sec"] < 1.0
+    assert run_time < 5.0
+
+
+def test_sse_reader_resumes_after_connection_errors_mid_stream(sse_server):
+    server = sse_server(make_events(30), drop_after=4, fail_mid_stream=True)
+    reader = ServerSideEventsReader(server.endpoint, {}, initial_backoff_sec=0.01, max_backoff_sec=0.05, max_outage_sec=1.0)
+    events = list(reader.read(block=True))
+    reader.close()
+    # Each of the 7 drops raised, but events arrived in between, so the outages never add up.
+    assert [event["event_data"]["index"] for event in events if event["type"] == "inference.result"] == list(range(30))
+    assert events[-1]["type"] == "sse.stream.end"
+    assert reader.get_stats()["num_reconnects"] == 7
+
+
+def test_sse_reader_stops_after_max_outage(sse_server):
+    server = sse_server(make_events(0))
+    endpoint = server.endpoint
+    server.close()
+    start_time = time.time()
+    reader = ServerSideEventsReader(endpoint, {}, initial_backoff_sec=0.01, max_backoff_sec=0.05, max_outage_sec=0.3)
+    assert list(reader.read(block=True)) == []
+    assert 0.3 <= time.time() - start_time < 2.0
+    assert not reader.is_running()
+    reader.close()
+
+
+def test_sse_hub_resumes_after_connection_errors_mid_stream(sse_server):
+    server = sse_server({"session_a": make_events(20)}, drop_after=3, fail_mid_stream=True)
+    hub = SseConsumerHub(server.endpoint.rsplit("/", 1)[0], {}, initial_backoff_sec=0.01, max_backoff_sec=0.05, max_outage_sec=1.0)
+    hub.add_session("session_a")
+    events = [event for _, event in hub.read(block=True)]
+    hub.close()
+    assert [event["event_data"]["index"] for event in events if event["type"] == "inference.result"] == list(range(20))
+
+
+def test_sse_hub_merges_sessions_fairly_on_one_thread(sse_server):
+    session_events = {
+        "noisy_session": make_events(200),
+        "quiet_session_a": make_events(5),
+        "quiet_session_b": make_events(5),
+    }
+    server = sse_server(session_events, drop_after=50)
+    threads = set(threading.enumerate())
+    hub = SseConsumerHub(server.endpoint.rsplit("/", 1)[0], {}, max_queue_size_per_session=16)
+    for session_id in session_events:
+        hub.add_session(session_id)
+    # Ignore the local server's request handler threads.
+    new_threads = [thread for thread in threading.enumerate() if thread not in threads and "process_request" not in thread.name]
+    assert new_threads == [hub.worker]
+
+    # Wait for every session to buffer some events so the merge order is deterministic.
+    deadline = time.time() + 5.0
+    while min(len(session.event_buffer) for session in hub.sessions.values()) < 6 and time.time() < deadline:
+        time.sleep(0.01)
+    first_events = list(hub.read(max_num_events=18))
+    first_session_ids = [session_id for session_id, _ in first_events]
+    for session_id in session_events:
+        assert first_session_ids.count(session_id) == 6
+
+    events = first_events + list(hub.read(block=True))
+    for session_id, expected_events in session_events.items():
+        received_events = [event for event_session_id, event in events if event_session_id == session_id]
+        assert received_events == expected_events
+    assert hub.get_stats()["noisy_session"]["num_reconnects"] == 4
+    assert hub.close()
+
+
+def test_sse_event_filter_skips_unwanted_events():
+    event_filter = SseEventFilter(event_types=["inference.result"], fields=["event_data"])
+    # Unwanted events are rejected from the type prefix alone, so invalid JSON is never decoded.
+    assert event_filter.decode('{"type": "session.log", "event_data": {') == ("session.log", None)
+    assert event_filter.decode('{"type": "sse.stream.heartbeat"}') == ("sse.stream.heartbeat", None)
+    event_type, event_data = event_filter.decode('{"type": "inference.result", "event_data": 1, "extra": 2}')
+    assert event_type == "inference.result"
+    assert event_data == {"type": "inference.result", "event_data": 1}
+    # Payloads that don't start with the type are fully decoded.
+    assert event_filter.decode('{"extra": 2, "type": "session.log"}') == ("session.log", None)
+
+    lazy_filter = SseEventFilter(lazy_decode=True, forward_heartbeats=True)
+    event_type, event_data = lazy_filter.decode('{"type": "inference.result", "event_data": {"index": 1}}')
+    assert isinstance(event_data, LazyEvent)
+    assert event_data["type"] == "inference.result"
+    assert event_data.get("missing", None) is None
+    assert event_data == {"type": "inference.result", "event_data": {"index": 1}}
+    assert is_heartbeat_event(lazy_filter.decode('{"type": "sse.stream.heartbeat"}')[1])
+
+
+def test_sse_reader_filters_events_and_consumes_heartbeats(sse_server):
+    events = make_events(20, heartbeat_every=2)
+    events.insert(5, {"type": "session.log", "event_data": "ignored"})
+    server = sse_server(events)
+    reader = ServerSideEventsReader(server.endpoint, {}, event_types=["inference.result"], lazy_decode=True)
+    received_events = list(reader.read(block=True))
+    reader.close()
+    assert [event["event_data"]["index"] for event in received_events] == list(range(20))
+    stats = reader.get_stats()
+    assert stats["num_heartbeats"] == 10
+    # The session.log event and the filtered sse.stream.end event.
+    assert stats["num_filtered_events"] == 2
+
+
+def test_sse_reader_capture_and_replay(sse_server, tmp_path):
+    capture_filename = tmp_path / "capture.jsonl.gz"
+    events = make_events(40, heartbeat_every=4)
+    server = sse_server(events, event_delay_sec=0.002)
+    reader = ServerSideEventsReader(server.endpoint, {}, capture_filename=capture_filename)
+    live_events = list(reader.read(block=True))
+    reader.close()
+
+    # Every raw event is captured, including heartbeats the live reader consumed.
+    replay_reader = CaptureReplayReader(capture_filename, speed=0)
+    assert replay_reader.get_num_events() == len(events)
+    assert list(replay_reader.read(block=True)) == live_events
+    assert not replay_reader.is_running()
+
+    replay_reader = CaptureReplayReader(capture_filename, speed=0, forward_heartbeats=True)
+    assert list(replay_reader) == events
+
+    # Seek into the capture and filter the replay.
+    replay_reader = CaptureReplayReader(capture_filename, speed=0, start_event_index=45, event_types=["inference.result"])
+    assert [event["event_data"]["index"] for event in replay_reader] == list(range(36, 40))
+
+    # Paced replay releases events at the original rate.
+    replay_reader = CaptureReplayReader(capture_filename, speed=1.0)
+    start_time = time.time()
+    assert len(list(replay_reader.read(block=True))) == len(live_events)
+    assert time.time() - start_time >= 0.05
+
+
+def test_capture_writer_appends_across_runs(tmp_path):
+    capture_filename = tmp_path / "capture.jsonl.gz"
+    for run_index in range(2):
+        writer = EventCaptureWriter(capture_filename, events_per_chunk=3)
+        for index in range(5):
+            writer.write(json.dumps({"type": "run", "index": run_index * 5 + index}))
+        writer.close()
+    replay_reader = CaptureReplayReader(capture_filename, speed=0, start_event_index=4)
+    assert [event["index"] for event in replay_reader] == list(range(4, 10))
@@ -0,0 +1,54 @@
+import random
+
+from archetypeai._socket_manager import OutgoingMessage
+from archetypeai._stream_stats import LatencyHistogram, SlidingWindowCounter, StreamStatsRecorder, merge_stream_stats
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram(relative_error=0.05)
+    values = [random.uniform(0.001, 0.1) for _ in range(10_000)]
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    stats = histogram.get_stats()
+    assert stats["count"] == 10_000
+    assert stats["max"] == values[-1]
+    for percentile in (50, 90, 99):
+        exact_value = values[int(percentile / 100 * len(values)) - 1]
+        assert abs(stats[f"p{percentile}"] - exact_value) <= 0.06 * exact_value
+
+    merged_histogram = LatencyHistogram()
+    merged_histogram.merge(histogram)
+    merged_histogram.merge(histogram)
+    assert merged_histogram.get_stats()["count"] == 20_000
+    assert merged_histogram.get_stats()["p50"] == stats["p50"]
+
+
+def test_sliding_window_counter_expires_old_buckets():
+    counter = SlidingWindowCounter(window_sec=10.0, bucket_sec=1.0)
+    for second in range(20):
+        counter.add(10, 100, 1000.0 + second)
+    assert counter.get_totals(1019.5) == (100, 1000)
+    assert counter.get_rates(1019.5) == (10.0, 100.0)
+    assert counter.get_totals(1040.0) == (0, 0)
+    assert counter.num_messages == 200
+
+
+def test_merge_stream_stats_combines_workers():
+    recorders = [StreamStatsRecorder(), StreamStatsRecorder()]
+    messages = [
+        OutgoingMessage("topic_a", {}, 99.0, 0, "stream_a", enqueue_time=99.0),
+        OutgoingMessage("topic_b", {}, 99.5, 1, "stream_b", enqueue_time=99.5),
+    ]
+    recorders[0].record_frame(messages, 200, send_start_time=100.0, send_end_time=100.01, queue_size=2)
+    recorders[1].record_frame(messages[:1], 50, send_start_time=100.0, send_end_time=100.02, queue_size=5)
+    stats = merge_stream_stats(recorders, time_now=100.5)
+    assert (stats["num_messages"], stats["num_frames"], stats["num_bytes"]) == (3, 2, 250)
+    assert (stats["max_batch_size"], stats["max_queue_size"]) == (2, 5)
+    assert stats["queue_wait_sec"]["count"] == 3
+    assert stats["send_time_sec"]["count"] == 2
+    assert abs(stats["end_to_end_latency_sec"]["max"] - 1.02) < 1e-9
+    assert stats["topics"]["topic_a"]["num_messages"] == 2
+    assert stats["topics"]["topic_a"]["bytes_per_sec"] == 150.0
+    assert stats["streams"]["stream_a"]["num_messages"] == 2
+    assert stats["streams"]["stream_b"]["num_messages"] == 1